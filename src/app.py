@@ -2,31 +2,158 @@
 インターン情報自動取得システム - Webアプリケーション
 """
 
+import io
 import os
+import re
+import csv
 import json
-from datetime import datetime
-from flask import Flask, render_template, jsonify, request
+import base64
+from datetime import date, timedelta
+from functools import wraps
+from flask import Flask, Response, render_template, jsonify, request, g, send_file, stream_with_context
+
+from dataset import DatasetManager, FILTER_FIELDS, SORT_FIELDS
+from date_index import parse_iso_date
+from response_cache import ResponseCache, CachedResponse, make_etag, supported_encodings
+from static_api import StaticApi, static_key
 
 app = Flask(__name__)
 
-# データファイルのパス
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+# データファイルのパス（負荷試験などで別のデータを使う場合は環境変数 INTERN_SCRAPER_DATA_DIR で指定する）
+DATA_DIR = os.environ.get("INTERN_SCRAPER_DATA_DIR") or \
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
 COMBINED_DATA_FILE = os.path.join(DATA_DIR, "combined_data.json")
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "combined_data.snap")
+STATIC_API_DIR = os.path.join(DATA_DIR, "static_api")
+DATASET_CHECK_INTERVAL = 2.0  # データファイルの更新を確認する間隔（秒）
 
-# データ読み込み関数
-def load_data():
-    try:
-        with open(COMBINED_DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return {"companies": [], "meta": {"last_updated": "N/A", "total_companies": 0, "total_internships": 0}}
+# インターンシップ一覧APIのページサイズ
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+PAGE_PARAMS = ("cursor", "offset", "limit")
+
+# 一括取得APIで一度に指定できるIDの数
+MAX_BATCH_IDS = 200
+
+# エクスポートAPIの出力項目と、1回に送り出す行数
+EXPORT_FIELDS = ("id", "company_id", "company_name", "title", "period", "start_date", "end_date",
+                 "target", "application_url", "source", "last_updated")
+EXPORT_CHUNK_ROWS = 500
+
+DATE_PARAM_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# 締切が近いインターンシップAPIの日数
+DEFAULT_UPCOMING_DAYS = 7
+MAX_UPCOMING_DAYS = 365
+
+# データセット（メモリに常駐させ、データファイルが更新されたらバックグラウンドで再読み込みする）
+datasets = DatasetManager(
+    COMBINED_DATA_FILE,
+    snapshot_file=SNAPSHOT_FILE,
+    check_interval=DATASET_CHECK_INTERVAL
+)
+
+# APIレスポンスのキャッシュ（データセットのバージョンごと）
+response_cache = ResponseCache()
+
+# 結合時に書き出した静的APIスナップショット（読み込み中のデータセットと同じバージョンの間だけ使う）
+static_api = StaticApi(STATIC_API_DIR, check_interval=DATASET_CHECK_INTERVAL)
+
+def current_dataset():
+    """リクエスト中に参照するデータセット（1つのリクエストの間は同じものを使う）"""
+    if "dataset" not in g:
+        g.dataset = datasets.get()
+    return g.dataset
+
+def api_etag(version, daily=False):
+    """APIレスポンスのETag（同じ内容を返すURLは同じ値。静的APIスナップショットから返す場合も同じ値を使う）"""
+    path = static_key(request.path, request.args)
+    if daily:
+        path = f"{path}#{date.today().isoformat()}"
+    return make_etag(version, path)
+
+def cached_api(view=None, daily=False):
+    """データセットのバージョンに基づくETag・304応答・圧縮とレスポンスのキャッシュを行うデコレーター
+    
+    レスポンスはデータセットとリクエストURLだけで決まるため、同じバージョンの間は
+    ビュー関数を呼ばずにキャッシュ（圧縮済みの本体を含む）から返す。今日の日付によって
+    結果が変わるAPIは daily=True を指定する（日付もキャッシュのキーに含める）。
+    """
+    if view is None:
+        return lambda view: cached_api(view, daily=daily)
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        dataset = current_dataset()
+        path = request.full_path
+        if daily:
+            path = f"{path}#{date.today().isoformat()}"
+        etag = api_etag(dataset.version, daily)
+        encodings = supported_encodings()
+        
+        matched = [tag for tag in [etag] + [f"{etag}-{e}" for e in encodings] if request.if_none_match.contains(tag)]
+        if matched:
+            response = Response(status=304)
+            etag = matched[0]
+        else:
+            entry = response_cache.get(dataset.version, path)
+            if entry is None:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = CachedResponse(etag, response.get_data(), response.mimetype)
+                response_cache.put(dataset.version, path, entry)
+            
+            encoding = request.accept_encodings.best_match(encodings)
+            body = entry.encoded(encoding)
+            if body is None:
+                response = Response(entry.body, mimetype=entry.mimetype)
+            else:
+                response = Response(body, mimetype=entry.mimetype)
+                response.headers["Content-Encoding"] = encoding
+                etag = f"{etag}-{encoding}"
+        
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+    
+    return wrapper
+
+@app.before_request
+def serve_static_api():
+    """静的APIスナップショットにあるURLは、ビュー関数を呼ばずに圧縮済みのファイルをそのまま返す"""
+    if request.method != "GET" or not request.path.startswith("/api/"):
+        return None
+    version = datasets.version
+    entry = static_api.lookup(request.path, request.args, version)
+    if entry is None:
+        return None
+    
+    encoding = request.accept_encodings.best_match(entry.encodings)
+    etag = api_etag(version)
+    if encoding is not None:
+        etag = f"{etag}-{encoding}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            response = send_file(entry.path(encoding), mimetype=entry.mimetype, etag=False, conditional=False)
+        except FileNotFoundError:
+            # 書き出し直しで削除された場合はビュー関数で作成する
+            return None
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+    
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
 
 @app.route('/')
 def index():
     """トップページを表示"""
-    data = load_data()
-    meta = data.get("meta", {})
+    meta = current_dataset().meta
     
     return render_template('index.html', 
                           last_updated=meta.get("last_updated", "N/A"),
@@ -34,68 +161,277 @@ def index():
                           total_internships=meta.get("total_internships", 0))
 
 @app.route('/api/companies')
+@cached_api
 def get_companies():
-    """企業一覧を返すAPI"""
-    data = load_data()
-    companies = data.get("companies", [])
-    
-    # シンプルな企業リストを作成（インターンシップ情報は含めない）
-    simple_companies = []
-    for company in companies:
-        simple_companies.append({
-            "id": company.get("id", ""),
-            "name": company.get("name", ""),
-            "market": company.get("market", ""),
-            "industry": company.get("industry", ""),
-            "internship_count": len(company.get("internships", []))
-        })
-    
-    return jsonify(simple_companies)
+    """企業一覧を返すAPI（source を指定するとその取得元の企業のみ）"""
+    # シンプルな企業リスト（インターンシップ情報は含めない）は読み込み時に作成済み
+    dataset = current_dataset()
+    source = request.args.get("source", "").strip()
+    if source:
+        return jsonify(dataset.summaries_by_source.get(source, []))
+    return jsonify(dataset.company_summaries)
+
+def parse_batch_ids(args):
+    """一括取得APIのIDリスト（カンマ区切り）を取り出す"""
+    ids = [value.strip() for value in args.get("ids", "").split(",") if value.strip()]
+    if not ids:
+        raise ValueError("ids is required")
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f"ids must not exceed {MAX_BATCH_IDS} items")
+    return list(dict.fromkeys(ids))
+
+def batch_response(ids, lookup):
+    """指定されたIDの順に見つかった情報と、見つからなかったIDを返す"""
+    items = []
+    missing = []
+    for item_id in ids:
+        item = lookup(item_id)
+        if item is None:
+            missing.append(item_id)
+        else:
+            items.append(item)
+    return jsonify({"items": items, "missing": missing})
+
+@app.route('/api/companies/batch')
+@cached_api
+def get_companies_batch():
+    """複数の企業情報（インターンシップ情報付き）をIDで一括取得するAPI"""
+    try:
+        ids = parse_batch_ids(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return batch_response(ids, current_dataset().companies_by_id.get)
+
+def parse_internship_filters(args):
+    """リクエストパラメータからインターンシップの絞り込み条件を取り出す"""
+    filters = {field: args.get(field, "").strip() for field in FILTER_FIELDS}
+    filters["q"] = args.get("q", "")
+    for field in ("date_from", "date_to", "deadline_from", "deadline_to"):
+        value = args.get(field, "").strip()
+        if value and (not DATE_PARAM_PATTERN.match(value) or parse_iso_date(value) is None):
+            raise ValueError(f"{field} must be YYYY-MM-DD")
+        filters[field] = value
+    return filters
+
+def parse_sort(args):
+    sort = args.get("sort", "").strip()
+    if sort and sort.lstrip("-") not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_FIELDS)} (prefix '-' for descending)")
+    return sort or None
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(str(offset).encode('ascii')).decode('ascii').rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode('ascii'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+def parse_page(args):
+    """ページ指定（cursor または offset と limit）を取り出す"""
+    try:
+        limit = min(max(int(args.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        if args.get("cursor"):
+            offset = decode_cursor(args["cursor"])
+        else:
+            offset = int(args.get("offset", 0))
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+    return max(offset, 0), limit
 
 @app.route('/api/internships')
+@cached_api
 def get_internships():
-    """インターンシップ一覧を返すAPI"""
-    data = load_data()
-    companies = data.get("companies", [])
-    
-    # フィルタリングパラメータ
-    company_id = request.args.get('company_id')
-    
-    # 全インターンシップリストを作成
-    all_internships = []
-    for company in companies:
-        # 企業IDでフィルタリング
-        if company_id and company.get("id") != company_id:
-            continue
-            
-        for internship in company.get("internships", []):
-            all_internships.append({
-                "id": internship.get("id", ""),
-                "company_id": company.get("id", ""),
-                "company_name": company.get("name", ""),
-                "title": internship.get("title", ""),
-                "period": internship.get("period", ""),
-                "start_date": internship.get("start_date", ""),
-                "end_date": internship.get("end_date", ""),
-                "target": internship.get("target", ""),
-                "application_url": internship.get("application_url", ""),
-                "source": internship.get("source", ""),
-                "last_updated": internship.get("last_updated", "")
-            })
-    
-    return jsonify(all_internships)
+    """インターンシップ一覧を返すAPI（絞り込み・並び替え・ページ分割はサーバー側で行う）"""
+    dataset = current_dataset()
+    
+    try:
+        filters = parse_internship_filters(request.args)
+        sort = parse_sort(request.args)
+        offset, limit = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # ページ指定がない場合は、以前と同じく条件に合う全件を配列で返す
+    if not any(name in request.args for name in PAGE_PARAMS):
+        rows = dataset.internship_rows
+        return jsonify([rows[position].to_dict() for position in dataset.query_internships(filters, sort)])
+    return internship_page(dataset, filters, sort, offset, limit)
+
+def internship_page(dataset, filters, sort, offset, limit):
+    """絞り込み・並び替えた結果のうち1ページ分を返す"""
+    positions = dataset.query_internships(filters, sort)
+    total = len(positions)
+    rows = dataset.internship_rows
+    next_offset = offset + limit
+    
+    return jsonify({
+        "items": [rows[position].to_dict() for position in positions[offset:next_offset]],
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_cursor": encode_cursor(next_offset) if next_offset < total else None
+    })
+
+def parse_days(args):
+    try:
+        days = int(args.get("days", DEFAULT_UPCOMING_DAYS))
+    except ValueError:
+        raise ValueError("days must be an integer")
+    if not 0 <= days <= MAX_UPCOMING_DAYS:
+        raise ValueError(f"days must be between 0 and {MAX_UPCOMING_DAYS}")
+    return days
+
+@app.route('/api/internships/upcoming')
+@cached_api(daily=True)
+def get_upcoming_internships():
+    """締切が今日から days 日以内のインターンシップを締切日順に返すAPI（一覧APIと同じ絞り込みを指定できる）"""
+    dataset = current_dataset()
+    
+    try:
+        days = parse_days(request.args)
+        filters = parse_internship_filters(request.args)
+        sort = parse_sort(request.args) or "end_date"
+        offset, limit = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    today = date.today()
+    filters["deadline_from"] = today.isoformat()
+    filters["deadline_to"] = (today + timedelta(days=days)).isoformat()
+    return internship_page(dataset, filters, sort, offset, limit)
+
+def export_ndjson(rows, positions):
+    """1行1件のJSON（NDJSON）を一定行数ごとに生成する"""
+    for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+        yield "".join(json.dumps(rows[position].to_dict(), ensure_ascii=False) + "\n"
+                      for position in positions[start:start + EXPORT_CHUNK_ROWS])
+
+def export_csv(rows, positions):
+    """CSV（Excelで開けるようBOM付き）を一定行数ごとに生成する"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_FIELDS)
+    for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+        for position in positions[start:start + EXPORT_CHUNK_ROWS]:
+            row = rows[position]
+            writer.writerow([getattr(row, field) for field in EXPORT_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+EXPORT_FORMATS = {
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
+
+@app.route('/api/internships/export.<export_format>')
+def export_internships(export_format):
+    """絞り込み条件に一致するインターンシップを全件ストリーミングで出力するAPI（NDJSON / CSV）
+    
+    一覧APIと同じ絞り込み・並び替えを指定できる。行は一定数ずつ生成して送り出すため、
+    件数が多くてもレスポンス全体をメモリに持たない。
+    """
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 404
+    
+    dataset = current_dataset()
+    try:
+        filters = parse_internship_filters(request.args)
+        sort = parse_sort(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    positions = dataset.query_internships(filters, sort)
+    generate, mimetype = EXPORT_FORMATS[export_format]
+    response = Response(stream_with_context(generate(dataset.internship_rows, positions)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=internships.{export_format}"
+    response.headers["X-Total-Count"] = str(len(positions))
+    return response
+
+@app.route('/api/facets')
+@cached_api
+def get_facets():
+    """絞り込み項目（取得元・市場区分・業種・締切月）ごとの件数を返すAPI（/api/internships と同じ条件を指定できる）"""
+    dataset = current_dataset()
+    
+    try:
+        filters = parse_internship_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(dataset.facets(filters))
+
+@app.route('/api/search')
+@cached_api
+def search():
+    """企業名・インターンシップ名・対象・期間の全文検索API（関連度順、一致箇所をハイライト）"""
+    dataset = current_dataset()
+    
+    query = request.args.get("q", "").strip()
+    kind = request.args.get("type", "").strip() or None
+    try:
+        if not query:
+            raise ValueError("q is required")
+        if kind not in (None, "company", "internship"):
+            raise ValueError("type must be company or internship")
+        offset, limit = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    total, results = dataset.search(query, kind=kind, limit=limit, offset=offset)
+    next_offset = offset + limit
+    
+    return jsonify({
+        "items": results,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_cursor": encode_cursor(next_offset) if next_offset < total else None
+    })
 
 @app.route('/api/company/<company_id>')
+@cached_api
 def get_company(company_id):
     """特定の企業情報を返すAPI"""
-    data = load_data()
-    companies = data.get("companies", [])
-    
-    for company in companies:
-        if company.get("id") == company_id:
-            return jsonify(company)
+    company = current_dataset().companies_by_id.get(company_id)
+    if company is not None:
+        return jsonify(company)
     
     return jsonify({"error": "Company not found"}), 404
 
+@app.route('/api/internship/<internship_id>')
+@cached_api
+def get_internship(internship_id):
+    """特定のインターンシップ情報を返すAPI"""
+    internship = current_dataset().get_internship(internship_id)
+    if internship is not None:
+        return jsonify(internship)
+    
+    return jsonify({"error": "Internship not found"}), 404
+
+@app.route('/api/internships/batch')
+@cached_api
+def get_internships_batch():
+    """複数のインターンシップ情報をIDで一括取得するAPI"""
+    try:
+        ids = parse_batch_ids(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return batch_response(ids, current_dataset().get_internship)
+
+@app.route('/api/reload', methods=['POST'])
+def reload_dataset():
+    """データセットの更新を通知するAPI（収集デーモンが同じホストから呼び出す）"""
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"error": "Forbidden"}), 403
+    
+    reloading = datasets.refresh()
+    return jsonify({"reloading": reloading, "version": datasets.version}), 202 if reloading else 200
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,403 @@
+"""
+インターン情報自動取得システム - ベンチマークスクリプト
+"""
+
+import os
+import gc
+import json
+import time
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import save_json, load_json
+from synthetic_data import generate_combined_data, generate_companies
+
+def timed(func):
+    """関数の戻り値と実行時間（秒）を返す"""
+    gc.collect()
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def peak_memory(func):
+    """関数実行中のメモリ使用量のピーク（MB）を返す（tracemallocを使うため時間計測とは別に実行する）"""
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+def write_formats(data, json_file, snapshot_file):
+    """結合データをJSON形式とスナップショット形式で書き出し、それぞれの書き込み時間（秒）を返す"""
+    from snapshot import write_snapshot
+    
+    _, json_write = timed(lambda: save_json(data, json_file))
+    _, snapshot_write = timed(lambda: write_snapshot(iter(data["companies"]), data["meta"], snapshot_file))
+    return json_write, snapshot_write
+
+def benchmark_snapshot(num_companies, internships_per_company):
+    """JSON形式とスナップショット形式の書き込み・読み込みを比較する"""
+    from snapshot import SnapshotReader
+    
+    data = generate_combined_data(num_companies, num_companies * internships_per_company)
+    total = data["meta"]["total_internships"]
+    target_id = data["companies"][num_companies // 2]["id"]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_file = os.path.join(tmp_dir, "combined_data.json")
+        snapshot_file = os.path.join(tmp_dir, "combined_data.snap")
+        
+        json_write, snapshot_write = write_formats(data, json_file, snapshot_file)
+        del data
+        
+        _, json_load = timed(lambda: load_json(json_file))
+        json_peak = peak_memory(lambda: load_json(json_file))
+        _, json_lookup = timed(lambda: next(c for c in load_json(json_file)["companies"] if c["id"] == target_id))
+        
+        reader, snapshot_open = timed(lambda: SnapshotReader(snapshot_file))
+        snapshot_open_peak = peak_memory(lambda: SnapshotReader(snapshot_file).close())
+        _, snapshot_lookup = timed(lambda: reader.get_company(target_id))
+        _, snapshot_load = timed(reader.to_dict)
+        snapshot_peak = peak_memory(reader.to_dict)
+        reader.close()
+        
+        print(f"=== {num_companies} companies / {total} internships ===")
+        print(f"{'':24}{'JSON':>14}{'snapshot':>14}")
+        print(f"{'file size (MB)':24}{os.path.getsize(json_file) / 1024 / 1024:14.2f}"
+              f"{os.path.getsize(snapshot_file) / 1024 / 1024:14.2f}")
+        print(f"{'write (s)':24}{json_write:14.3f}{snapshot_write:14.3f}")
+        print(f"{'full load (s)':24}{json_load:14.3f}{snapshot_load:14.3f}")
+        print(f"{'full load peak (MB)':24}{json_peak:14.1f}{snapshot_peak:14.1f}")
+        print(f"{'open (s)':24}{'-':>14}{snapshot_open:14.3f}")
+        print(f"{'open peak (MB)':24}{'-':>14}{snapshot_open_peak:14.1f}")
+        print(f"{'one company (s)':24}{json_lookup:14.3f}{snapshot_lookup:14.5f}")
+
+def retained_memory(func):
+    """関数の戻り値が保持し続けるメモリ量（MB）と戻り値を返す"""
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 1024 / 1024
+
+def measure_dataset(load):
+    """データセットの (読み込み時間, 保持するメモリ量, 1ページの取得時間, 絞り込み結果全件の取得時間) を返す"""
+    _, load_time = timed(load)
+    dataset, retained = retained_memory(load)
+    positions = dataset.query_internships({"market": "プライム"}, "-start_date")
+    _, page_time = timed(lambda: [dataset.internship_rows[p] for p in positions[1000:1020]])
+    _, export_time = timed(lambda: sum(1 for p in positions if dataset.internship_rows[p]))
+    if dataset.reader is not None:
+        dataset.reader.close()
+    return load_time, retained, page_time, export_time
+
+def benchmark_dataset(num_companies, internships_per_company):
+    """Webアプリのデータセットについて、JSONを読み込む場合とスナップショットから読み込む場合を比較する"""
+    from dataset import Dataset
+    from snapshot import write_snapshot, SnapshotReader
+    
+    data = generate_combined_data(num_companies, num_companies * internships_per_company)
+    total = data["meta"]["total_internships"]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_file = os.path.join(tmp_dir, "combined_data.json")
+        snapshot_file = os.path.join(tmp_dir, "combined_data.snap")
+        save_json(data, json_file)
+        write_snapshot(iter(data["companies"]), data["meta"], snapshot_file)
+        del data
+        
+        def load_json_dataset():
+            loaded = load_json(json_file)
+            return Dataset(loaded["companies"], loaded["meta"])
+        
+        def load_snapshot_dataset():
+            reader = SnapshotReader(snapshot_file)
+            return Dataset(None, reader.meta, reader=reader)
+        
+        results = {name: measure_dataset(load)
+                   for name, load in [("JSON", load_json_dataset), ("snapshot", load_snapshot_dataset)]}
+        
+        print(f"=== {num_companies} companies / {total} internships ===")
+        print(f"{'':24}{'JSON':>14}{'snapshot':>14}")
+        for label, i, fmt in [("load (s)", 0, "14.3f"), ("retained per worker (MB)", 1, "14.1f"),
+                              ("one page (s)", 2, "14.5f"), ("all filtered rows (s)", 3, "14.3f")]:
+            print(f"{label:24}{results['JSON'][i]:{fmt}}{results['snapshot'][i]:{fmt}}")
+
+def render_internship_page(company):
+    """就活サイト（マイナビ）の企業インターンシップページを模したHTML"""
+    boxes = "".join(
+        f'<div class="internship-box"><h3 class="internship-name">{internship["title"]}</h3>'
+        f'<p class="period">{internship["period"]}</p>'
+        f'<p class="date">{internship["start_date"]}～{internship["end_date"]}</p>'
+        f'<p class="target">{internship["target"]}</p></div>'
+        for internship in company["internships"]
+    )
+    # 一覧の後ろにはサイト共通のヘッダー・フッターなどに相当する内容が続く
+    footer = "".join(f"<li><a href='/corp/{i}'>関連企業{i}</a></li>" for i in range(300))
+    return (f'<html><head><meta charset="utf-8"><title>{company["name"]}</title></head><body>'
+            f'<h1>{company["name"]}</h1><div class="internship-list">{boxes}</div><ul>{footer}</ul></body></html>')
+
+class StandInServer:
+    """就活サイトの代わりに企業のインターンシップページを返すローカルサーバー（HTTP/1.1、keep-alive）
+    
+    latency 秒の応答遅延を入れ、受け付けた接続数を数える。tolerated_rate を指定した場合は、
+    直近1秒間のリクエストがその件数を超えると 429 を返す。
+    """
+    
+    def __init__(self, companies, latency, tolerated_rate=None):
+        pages = {f"/26/pc/search/corp/{company['id']}/internship": render_internship_page(company).encode("utf-8")
+                 for company in companies}
+        self.connections = 0
+        self.throttled = 0
+        recent = []
+        lock = threading.Lock()
+        server = self
+        
+        def throttle():
+            if tolerated_rate is None:
+                return False
+            now = time.monotonic()
+            with lock:
+                while recent and recent[0] < now - 1:
+                    recent.pop(0)
+                if len(recent) >= tolerated_rate:
+                    server.throttled += 1
+                    return True
+                recent.append(now)
+                return False
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def setup(self):
+                super().setup()
+                server.connections += 1
+            
+            def do_GET(self):
+                if throttle():
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                time.sleep(latency)
+                body = pages.get(self.path)
+                self.send_response(200 if body is not None else 404)
+                body = body or b"Not found"
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def fetch_all(urls, concurrency, http2):
+    """URLを concurrency 並列で取得し、(経過時間, HTTPバージョンごとの件数, エラー数) を返す"""
+    from utils import send_request, response_http_version
+    
+    pending = list(urls)
+    lock = threading.Lock()
+    versions = Counter()
+    errors = []
+    
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                url = pending.pop()
+            try:
+                response = send_request(url, http2=http2)
+                with lock:
+                    versions[response_http_version(response)] += 1
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+    
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, versions, len(errors)
+
+def benchmark_fetch(num_companies, internships_per_company, concurrency=8, latency=0.05, url=None):
+    """企業ページの並列取得について、HTTP/1.1（requests）とHTTP/2（httpx）を比較する
+    
+    url を指定しない場合は、ページを返すローカルサーバーを起動する（HTTP/1.1 のみ対応のため、HTTP/2 側は
+    HTTP/1.1 へのフォールバックの計測になる）。HTTP/2 で比較するには、同じパスでページを返すHTTP/2対応の
+    サーバー（TLS終端するプロキシの後ろに置いたものなど）を url に指定する。
+    """
+    from utils import get_http2_client
+    
+    companies = generate_companies(num_companies, num_companies * internships_per_company)
+    server = None
+    if url is None:
+        server = StandInServer(companies, latency)
+        url = server.base_url
+    urls = [f"{url.rstrip('/')}/26/pc/search/corp/{company['id']}/internship" for company in companies]
+    
+    if get_http2_client() is None:
+        print("httpx[http2] is not installed: the HTTP/2 transport falls back to HTTP/1.1 (requests)")
+    
+    results = {}
+    try:
+        for name, http2 in [("HTTP/1.1", False), ("HTTP/2", True)]:
+            connections = server.connections if server else None
+            elapsed, versions, errors = fetch_all(urls, concurrency, http2)
+            opened = server.connections - connections if server else None
+            results[name] = (elapsed, len(urls) / elapsed, opened, errors, versions)
+    finally:
+        if server is not None:
+            server.close()
+    
+    print(f"=== {len(urls)} pages / concurrency {concurrency} ===")
+    print(f"{'':24}{'HTTP/1.1':>14}{'HTTP/2':>14}")
+    print(f"{'total (s)':24}{results['HTTP/1.1'][0]:14.3f}{results['HTTP/2'][0]:14.3f}")
+    print(f"{'pages per second':24}{results['HTTP/1.1'][1]:14.1f}{results['HTTP/2'][1]:14.1f}")
+    if server is not None:
+        print(f"{'connections opened':24}{results['HTTP/1.1'][2]:14d}{results['HTTP/2'][2]:14d}")
+    print(f"{'errors':24}{results['HTTP/1.1'][3]:14d}{results['HTTP/2'][3]:14d}")
+    for name, result in results.items():
+        print(f"{name} responses by protocol: {dict(result[4])}")
+
+def benchmark_adaptive(num_companies, internships_per_company, concurrency=8, latency=0.05, tolerated_rate=20,
+                       rate_step=2.0):
+    """適応的なリクエスト制御が、429 を返し始める頻度（tolerated_rate 回/秒）に収束するかを確認する"""
+    import requests
+    from rate_control import HostController
+    from utils import send_request
+    
+    companies = generate_companies(num_companies, num_companies * internships_per_company)
+    server = StandInServer(companies, latency, tolerated_rate)
+    urls = [f"{server.base_url}/26/pc/search/corp/{company['id']}/internship" for company in companies]
+    controller = HostController("stand-in", max_rate=tolerated_rate * 5, max_concurrency=concurrency,
+                                initial_rate=1.0, rate_step=rate_step)
+    
+    pending = list(urls)
+    lock = threading.Lock()
+    completed = []  # 正常に取得できた時刻
+    
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                url = pending.pop()
+            started = controller.acquire()
+            try:
+                send_request(url)
+                controller.release(started)
+                with lock:
+                    completed.append(time.monotonic())
+            except requests.HTTPError as e:
+                retry_after = float(e.response.headers.get("Retry-After", 0))
+                controller.release(started, status=e.response.status_code, retry_after=retry_after)
+                with lock:
+                    pending.append(url)
+    
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    
+    print(f"=== {len(urls)} pages / site tolerates {tolerated_rate} requests per second ===")
+    print(f"{'time (s)':>10}{'rate (/s)':>12}{'concurrency':>13}{'done (/s)':>12}{'429s':>8}")
+    last_done = last_throttled = 0
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(1)
+        with lock:
+            done = len(completed)
+        metrics = controller.metrics()
+        print(f"{time.monotonic() - start:10.1f}{metrics['rate']:12.2f}{metrics['concurrency']:13d}"
+              f"{done - last_done:12d}{server.throttled - last_throttled:8d}")
+        last_done, last_throttled = done, server.throttled
+    for thread in threads:
+        thread.join()
+    server.close()
+    
+    elapsed = time.monotonic() - start
+    metrics = controller.metrics()
+    print(f"total: {elapsed:.1f}s, {len(urls) / elapsed:.1f} pages/s, {server.throttled} throttled responses, "
+          f"{metrics['decreases']} decreases, peak rate {metrics['peak_rate']}/s")
+
+def benchmark_records(num_companies, internships_per_company):
+    """企業・インターンシップのレコードについて、辞書とレコード型の1件あたりのメモリと作成時間を比較する"""
+    from records import CompanyRecord, InternshipRecord
+    
+    data = generate_combined_data(num_companies, num_companies * internships_per_company)
+    companies = [{key: value for key, value in company.items() if key != "internships"}
+                 for company in data["companies"]]
+    internships = [internship for company in data["companies"] for internship in company["internships"]]
+    del data
+    
+    for kind, record_type, items in [("company", CompanyRecord, companies),
+                                     ("internship", InternshipRecord, internships)]:
+        # ファイルから読み込んだ場合と同じく、文字列は1件ごとに別のオブジェクトにする
+        lines = [json.dumps(item, ensure_ascii=False) for item in items]
+        load_dicts = lambda: [json.loads(line) for line in lines]
+        load_records = lambda: [record_type.from_dict(json.loads(line)) for line in lines]
+        
+        _, dict_retained = retained_memory(load_dicts)
+        _, record_retained = retained_memory(load_records)
+        _, dict_load = timed(load_dicts)
+        _, record_load = timed(load_records)
+        loaded = load_dicts()
+        _, dict_build = timed(lambda: [dict(item) for item in loaded])
+        _, record_build = timed(lambda: [record_type.from_dict(item) for item in loaded])
+        records = [record_type.from_dict(item) for item in loaded]
+        _, to_dict_time = timed(lambda: [record.to_dict() for record in records])
+        
+        count = len(items)
+        print(f"=== {count} {kind} records ===")
+        print(f"{'':28}{'dict':>14}{'record':>14}")
+        print(f"{'bytes per record':28}{dict_retained * 1024 * 1024 / count:14.0f}"
+              f"{record_retained * 1024 * 1024 / count:14.0f}")
+        print(f"{'retained (MB)':28}{dict_retained:14.1f}{record_retained:14.1f}")
+        print(f"{'load from JSON (s)':28}{dict_load:14.3f}{record_load:14.3f}")
+        print(f"{'construct from dict (s)':28}{dict_build:14.3f}{record_build:14.3f}")
+        print(f"{'to_dict (s)':28}{'-':>14}{to_dict_time:14.3f}")
+
+BENCHMARKS = {
+    "snapshot": benchmark_snapshot,
+    "dataset": benchmark_dataset,
+    "fetch": benchmark_fetch,
+    "adaptive": benchmark_adaptive,
+    "records": benchmark_records,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the intern information collection system")
+    parser.add_argument("name", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    parser.add_argument("--companies", type=int, default=5000, help="Number of companies")
+    parser.add_argument("--internships-per-company", type=int, default=10, help="Internships per company")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests (fetch)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Response delay of the stand-in server (fetch)")
+    parser.add_argument("--tolerated-rate", type=float, default=20,
+                        help="Requests per second the stand-in server accepts before returning 429 (adaptive)")
+    parser.add_argument("--url", help="Base URL of an HTTP/2 capable stand-in server instead of the local one (fetch)")
+    args = parser.parse_args()
+    
+    options = {}
+    if args.name == "fetch":
+        options = {"concurrency": args.concurrency, "latency": args.latency, "url": args.url}
+    elif args.name == "adaptive":
+        options = {"concurrency": args.concurrency, "latency": args.latency, "tolerated_rate": args.tolerated_rate}
+    BENCHMARKS[args.name](args.companies, args.internships_per_company, **options)
@@ -0,0 +1,64 @@
+"""
+インターン情報自動取得システム - 変更セット管理モジュール
+"""
+
+import os
+
+from utils import save_json, load_json, logger
+
+CHANGE_KINDS = ("added", "updated", "removed")
+
+class ChangeSet:
+    """収集処理で追加・更新・削除された企業ID／インターンシップIDを記録するクラス"""
+    
+    def __init__(self):
+        self.companies = {kind: set() for kind in CHANGE_KINDS}
+        self.internships = {kind: set() for kind in CHANGE_KINDS}
+        self.affected_company_ids = set()  # インターンシップの変更を含め、再結合が必要な企業ID
+    
+    def add_company(self, kind, company_id):
+        self.companies[kind].add(company_id)
+        self.affected_company_ids.add(company_id)
+    
+    def add_internship(self, kind, internship_id, company_id):
+        self.internships[kind].add(internship_id)
+        self.affected_company_ids.add(company_id)
+    
+    def merge(self, other):
+        for kind in CHANGE_KINDS:
+            self.companies[kind] |= other.companies[kind]
+            self.internships[kind] |= other.internships[kind]
+        self.affected_company_ids |= other.affected_company_ids
+    
+    def is_empty(self):
+        return not self.affected_company_ids
+    
+    def to_dict(self):
+        return {
+            "companies": {kind: sorted(ids) for kind, ids in self.companies.items()},
+            "internships": {kind: sorted(ids) for kind, ids in self.internships.items()},
+            "affected_company_ids": sorted(self.affected_company_ids),
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        change_set = cls()
+        for kind in CHANGE_KINDS:
+            change_set.companies[kind] = set(data.get("companies", {}).get(kind, []))
+            change_set.internships[kind] = set(data.get("internships", {}).get(kind, []))
+        change_set.affected_company_ids = set(data.get("affected_company_ids", []))
+        return change_set
+    
+    @classmethod
+    def load(cls, filepath):
+        """保存済みの変更セットを読み込む（ファイルがない場合はNone）"""
+        if not os.path.exists(filepath):
+            return None
+        return cls.from_dict(load_json(filepath) or {})
+    
+    def save_merged(self, filepath):
+        """まだ結合処理に反映されていない変更セットとまとめて保存する"""
+        pending = ChangeSet.load(filepath) or ChangeSet()
+        pending.merge(self)
+        save_json(pending.to_dict(), filepath)
+        logger.info(f"Pending changes for {len(pending.affected_company_ids)} companies saved to {filepath}")
@@ -4,22 +4,36 @@
 
 import os
 import re
-import time
-import logging
+import json
 from urllib.parse import urljoin
 
 import requests
-from bs4 import BeautifulSoup
 
-from config import JOB_SITES, LISTED_COMPANIES_URL, COMPANIES_FILE, MAX_COMPANIES
-from utils import get_soup, save_json, load_json, logger
+from config import JOB_SITES, LISTED_COMPANIES_URL, COMPANIES_FILE, CHANGES_FILE, MAX_COMPANIES, COMPANY_DISCOVERY
+from change_set import ChangeSet
+from storage import get_storage, BatchWriter
+from profiling import profile_stage
+from sitemap import discover_companies
+from records import CompanyRecord
+from utils import get_soup, pause, JsonlWriter, iter_jsonl, iter_records, save_jsonl, logger
 
 class CompanyCollector:
     """就活サイトから企業情報を収集するクラス"""
     
-    def __init__(self):
-        self.companies = []
+    def __init__(self, storage=None, discovery=COMPANY_DISCOVERY):
+        self.discovery = discovery  # 就活サイトの企業の探し方（"search" / "sitemap"）
         self.company_ids = set()  # 重複チェック用
+        self.company_count = 0
+        self._writer = None       # 収集途中の企業情報の書き込み先
+        self.storage = storage if storage is not None else get_storage()
+        self.existing_ids = set()  # 前回までに収集済みの企業ID
+        self.changes = ChangeSet() # 結合データの差分更新に使う変更セット
+    
+    def add_company(self, company):
+        """企業情報（CompanyRecord）を1件記録する（収集したその場でJSONLに書き出す）"""
+        self._writer.write(company.to_dict())
+        self.company_ids.add(company.id)
+        self.company_count += 1
     
     def collect_listed_companies(self):
         """上場企業の情報を収集する"""
@@ -39,6 +53,7 @@ class CompanyCollector:
                 return
             
             rows = table.find_all('tr')[1:]  # ヘッダー行をスキップ
+            listed_count = 0
             
             for row in rows:
                 cols = row.find_all('td')
@@ -50,18 +65,18 @@ class CompanyCollector:
                     company_id = f"listed_{code}"
                     
                     if company_id not in self.company_ids:
-                        self.companies.append({
-                            "id": company_id,
-                            "name": name,
-                            "stock_code": code,
-                            "market": market,
-                            "source": "JPX",
-                            "official_site": None,  # 後で補完
-                            "career_site": None,    # 後で補完
-                        })
-                        self.company_ids.add(company_id)
+                        self.add_company(CompanyRecord(
+                            id=company_id,
+                            name=name,
+                            stock_code=code,
+                            market=market,
+                            source="JPX",
+                            official_site=None,  # 後で補完
+                            career_site=None,    # 後で補完
+                        ))
+                        listed_count += 1
             
-            logger.info(f"Collected {len(self.companies)} listed companies")
+            logger.info(f"Collected {listed_count} listed companies")
             
         except Exception as e:
             logger.error(f"Error collecting listed companies: {e}")
@@ -104,7 +119,7 @@ class CompanyCollector:
                     company_name = company_link.text.strip()
                     
                     # URLから企業IDを抽出
-                    company_id_match = re.search(r'/corp/([^/]+)', company_url)
+                    company_id_match = re.search(JOB_SITES["mynavi"]["company_id_pattern"], company_url)
                     if not company_id_match:
                         continue
                         
@@ -117,16 +132,15 @@ class CompanyCollector:
                     # 企業情報を保存
                     internship_url = JOB_SITES["mynavi"]["internship_url_pattern"].format(company_id_match.group(1))
                     
-                    self.companies.append({
-                        "id": company_id,
-                        "name": company_name,
-                        "source": "マイナビ",
-                        "job_site_url": urljoin(base_url, company_url),
-                        "internship_url": internship_url,
-                        "official_site": None,  # 後で補完
-                        "career_site": None,    # 後で補完
-                    })
-                    self.company_ids.add(company_id)
+                    self.add_company(CompanyRecord(
+                        id=company_id,
+                        name=company_name,
+                        source="マイナビ",
+                        job_site_url=urljoin(base_url, company_url),
+                        internship_url=internship_url,
+                        official_site=None,  # 後で補完
+                        career_site=None,    # 後で補完
+                    ))
                     companies_collected += 1
                     
                     if companies_collected >= MAX_COMPANIES:
@@ -141,7 +155,7 @@ class CompanyCollector:
                     break
                     
                 # ページ間の待機時間
-                time.sleep(2)
+                pause(2)
                 
             except Exception as e:
                 logger.error(f"Error collecting companies from Mynavi page {page}: {e}")
@@ -184,7 +198,7 @@ class CompanyCollector:
                     company_name = company_link.text.strip()
                     
                     # URLから企業IDを抽出
-                    company_id_match = re.search(r'/company/([^/]+)', company_url)
+                    company_id_match = re.search(JOB_SITES["rikunabi"]["company_id_pattern"], company_url)
                     if not company_id_match:
                         continue
                         
@@ -197,16 +211,15 @@ class CompanyCollector:
                     # 企業情報を保存
                     internship_url = JOB_SITES["rikunabi"]["internship_url_pattern"].format(company_id_match.group(1))
                     
-                    self.companies.append({
-                        "id": company_id,
-                        "name": company_name,
-                        "source": "リクナビ",
-                        "job_site_url": company_url,
-                        "internship_url": internship_url,
-                        "official_site": None,  # 後で補完
-                        "career_site": None,    # 後で補完
-                    })
-                    self.company_ids.add(company_id)
+                    self.add_company(CompanyRecord(
+                        id=company_id,
+                        name=company_name,
+                        source="リクナビ",
+                        job_site_url=company_url,
+                        internship_url=internship_url,
+                        official_site=None,  # 後で補完
+                        career_site=None,    # 後で補完
+                    ))
                     companies_collected += 1
                     
                     if companies_collected >= MAX_COMPANIES:
@@ -221,7 +234,7 @@ class CompanyCollector:
                     break
                     
                 # ページ間の待機時間
-                time.sleep(2)
+                pause(2)
                 
             except Exception as e:
                 logger.error(f"Error collecting companies from Rikunabi page {page}: {e}")
@@ -264,7 +277,7 @@ class CompanyCollector:
                     company_name = company_link.text.strip()
                     
                     # URLから企業IDを抽出
-                    company_id_match = re.search(r'/corp/detail/([^/]+)', company_url)
+                    company_id_match = re.search(JOB_SITES["career_tasu"]["company_id_pattern"], company_url)
                     if not company_id_match:
                         continue
                         
@@ -277,16 +290,15 @@ class CompanyCollector:
                     # 企業情報を保存
                     internship_url = JOB_SITES["career_tasu"]["internship_url_pattern"].format(company_id_match.group(1))
                     
-                    self.companies.append({
-                        "id": company_id,
-                        "name": company_name,
-                        "source": "キャリタス就活",
-                        "job_site_url": company_url,
-                        "internship_url": internship_url,
-                        "official_site": None,  # 後で補完
-                        "career_site": None,    # 後で補完
-                    })
-                    self.company_ids.add(company_id)
+                    self.add_company(CompanyRecord(
+                        id=company_id,
+                        name=company_name,
+                        source="キャリタス就活",
+                        job_site_url=company_url,
+                        internship_url=internship_url,
+                        official_site=None,  # 後で補完
+                        career_site=None,    # 後で補完
+                    ))
                     companies_collected += 1
                     
                     if companies_collected >= MAX_COMPANIES:
@@ -301,23 +313,75 @@ class CompanyCollector:
                     break
                     
                 # ページ間の待機時間
-                time.sleep(2)
+                pause(2)
                 
             except Exception as e:
                 logger.error(f"Error collecting companies from Career-Tasu page {page}: {e}")
     
-    def enrich_company_data(self):
-        """収集した企業情報を充実させる（公式サイトURLなどを追加）"""
+    def collect_from_sitemap(self, site_key):
+        """就活サイトのサイトマップから未収集の企業を追加する（検索結果からの収集と同じく MAX_COMPANIES 件まで）
+        
+        企業名などは企業ページから補完する（補完できなかった企業は保存せず、次回の収集で取り直す）。
+        サイトマップが取得できない場合はFalseを返す。
+        """
+        site = JOB_SITES[site_key]
+        logger.info(f"Discovering companies from the {site['name']} sitemap...")
+        
+        try:
+            discovered = discover_companies(site_key, self.company_ids)
+        except Exception as e:
+            logger.error(f"Error reading the {site['name']} sitemap: {e}")
+            return False
+        if discovered is None:
+            return False
+        if len(discovered) > MAX_COMPANIES:
+            logger.info(f"Limiting {len(discovered)} companies from the {site['name']} sitemap to {MAX_COMPANIES}")
+            discovered = discovered[:MAX_COMPANIES]
+        
+        for site_id, url in discovered:
+            self.add_company(CompanyRecord(
+                id=f"{site_key}_{site_id}",
+                name=None,  # 企業ページから補完
+                source=site["name"],
+                job_site_url=url,
+                internship_url=site["internship_url_pattern"].format(site_id),
+                official_site=None,  # 後で補完
+                career_site=None,    # 後で補完
+            ))
+        
+        logger.info(f"Discovered {len(discovered)} new companies from the {site['name']} sitemap")
+        return True
+    
+    def collect_from_job_sites(self):
+        """就活サイトから企業情報を収集する（サイトマップが使えないサイトは検索結果から収集する）"""
+        search = {
+            "mynavi": self.collect_from_mynavi,
+            "rikunabi": self.collect_from_rikunabi,
+            "career_tasu": self.collect_from_career_tasu,
+        }
+        for site_key, collect in search.items():
+            if self.discovery == "sitemap" and self.collect_from_sitemap(site_key):
+                continue
+            collect()
+    
+    def enrich_company_data(self, companies):
+        """収集した企業情報を充実させる（公式サイトURLなどを追加）
+        
+        企業情報を1件ずつ受け取り、補完した企業情報を順に返すジェネレータ
+        """
         logger.info("Enriching company data...")
         
-        for i, company in enumerate(self.companies):
+        for i, data in enumerate(companies):
             if i % 10 == 0:
-                logger.info(f"Enriching company {i+1}/{len(self.companies)}")
+                logger.info(f"Enriching company {i+1}/{self.company_count}")
+            
+            before = json.dumps(data, ensure_ascii=False, sort_keys=True)
+            company = CompanyRecord.from_dict(data)
             
             try:
                 # 就活サイトの企業ページから公式サイトURLを取得
-                if "job_site_url" in company and company["job_site_url"]:
-                    soup = get_soup(company["job_site_url"])
+                if company.get("job_site_url"):
+                    soup = get_soup(company.job_site_url)
                     
                     if soup:
                         # 公式サイトURLを探す（サイトごとに異なる可能性があるため、複数のパターンを試す）
@@ -341,10 +405,16 @@ class CompanyCollector:
                                     break
                         
                         if official_site_element:
-                            company["official_site"] = official_site_element.get('href')
+                            company.official_site = official_site_element.get('href')
+                        
+                        # サイトマップから見つけた企業は企業名を企業ページの見出しから取得する
+                        if not company.get("name"):
+                            heading = soup.find('h1') or soup.find('title')
+                            if heading:
+                                company.name = heading.text.strip()
                 
                 # 採用サイトURLを推測（公式サイトURLがある場合）
-                if company["official_site"]:
+                if company.get("official_site"):
                     # 一般的な採用サイトのパターンを試す
                     career_patterns = [
                         "/recruit",
@@ -357,44 +427,79 @@ class CompanyCollector:
                     ]
                     
                     for pattern in career_patterns:
-                        career_url = company["official_site"].rstrip('/') + pattern
+                        career_url = company.official_site.rstrip('/') + pattern
                         try:
                             response = requests.head(career_url, timeout=5)
                             if response.status_code == 200:
-                                company["career_site"] = career_url
+                                company.career_site = career_url
                                 break
                         except:
                             continue
             
             except Exception as e:
-                logger.error(f"Error enriching data for company {company['name']}: {e}")
+                logger.error(f"Error enriching data for company {company.get('name')}: {e}")
+            
+            # 企業名を取得できなかった企業（サイトマップから見つけた企業）は保存しない
+            if not company.get("name"):
+                logger.warning(f"Skipping company {company.id}: name could not be resolved",
+                               extra={"event": "company_name_missing"})
+                self.company_count -= 1
+                if company.id in self.existing_ids:
+                    self.changes.add_company("removed", company.id)
+                continue
+            
+            # 変更内容を記録する
+            data = company.to_dict()
+            if company.id not in self.existing_ids:
+                self.changes.add_company("added", company.id)
+            elif json.dumps(data, ensure_ascii=False, sort_keys=True) != before:
+                self.changes.add_company("updated", company.id)
+            
+            yield data
             
             # 処理間隔を空ける
-            time.sleep(1)
+            pause(1)
+    
+    def store_companies(self, companies, batch):
+        """企業情報をストレージへのバッチに追加しながらそのまま返す"""
+        for company in companies:
+            batch.add_company(company)
+            yield company
     
     def run(self):
-        """企業情報収集の実行"""
-        # 既存のデータがあれば読み込む
-        existing_data = load_json(COMPANIES_FILE)
-        if existing_data:
-            self.companies = existing_data
-            self.company_ids = {company["id"] for company in self.companies}
-            logger.info(f"Loaded {len(self.companies)} companies from existing data")
+        """企業情報収集の実行
         
-        # 各ソースから企業情報を収集
-        self.collect_listed_companies()
-        self.collect_from_mynavi()
-        self.collect_from_rikunabi()
-        self.collect_from_career_tasu()
+        収集した企業情報は COMPANIES_FILE にJSONLで保存し、そのレコードを順に返すイテレータを返す
+        """
+        partial_file = f"{COMPANIES_FILE}.partial"
         
-        # 企業情報を充実させる
-        self.enrich_company_data()
+        with profile_stage("company"), JsonlWriter(partial_file, mode='w') as self._writer:
+            # 既存のデータがあれば引き継ぐ
+            for company in iter_records(COMPANIES_FILE):
+                if company["id"] not in self.company_ids:
+                    self.add_company(CompanyRecord.from_dict(company))
+            if self.company_count:
+                logger.info(f"Loaded {self.company_count} companies from existing data")
+            self.existing_ids = set(self.company_ids)
+            
+            # 各ソースから企業情報を収集
+            self.collect_listed_companies()
+            self.collect_from_job_sites()
+        self._writer = None
         
-        # 結果を保存
-        save_json(self.companies, COMPANIES_FILE)
-        logger.info(f"Collected and saved {len(self.companies)} companies in total")
+        # 企業情報を充実させながら保存する
+        with profile_stage("enrichment"):
+            enriched = self.enrich_company_data(iter_jsonl(partial_file))
+            if self.storage is not None:
+                with BatchWriter(self.storage) as batch:
+                    save_jsonl(self.store_companies(enriched, batch), COMPANIES_FILE)
+            else:
+                save_jsonl(enriched, COMPANIES_FILE)
+        os.remove(partial_file)
+        self.changes.save_merged(CHANGES_FILE)
+        logger.info(f"Collected and saved {self.company_count} companies in total")
         
-        return self.companies
+        return iter_jsonl(COMPANIES_FILE)
 
 if __name__ == "__main__":
     collector = CompanyCollector()
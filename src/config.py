@@ -2,33 +2,77 @@
 インターン情報自動取得システム - 設定ファイル
 """
 
+import os
+
 # 対象とする就活サイト
+# stop_after: この要素の一覧を読み終えた時点でページの受信を打ち切る / max_page_bytes: 1ページで読み込む本文の上限（バイト）
+# http2: HTTP/2 で並列リクエストを1つの接続に多重化する（httpx[http2] が必要。使えない場合はHTTP/1.1で通信する）
+# max_rate / max_concurrency: 適応的なリクエスト制御で上げるリクエスト頻度（回/秒）・同時リクエスト数の上限
+# company_id_pattern: 企業ページのURLから企業IDを取り出す正規表現
+# sitemap_url: サイトマップ（インデックス）のURL（None の場合は robots.txt の Sitemap: を使う）
 JOB_SITES = {
     "mynavi": {
         "name": "マイナビ",
         "url": "https://job.mynavi.jp/26/pc/corpinfo/displayCorpSearch/index",
         "internship_url_pattern": "https://job.mynavi.jp/26/pc/search/corp/{}/internship",
+        "company_id_pattern": r"/corp/([^/]+)",
+        "sitemap_url": None,
+        "stop_after": ".internship-box",
+        "max_page_bytes": 2 * 1024 * 1024,
+        "http2": False,
+        "max_rate": 2.0,
+        "max_concurrency": 4,
     },
     "rikunabi": {
         "name": "リクナビ",
         "url": "https://job.rikunabi.com/2026/search/",
         "internship_url_pattern": "https://job.rikunabi.com/2026/company/internship/{}/",
+        "company_id_pattern": r"/company/(?!internship/)([^/]+)",
+        "sitemap_url": None,
+        "stop_after": ".internshipBox",
+        "max_page_bytes": 2 * 1024 * 1024,
+        "http2": False,
+        "max_rate": 2.0,
+        "max_concurrency": 4,
     },
     "career_tasu": {
         "name": "キャリタス就活",
         "url": "https://job.career-tasu.jp/2026/search/",
         "internship_url_pattern": "https://job.career-tasu.jp/2026/corp/detail/{}/internship/",
+        "company_id_pattern": r"/corp/detail/([^/]+)",
+        "sitemap_url": None,
+        "stop_after": ".internship-item",
+        "max_page_bytes": 2 * 1024 * 1024,
+        "http2": False,
+        "max_rate": 2.0,
+        "max_concurrency": 4,
     }
 }
 
 # 上場企業情報取得用URL
 LISTED_COMPANIES_URL = "https://www.jpx.co.jp/markets/statistics-equities/misc/01.html"
 
-# データ保存先
-DATA_DIR = "../data"
-COMPANIES_FILE = f"{DATA_DIR}/companies.json"
-INTERNSHIPS_FILE = f"{DATA_DIR}/internships.json"
+# データ保存先（環境変数 INTERN_SCRAPER_DATA_DIR で変更できる。テストは一時ディレクトリを使う）
+DATA_DIR = os.environ.get("INTERN_SCRAPER_DATA_DIR") or "../data"
+COMPANIES_FILE = f"{DATA_DIR}/companies.jsonl"      # 1行1企業のJSONL（収集中は .partial に追記）
+INTERNSHIPS_FILE = f"{DATA_DIR}/internships.jsonl"  # 1行1インターンシップのJSONL
 COMBINED_DATA_FILE = f"{DATA_DIR}/combined_data.json"
+FINGERPRINTS_FILE = f"{DATA_DIR}/fingerprints.json"  # ページ変更検知用のフィンガープリント
+DATABASE_FILE = f"{DATA_DIR}/intern_scraper.db"
+CHANGES_FILE = f"{DATA_DIR}/changes.json"  # 結合データに未反映の変更セット
+SNAPSHOT_FILE = f"{DATA_DIR}/combined_data.snap"  # 結合データの高速読み込み用スナップショット
+
+# 静的APIスナップショット（結合のたびに一覧APIの主なレスポンスを圧縮済みのファイルとして書き出し、
+# Webアプリはそのまま返す。main.py static-api で書き出し直すこともできる）
+STATIC_API_DIR = f"{DATA_DIR}/static_api"
+STATIC_API_PAGE_SIZE = 10     # 書き出すページの件数（トップページの1ページの件数に合わせる）
+STATIC_API_PAGES = 5          # 絞り込み条件ごとに書き出すページ数
+STATIC_API_FACET_VALUES = 20  # 項目ごとに書き出す絞り込みの値の数（件数の多い順）
+
+# ストレージ設定（"jsonl": JSONLファイルのみ / "sqlite": SQLiteにも同じ内容を保存し、差分結合の企業の読み出しと
+# クロール状態に使う。正本はJSONLファイルのまま）
+STORAGE_BACKEND = "jsonl"
+STORAGE_BATCH_SIZE = 500  # 1トランザクションで書き込むレコード数
 
 # スクレイピング設定
 REQUEST_HEADERS = {
@@ -37,13 +81,53 @@ REQUEST_HEADERS = {
 REQUEST_TIMEOUT = 10  # 秒
 REQUEST_RETRY = 3     # リトライ回数
 REQUEST_DELAY = 1     # リクエスト間隔（秒）
+MAX_PAGE_BYTES = 5 * 1024 * 1024  # 1ページで読み込む本文の上限（展開後のバイト数。就活サイトは JOB_SITES の max_page_bytes）
+STREAM_CHUNK_SIZE = 64 * 1024     # ページを逐次読み込む単位（バイト）
+
+# 適応的なリクエスト制御（ホストごとに応答を見ながら頻度・同時リクエスト数を調整する）
+ADAPTIVE_RATE_CONTROL = True     # False の場合は REQUEST_DELAY とページ・企業間の固定の待機時間で間隔を空ける
+ADAPTIVE_INITIAL_RATE = 0.5      # リクエスト頻度の初期値（回/秒）
+ADAPTIVE_MIN_RATE = 0.05         # リクエスト頻度の下限（回/秒）
+ADAPTIVE_MAX_RATE = 1.0          # 就活サイト以外のホストのリクエスト頻度の上限（回/秒）
+ADAPTIVE_MAX_CONCURRENCY = 2     # 就活サイト以外のホストの同時リクエスト数の上限
+ADAPTIVE_RATE_STEP = 0.05        # 正常な応答が続く間、1秒あたりに上げる頻度（回/秒）
+ADAPTIVE_DECREASE_FACTOR = 0.5   # 429/503・エラー・応答時間の急増時に頻度・同時リクエスト数に掛ける係数
+ADAPTIVE_LATENCY_SPIKE = 3.0     # 応答時間が平均のこの倍数を超えたら急増とみなす
+ADAPTIVE_LATENCY_FLOOR = 1.0     # ただしこの秒数以下の応答時間は急増とみなさない
+
+# 分散収集（main.py worker）の設定
+QUEUE_FILE = f"{DATA_DIR}/work_queue.db"  # 収集タスクのワークキュー（複数マシンで共有する場合は共有ディスク上に置く）
+QUEUE_LEASE_SECONDS = 600     # タスクのリース期間（秒）。処理中はハートビートで延長する
+QUEUE_MAX_ATTEMPTS = 3        # タスクの最大試行回数
+HOST_REQUEST_INTERVAL = 2     # 同一ホストへのリクエスト間隔（全ワーカー合計、秒）
+
+# 常駐モード（main.py daemon）の設定
+DAEMON_CYCLE_INTERVAL = 300       # 収集サイクルの間隔（秒）
+DAEMON_BATCH_SIZE = 50            # 1サイクルで確認する企業数（全企業を順に巡回する）
+DAEMON_COMPANY_INTERVAL = 86400   # 企業情報を収集し直す間隔（秒）
+DAEMON_STATUS_FILE = f"{DATA_DIR}/daemon_status.json"
+DAEMON_STATUS_PORT = 8765         # 状態確認用HTTPサーバー（/health, /status）のポート（Noneで無効）
+DAEMON_STALL_TIMEOUT = 3600       # 1サイクルがこの秒数を超えたら異常とみなす
+DAEMON_NOTIFY_URL = "http://127.0.0.1:5000/api/reload"  # 新しいデータセットを通知するWebアプリのURL（Noneで無効）
+
+# ページ変更検知の設定（インターンシップ情報の要素がないページは、本文全体のsimhashのハミング距離がこの値以下なら未変更とみなす）
+FINGERPRINT_SIMHASH_THRESHOLD = 3
 
 # 企業情報取得数の上限
 MAX_COMPANIES = 1000
+COMPANY_DISCOVERY = "search"  # 就活サイトの企業の探し方（"search": 検索結果のページ送り / "sitemap": サイトマップ）
 
 # 日付フォーマット
 DATE_FORMAT = "%Y-%m-%d"
 
-# ログ設定
-LOG_FILE = "../logs/scraper.log"
+# ログ設定（ログファイルは環境変数 INTERN_SCRAPER_LOG_FILE で変更できる）
+LOG_FILE = os.environ.get("INTERN_SCRAPER_LOG_FILE") or "../logs/scraper.log"
 LOG_LEVEL = "INFO"
+LOG_FORMAT = "text"     # ログファイルの形式（"text" / "json": 1行1件のJSON）
+LOG_SAMPLE_FIRST = 10   # 同じ種類（event）のメッセージをそのまま出力する件数
+LOG_SAMPLE_EVERY = 100  # それ以降は N 件ごとに1件だけ出力する（種類ごとの件数は終了時にまとめて出力する）
+
+# プロファイリング設定（main.py --profile / --profile-stage）
+PROFILE_SAMPLE_RATE = 0.0        # 指定がなくてもプロファイリングする実行の割合（0〜1。本番で一部の実行だけ計測する場合に使う）
+PROFILE_TOP_FUNCTIONS = 30       # レポートに載せる関数・メモリ割り当て箇所の数
+PROFILE_TRACEMALLOC_FRAMES = 1   # メモリ割り当て箇所として記録するスタックの深さ（深くするほど遅くなる）
@@ -0,0 +1,135 @@
+"""
+インターン情報自動取得システム - 分散収集ワーカー
+
+インターンシップ情報の収集を企業単位のタスクとしてワークキューに登録し、複数の
+`main.py worker` プロセスで分担して処理する。各ワーカーの結果はキューに保存され、
+`main.py merge` で通常の収集と同じ形式（INTERNSHIPS_FILE・ストレージ・変更セット）に反映する。
+"""
+
+import os
+import time
+import socket
+
+from config import INTERNSHIPS_FILE, COMPANIES_FILE
+from internship_collector import InternshipCollector
+from storage import BatchWriter
+from profiling import profile_stage
+from records import InternshipRecord
+from work_queue import Heartbeat, url_host
+from utils import JsonlWriter, iter_jsonl, logger
+
+TASK_KIND = "company"
+
+# 処理できるタスクがないときの待機時間（秒）
+IDLE_WAIT = 5
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def company_host(company):
+    """企業のタスクを割り当てる際のホスト（最初にアクセスするページのホスト）"""
+    return url_host(company.get("internship_url") or company.get("career_site"))
+
+def enqueue_companies(queue, companies_file=COMPANIES_FILE, company_ids=None):
+    """企業情報のJSONLから企業ごとの収集タスクを登録する（company_ids を指定した場合はその企業のみ）"""
+    count = queue.enqueue_many(TASK_KIND, (
+        (company["id"], company, company_host(company)) for company in iter_jsonl(companies_file)
+        if company_ids is None or company["id"] in company_ids
+    ))
+    logger.info(f"Enqueued {count} company tasks ({queue.counts(TASK_KIND)})")
+    return count
+
+def process_task(collector, task):
+    """企業のタスクを処理し、キューに保存する結果を返す"""
+    company = task.payload
+    internships = collector.collect_company(company)
+    
+    result = {"unchanged": internships is None,
+              "internships": [internship.to_dict() for internship in internships or []], "urls": [], "pages": {}}
+    if collector.fingerprints is not None:
+        # フィンガープリントはマージ時にまとめて保存する（ワーカーごとに保存すると上書きし合うため）
+        urls = collector.fingerprints.company_urls(company["id"])
+        result["urls"] = urls
+        result["pages"] = {url: collector.fingerprints.pages[url] for url in urls
+                           if url in collector.fingerprints.pages}
+    return result
+
+def run_worker(queue, worker_id=None, use_fingerprints=True, wait=False):
+    """キューからタスクを取り出して処理する
+    
+    wait が False の場合は、未処理・処理中のタスクがなくなった時点で終了する。
+    """
+    worker_id = worker_id or default_worker_id()
+    # collect_company はページの取得と抽出のみを行い、結果はキューに保存する（ファイルやストレージへの反映はマージ時）
+    collector = InternshipCollector([], use_fingerprints=use_fingerprints)
+    collector.before_request = queue.wait_for_host
+    
+    logger.info(f"Worker {worker_id} started")
+    with profile_stage("internship"):
+        processed, failed = _process_tasks(queue, collector, worker_id, wait)
+    logger.info(f"Worker {worker_id} finished: {processed} processed, {failed} failed")
+    return processed
+
+def _process_tasks(queue, collector, worker_id, wait):
+    processed = failed = 0
+    while True:
+        task = queue.claim(worker_id)
+        if task is None:
+            if not wait and not queue.has_unfinished(TASK_KIND):
+                break
+            # 他のワーカーが処理中のタスク（リース切れで取り直せる可能性がある）か新しいタスクを待つ
+            time.sleep(IDLE_WAIT)
+            continue
+        
+        with Heartbeat(queue, task, worker_id) as heartbeat:
+            try:
+                result = process_task(collector, task)
+            except Exception as e:
+                logger.error(f"Error processing task {task.key} (attempt {task.attempts}): {e}")
+                queue.fail(task, worker_id, e)
+                failed += 1
+                continue
+        
+        if heartbeat.lost or not queue.complete(task, worker_id, result):
+            logger.warning(f"Discarded result of task {task.key} because its lease expired")
+            continue
+        processed += 1
+        if processed % 10 == 0:
+            logger.info(f"Worker {worker_id} processed {processed} tasks")
+    return processed, failed
+
+def merge_results(queue, storage=None):
+    """完了したタスクの結果を INTERNSHIPS_FILE とストレージに反映し、変更セットを記録する
+    
+    反映した企業数を返す（反映する結果がない場合は0）。
+    """
+    with profile_stage("merge"):
+        return _merge_results(queue, storage)
+
+def _merge_results(queue, storage):
+    collector = InternshipCollector([], storage=storage)
+    partial_file = f"{INTERNSHIPS_FILE}.partial"
+    batch = BatchWriter(collector.storage) if collector.storage is not None else None
+    
+    task_ids = []
+    with JsonlWriter(partial_file, mode='w') as writer:
+        for task_id, company_id, result in queue.iter_results(TASK_KIND):
+            task_ids.append(task_id)
+            collector.fingerprints.pages.update(result["pages"])
+            if result["urls"]:
+                collector.fingerprints.set_company_urls(company_id, result["urls"])
+            if result["unchanged"]:
+                collector.unchanged_count += 1
+                continue
+            internships = [InternshipRecord.from_dict(internship) for internship in result["internships"]]
+            collector.add_company_internships(writer, batch, company_id, internships)
+    
+    if not task_ids:
+        os.remove(partial_file)
+        logger.info("No finished tasks to merge")
+        return 0
+    
+    collector.save_collected(partial_file, batch)
+    queue.mark_merged(task_ids)
+    logger.info(f"Merged results of {len(task_ids)} companies ({queue.counts(TASK_KIND)})")
+    return len(task_ids)
@@ -0,0 +1,255 @@
+"""
+インターン情報自動取得システム - 常駐モード（main.py daemon）
+
+cron で毎回起動する代わりにプロセスを常駐させ、企業一覧・ページのフィンガープリント・HTTPセッションを
+保持したまま、一定間隔で少数の企業ずつインターンシップ情報を確認する（全企業を順に巡回する）。
+変更があればそのサイクルで結合データを差分更新して静的APIスナップショットを書き出し、Webアプリに新しい
+データセットを通知する。
+実行状態は状態ファイルと /health・/status（DAEMON_STATUS_PORT）で確認できる。
+"""
+
+import os
+import json
+import time
+import signal
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from config import COMPANIES_FILE, CHANGES_FILE, SNAPSHOT_FILE, STATIC_API_DIR, DAEMON_CYCLE_INTERVAL, DAEMON_BATCH_SIZE, \
+    DAEMON_COMPANY_INTERVAL, DAEMON_STATUS_FILE, DAEMON_STATUS_PORT, DAEMON_STALL_TIMEOUT, DAEMON_NOTIFY_URL
+from change_set import ChangeSet
+from company_collector import CompanyCollector
+from fingerprint import FingerprintStore
+from internship_collector import InternshipCollector, combine_pending_changes
+from storage import get_storage
+from static_api import build_static_api
+from rate_control import host_metrics
+from utils import iter_jsonl, logger
+
+def load_status(status_file=DAEMON_STATUS_FILE):
+    """状態ファイルを読み込む（ない場合は空の辞書）"""
+    try:
+        with open(status_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+class CrawlDaemon:
+    """一定間隔で差分収集のサイクルを実行する常駐プロセス"""
+    
+    def __init__(self, interval=DAEMON_CYCLE_INTERVAL, batch_size=DAEMON_BATCH_SIZE,
+                 company_interval=DAEMON_COMPANY_INTERVAL, status_file=DAEMON_STATUS_FILE,
+                 status_port=DAEMON_STATUS_PORT, notify_url=DAEMON_NOTIFY_URL, use_fingerprints=True):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.company_interval = company_interval
+        self.status_file = status_file
+        self.status_port = status_port
+        self.notify_url = notify_url
+        
+        # サイクルをまたいで保持する状態
+        self.storage = get_storage()
+        self.fingerprints = FingerprintStore(storage=self.storage) if use_fingerprints else None
+        self.companies = []
+        self._companies_key = None
+        
+        # 前回の巡回位置などは再起動後も引き継ぐ
+        previous = load_status(status_file)
+        self.status = {
+            "state": "starting",
+            "pid": os.getpid(),
+            "started_at": _now(),
+            "cycles": 0,
+            "cursor": previous.get("cursor", 0),
+            "total_companies": 0,
+            "last_company_refresh": previous.get("last_company_refresh"),
+            "cycle_started_at": None,
+            "last_cycle_finished_at": previous.get("last_cycle_finished_at"),
+            "last_cycle_seconds": None,
+            "last_changed_companies": 0,
+            "last_dataset_update": previous.get("last_dataset_update"),
+            "last_error": None,
+            "next_cycle_at": None,
+        }
+        self._cycle_started = None
+        self._status_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+    
+    # 状態
+    def update_status(self, **values):
+        with self._status_lock:
+            self.status.update(values)
+            status = dict(self.status)
+        tmp_file = f"{self.status_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.status_file)
+    
+    def health(self):
+        """(正常か, 状態) を返す（直前のサイクルが失敗した場合や、サイクルが長時間終わらない場合は異常）"""
+        with self._status_lock:
+            status = dict(self.status)
+        healthy = status["last_error"] is None
+        if self._cycle_started is not None and time.monotonic() - self._cycle_started > DAEMON_STALL_TIMEOUT:
+            healthy = False
+        return healthy, status
+    
+    def start_status_server(self):
+        """/health と /status を返すHTTPサーバーをバックグラウンドで起動する"""
+        if not self.status_port:
+            return
+        daemon = self
+        
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                healthy, status = daemon.health()
+                if self.path == "/health":
+                    body = {"healthy": healthy, "state": status["state"]}
+                    code = 200 if healthy else 503
+                elif self.path == "/status":
+                    body = dict(status, healthy=healthy)
+                    code = 200
+                else:
+                    body = {"error": "Not found"}
+                    code = 404
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass  # アクセスログは出力しない
+        
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.status_port), StatusHandler)
+        threading.Thread(target=self._server.serve_forever, name="daemon-status", daemon=True).start()
+        logger.info(f"Daemon status available at http://127.0.0.1:{self.status_port}/status")
+    
+    # 収集
+    def load_companies(self):
+        """企業一覧を読み込む（ファイルが更新されていなければ読み込み済みのものを使う）"""
+        try:
+            stat = os.stat(COMPANIES_FILE)
+        except OSError:
+            self.companies = []
+            return
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._companies_key:
+            self.companies = list(iter_jsonl(COMPANIES_FILE))
+            self._companies_key = key
+            logger.info(f"Loaded {len(self.companies)} companies")
+        self.update_status(total_companies=len(self.companies))
+    
+    def company_refresh_due(self):
+        last = self.status["last_company_refresh"]
+        if not last or not os.path.exists(COMPANIES_FILE):
+            return True
+        return (datetime.now() - datetime.fromisoformat(last)).total_seconds() >= self.company_interval
+    
+    def next_batch(self):
+        """巡回位置から batch_size 件の企業と、処理後の巡回位置を返す"""
+        if not self.companies:
+            return [], 0
+        cursor = self.status["cursor"] % len(self.companies)
+        batch = [self.companies[(cursor + i) % len(self.companies)]
+                 for i in range(min(self.batch_size, len(self.companies)))]
+        return batch, (cursor + len(batch)) % len(self.companies)
+    
+    def run_cycle(self):
+        """1サイクル分の収集・結合・通知を行い、データセットを更新した場合はTrueを返す"""
+        self._cycle_started = time.monotonic()
+        self.update_status(state="running", cycle_started_at=_now())
+        
+        if self.company_refresh_due():
+            self.update_status(state="collecting_companies")
+            CompanyCollector(storage=self.storage).run()
+            self.update_status(last_company_refresh=_now())
+        self.load_companies()
+        
+        batch, next_cursor = self.next_batch()
+        if batch:
+            self.update_status(state="crawling")
+            InternshipCollector(batch, len(batch), storage=self.storage, fingerprints=self.fingerprints).run()
+            # 失敗した場合は次のサイクルで同じ企業から確認し直す
+            self.update_status(cursor=next_cursor)
+        else:
+            logger.warning("No companies to crawl")
+        
+        changes = ChangeSet.load(CHANGES_FILE)
+        updated = changes is not None and not changes.is_empty()
+        if updated:
+            self.update_status(state="combining")
+            if not combine_pending_changes(storage=self.storage):
+                raise RuntimeError("Failed to combine data")
+            self.update_status(last_dataset_update=_now())
+            self.write_static_api()
+            self.notify_app()
+        
+        self.update_status(
+            last_cycle_finished_at=_now(),
+            last_cycle_seconds=round(time.monotonic() - self._cycle_started, 1),
+            last_changed_companies=len(changes.affected_company_ids) if updated else 0,
+            cycles=self.status["cycles"] + 1,
+            last_error=None,
+            hosts=host_metrics()
+        )
+        self._cycle_started = None
+        return updated
+    
+    def write_static_api(self):
+        """新しいデータセットの静的APIスナップショットを書き出す（失敗してもWebアプリはビュー関数で応答する）"""
+        try:
+            build_static_api(SNAPSHOT_FILE, STATIC_API_DIR)
+        except Exception as e:
+            logger.error(f"Failed to write static API responses: {e}")
+    
+    def notify_app(self):
+        """Webアプリに新しいデータセットを通知する（通知できなくてもアプリは更新日時の確認で検知する）"""
+        if not self.notify_url:
+            return
+        try:
+            response = requests.post(self.notify_url, timeout=5)
+            logger.info(f"Notified web app of the new dataset ({response.status_code})")
+        except requests.RequestException as e:
+            logger.warning(f"Failed to notify web app: {e}")
+    
+    def run(self):
+        """停止を指示されるまで収集サイクルを繰り返す"""
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.stop())
+        self.start_status_server()
+        logger.info(f"Daemon started (interval {self.interval}s, {self.batch_size} companies per cycle)")
+        
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.run_cycle()
+                except Exception as e:
+                    logger.error(f"Daemon cycle failed: {e}")
+                    self._cycle_started = None
+                    self.update_status(last_error=f"{_now()} {e}")
+                
+                next_cycle = datetime.fromtimestamp(time.time() + self.interval).isoformat(timespec="seconds")
+                self.update_status(state="idle", next_cycle_at=next_cycle)
+                self._stop.wait(self.interval)
+        finally:
+            self.update_status(state="stopped", next_cycle_at=None)
+            if self._server is not None:
+                self._server.shutdown()
+            if self.storage is not None:
+                self.storage.close()
+            logger.info("Daemon stopped")
+    
+    def stop(self):
+        """現在のサイクルが終わった時点で停止する（シグナルハンドラから呼ばれるため、フラグを立てるだけにする）"""
+        if not self._stop.is_set():
+            logger.info("Stopping daemon after the current cycle")
+        self._stop.set()
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
@@ -0,0 +1,430 @@
+"""
+インターン情報自動取得システム - Webアプリケーション用データセット（メモリ常駐・自動再読み込み）
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from array import array
+from collections import Counter
+
+from utils import logger
+from records import InternshipRecord
+from date_index import DateIndex
+from search_index import SearchIndex, COMPANY_FIELDS, INTERNSHIP_FIELDS, query_terms, highlight
+
+EMPTY_META = {"last_updated": "N/A", "total_companies": 0, "total_internships": 0}
+
+# インターンシップ一覧の絞り込みに使う項目（値ごとに行位置の索引を作る）
+FILTER_FIELDS = ("company_id", "industry", "market", "source", "deadline_month")
+
+# 件数を集計する項目（/api/facets 用）
+FACET_FIELDS = ("source", "market", "industry", "deadline_month")
+
+# 絞り込み条件ごとの集計結果をキャッシュする件数
+FACET_CACHE_SIZE = 256
+
+# 並び替えに使える項目（先頭に "-" を付けると降順）
+SORT_FIELDS = ("start_date", "end_date", "company_name", "title")
+
+def internship_row(company, internship):
+    """APIで返すインターンシップ情報の形式に整形する（JSONにする際は to_dict で辞書に変換する）"""
+    return InternshipRecord(
+        id=internship.get("id", ""),
+        company_id=company.get("id", ""),
+        company_name=company.get("name", ""),
+        title=internship.get("title", ""),
+        period=internship.get("period", ""),
+        start_date=internship.get("start_date", ""),
+        end_date=internship.get("end_date", ""),
+        target=internship.get("target", ""),
+        application_url=internship.get("application_url", ""),
+        source=internship.get("source", ""),
+        last_updated=internship.get("last_updated", "")
+    )
+
+class Dataset:
+    """読み込み済みの結合データと、APIで使う索引・整形済みデータを保持するクラス
+    
+    読み込み後は変更しない（再読み込み時は新しいインスタンスに差し替える）。
+    
+    reader（SnapshotReader）を渡した場合は companies の代わりにスナップショットの企業情報をすべてデコードして
+    保持し、読み込み後はスナップショットを閉じる（リクエストごとにメモリマップからデコードすると、1ページの
+    取得がメモリに保持する場合の数百倍遅くなるため）。
+    """
+    
+    def __init__(self, companies, meta, version="empty", search_index=None, reader=None):
+        self.meta = meta
+        self.version = version
+        self.reader = reader
+        
+        if reader is not None:
+            companies = list(reader.iter_companies())
+            reader.close()
+        self.companies = companies
+        self.companies_by_id = {}
+        self.internship_rows = []     # /api/internships 用
+        self._company_at = companies.__getitem__
+        
+        self.company_summaries = []   # /api/companies 用
+        self.summaries_by_source = {} # 企業の取得元 -> company_summaries の部分リスト
+        self.positions_by_company = {}  # 企業ID -> 行位置の範囲
+        self.positions_by_id = {}     # インターンシップID -> 行位置
+        self._row_companies = array('i')  # 行位置 -> 企業の位置
+        self._row_indexes = array('i')    # 行位置 -> 企業内でのインターンシップの位置
+        
+        # 絞り込み用の列（行位置ごとの値）と索引（値 -> 行位置のリスト）
+        self.columns = {field: [] for field in FILTER_FIELDS}
+        self.filter_index = {field: {} for field in FILTER_FIELDS}
+        self.sort_columns = {field: [] for field in SORT_FIELDS}
+        self.search_texts = []        # 行ごとの検索対象文字列（小文字化済み）
+        self._sort_cache = {}         # 並び替え項目 -> (行位置の並び, 行位置ごとの順位)
+        self._facet_cache = {}        # 絞り込み条件 -> 集計結果
+        
+        for company_position, company in enumerate(companies):
+            company_id = company.get("id", "")
+            internships = company.get("internships", [])
+            
+            summary = {
+                "id": company_id,
+                "name": company.get("name", ""),
+                "market": company.get("market", ""),
+                "industry": company.get("industry", ""),
+                "internship_count": len(internships)
+            }
+            self.companies_by_id[company_id] = company
+            self.company_summaries.append(summary)
+            self.summaries_by_source.setdefault(company.get("source") or "", []).append(summary)
+            
+            first_position = len(self._row_companies)
+            for index, internship in enumerate(internships):
+                row = internship_row(company, internship)
+                position = len(self._row_companies)
+                self._row_companies.append(company_position)
+                self._row_indexes.append(index)
+                self.internship_rows.append(row)
+                self.positions_by_id[row["id"]] = position
+                
+                values = {
+                    "company_id": company_id,
+                    "industry": company.get("industry") or "",
+                    "market": company.get("market") or "",
+                    "source": row["source"] or "",
+                    "deadline_month": (row["end_date"] or "")[:7],
+                }
+                for field, value in values.items():
+                    self.columns[field].append(value)
+                    self.filter_index[field].setdefault(value, []).append(position)
+                for field in SORT_FIELDS:
+                    self.sort_columns[field].append(row[field] or "")
+                self.search_texts.append(f"{row['company_name'] or ''}\n{row['title'] or ''}".lower())
+            self.positions_by_company[company_id] = range(first_position, len(self._row_companies))
+        
+        # 全文検索の索引（DatasetManager からは再読み込みをまたいで共有する索引が渡される）
+        if search_index is None:
+            search_index = SearchIndex()
+            search_index.update(self.companies)
+        self.search_index = search_index
+        
+        # 開始日・締切日の索引
+        self.date_index = DateIndex(self.sort_columns["start_date"], self.sort_columns["end_date"])
+        
+        # 絞り込みなしの集計は索引の件数から作っておく
+        self._facet_cache[()] = {
+            "facets": {
+                field: _facet_values({value: len(positions) for value, positions in self.filter_index[field].items()},
+                                     field)
+                for field in FACET_FIELDS
+            },
+            "total": len(self.internship_rows)
+        }
+    
+    @classmethod
+    def empty(cls):
+        return cls([], dict(EMPTY_META))
+    
+    def get_internship(self, internship_id):
+        """インターンシップ情報を企業ID・企業名付きで返す（存在しない場合はNone）"""
+        position = self.positions_by_id.get(internship_id)
+        if position is None:
+            return None
+        company = self._company_at(self._row_companies[position])
+        internship = company["internships"][self._row_indexes[position]]
+        return dict(internship, company_id=company.get("id", ""), company_name=company.get("name", ""))
+    
+    def _sort_order(self, sort):
+        """並び替え済みの行位置と、行位置ごとの順位を返す（初回のみ計算してキャッシュする）"""
+        cached = self._sort_cache.get(sort)
+        if cached is None:
+            column = self.sort_columns[sort.lstrip("-")]
+            present = [p for p in range(len(column)) if column[p]]
+            missing = [p for p in range(len(column)) if not column[p]]
+            present.sort(key=column.__getitem__, reverse=sort.startswith("-"))
+            
+            # 値のない行は昇順・降順のどちらでも末尾に置く
+            order = present + missing
+            ranks = [0] * len(column)
+            for rank, position in enumerate(order):
+                ranks[position] = rank
+            cached = self._sort_cache[sort] = (order, ranks)
+        return cached
+    
+    def query_internships(self, filters, sort=None):
+        """条件に一致するインターンシップの行位置を返す
+        
+        filters には FILTER_FIELDS の値のほか、q（企業名・タイトルの部分一致）、
+        date_from / date_to（開始日〜締切日が期間と重なるもの）、deadline_from / deadline_to
+        （締切日がその範囲にあるもの）を指定できる。
+        """
+        # 索引で得られる候補のうち最も少ないものから始め、残りの条件は列の値か集合で確認する
+        sources = []   # (行位置のリスト, 列による確認 (列, 値) または None)
+        for field in FILTER_FIELDS:
+            value = filters.get(field)
+            if value:
+                sources.append((self.filter_index[field].get(value, []), (self.columns[field], value)))
+        if filters.get("date_from") or filters.get("date_to"):
+            sources.append((self.date_index.overlapping(filters.get("date_from"), filters.get("date_to")), None))
+        if filters.get("deadline_from") or filters.get("deadline_to"):
+            sources.append((self.date_index.ending_between(filters.get("deadline_from"), filters.get("deadline_to")),
+                            None))
+        
+        checks = []
+        required = []
+        if sources:
+            sources.sort(key=lambda source: len(source[0]))
+            candidates, check = sources[0]
+            if check is None:
+                # 日付の索引の結果は行位置の順になっていない
+                candidates = sorted(candidates)
+            for positions, check in sources[1:]:
+                if check is not None:
+                    checks.append(check)
+                else:
+                    required.append(set(positions))
+        else:
+            candidates = range(len(self.internship_rows))
+        
+        q = (filters.get("q") or "").strip().lower()
+        
+        if checks or required or q:
+            texts = self.search_texts
+            matched = []
+            for position in candidates:
+                if any(column[position] != value for column, value in checks):
+                    continue
+                if any(position not in positions for positions in required):
+                    continue
+                if q and q not in texts[position]:
+                    continue
+                matched.append(position)
+            candidates = matched
+        
+        if sort:
+            order, ranks = self._sort_order(sort)
+            if len(candidates) == len(self.internship_rows):
+                return order
+            return sorted(candidates, key=ranks.__getitem__)
+        return candidates
+    
+    def facets(self, filters):
+        """FACET_FIELDS の値ごとのインターンシップ件数（facets）と絞り込み結果の件数（total）を返す
+        
+        各項目の件数は、その項目以外の絞り込み条件を適用した結果で数える（選択中の項目でも
+        他の選択肢の件数が分かるようにするため）。結果は絞り込み条件ごとにキャッシュする。
+        """
+        active = tuple(sorted((field, value) for field, value in filters.items() if value))
+        cached = self._facet_cache.get(active)
+        if cached is not None:
+            return cached
+        
+        matched = self.query_internships(filters)
+        result = {"facets": {}, "total": len(matched)}
+        for field in FACET_FIELDS:
+            if filters.get(field):
+                positions = self.query_internships(dict(filters, **{field: ""}))
+            else:
+                # 集計項目自体で絞り込んでいない場合は全条件での絞り込み結果を共有する
+                positions = matched
+            column = self.columns[field]
+            result["facets"][field] = _facet_values(Counter(column[position] for position in positions), field)
+        
+        if len(self._facet_cache) >= FACET_CACHE_SIZE:
+            self._facet_cache = {(): self._facet_cache[()]}
+        self._facet_cache[active] = result
+        return result
+    
+    def search(self, query, kind=None, limit=20, offset=0):
+        """全文検索の結果を (一致件数, 結果のリスト) で返す
+        
+        結果には一致した項目をハイライトしたHTML（highlight）と、一覧APIと同じ形式の情報（item）を含める。
+        """
+        total, hits = self.search_index.search(query, kind=kind, limit=limit, offset=offset)
+        terms = query_terms(query)
+        
+        results = []
+        for score, doc_kind, ref_id, company_id in hits:
+            if doc_kind == "company":
+                company = self.companies_by_id.get(ref_id)
+                item = company and {key: value for key, value in company.items() if key != "internships"}
+                fields = COMPANY_FIELDS
+            else:
+                position = self.positions_by_id.get(ref_id)
+                item = None if position is None else self.internship_rows[position].to_dict()
+                fields = INTERNSHIP_FIELDS
+            if item is None:
+                # 索引の更新後、データセットの差し替え前に届いたリクエスト
+                continue
+            
+            highlights = {}
+            for field in fields:
+                marked = highlight(item.get(field), terms)
+                if marked:
+                    highlights[field] = marked
+            results.append({
+                "type": doc_kind,
+                "id": ref_id,
+                "company_id": company_id,
+                "score": score,
+                "highlight": highlights,
+                "item": item
+            })
+        return total, results
+
+def _facet_values(counts, field):
+    """集計結果を [{"value", "count"}] の形式に整形する（締切月は月順、それ以外は件数の多い順）"""
+    values = [(value, count) for value, count in counts.items() if value and count]
+    if field == "deadline_month":
+        values.sort()
+    else:
+        values.sort(key=lambda item: (-item[1], item[0]))
+    return [{"value": value, "count": count} for value, count in values]
+
+class DatasetManager:
+    """データファイルの更新を検知してデータセットを再読み込みするクラス
+    
+    リクエストごとの確認は check_interval 秒に1回の stat のみで、更新を検知した場合は
+    バックグラウンドのスレッドで読み込み、完了後にデータセットを差し替える。処理中の
+    リクエストは差し替え前のデータセットを参照し続けるため、読み込み途中の状態は見えない。
+    
+    スナップショットから読み込む場合はデータセットが企業情報をデコードしてからスナップショットを閉じる
+    （Dataset の reader）。バージョンにはスナップショットの内容から求めた値を使うため、同じファイルを読む
+    ワーカー間でETagなどが一致する。
+    """
+    
+    def __init__(self, combined_file, snapshot_file=None, check_interval=2.0):
+        self.combined_file = combined_file
+        self.snapshot_file = snapshot_file
+        self.check_interval = check_interval
+        
+        self._current = None
+        self._current_key = None
+        self._failed_key = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._loading = False
+        self.search_index = SearchIndex()   # 再読み込み時は変更のあった企業だけを索引し直す
+    
+    def get(self):
+        """現在のデータセットを返す（初回のみ読み込み完了まで待つ）"""
+        if self._current is None:
+            with self._lock:
+                if self._current is None:
+                    self._reload(self._source_key())
+                    self._next_check = time.monotonic() + self.check_interval
+            return self._current
+        
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            key = self._source_key()
+            if key != self._current_key and key != self._failed_key:
+                self._start_background_reload(key)
+        
+        return self._current
+    
+    @property
+    def version(self):
+        """現在のデータセットのバージョン（未読み込みの場合はNone）"""
+        return self._current.version if self._current is not None else None
+    
+    def refresh(self):
+        """データファイルの更新を直ちに確認し、更新されていればバックグラウンドで読み込みを始める
+        
+        収集デーモンからの通知で呼び出す。読み込みを始めた場合はTrueを返す。
+        """
+        if self._current is None:
+            return False
+        self._next_check = time.monotonic() + self.check_interval
+        key = self._source_key()
+        if key == self._current_key:
+            return False
+        self._start_background_reload(key)
+        return True
+    
+    def _source_key(self):
+        """読み込み元とその更新日時・サイズの組（変更検知に使う）"""
+        combined = _stat_key(self.combined_file)
+        if self.snapshot_file:
+            snapshot = _stat_key(self.snapshot_file)
+            if snapshot and (not combined or snapshot[0] >= combined[0]):
+                return ("snapshot", snapshot)
+        return ("json", combined)
+    
+    def _start_background_reload(self, key):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        
+        def run():
+            try:
+                self._reload(key)
+            finally:
+                self._loading = False
+        
+        threading.Thread(target=run, name="dataset-reload", daemon=True).start()
+    
+    def _reload(self, key):
+        start = time.perf_counter()
+        try:
+            companies, meta, reader = self._load(key[0])
+        except Exception as e:
+            logger.error(f"Error loading data: {e}")
+            self._failed_key = key
+            if self._current is None:
+                self._current = Dataset.empty()
+            return
+        
+        if reader is not None and reader.version:
+            version = reader.version
+        else:
+            version = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+        dataset = Dataset(companies, meta, version, search_index=self.search_index, reader=reader)
+        reindexed = self.search_index.update(dataset.companies)
+        
+        # 参照の差し替えのみで切り替える
+        self._current = dataset
+        self._current_key = key
+        self._failed_key = None
+        logger.info(f"Loaded dataset {version} from {key[0]} "
+                    f"({len(dataset.company_summaries)} companies, {reindexed} reindexed) in {time.perf_counter() - start:.2f}s")
+    
+    def _load(self, kind):
+        if kind == "snapshot":
+            from snapshot import SnapshotReader
+            # 開いたスナップショットはデータセットがデコードした後に閉じる
+            reader = SnapshotReader(self.snapshot_file)
+            return None, reader.meta, reader
+        
+        with open(self.combined_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get("companies", []), data.get("meta", dict(EMPTY_META)), None
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,118 @@
+"""
+インターン情報自動取得システム - 開始日・締切日の索引
+
+締切日の範囲検索は締切日順に並べた配列の二分探索で、期間が重なるものの検索は
+区間木（centered interval tree）で行う。どちらも O(log n + 該当件数) で答える。
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+def parse_iso_date(value):
+    """YYYY-MM-DD 形式の日付を序数（date.toordinal）に変換する（解釈できない場合はNone）"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10]).toordinal()
+    except ValueError:
+        return None
+
+class _IntervalNode:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+    
+    def __init__(self, center, intervals):
+        self.center = center
+        self.by_start = sorted(intervals)                                    # 開始日の昇順
+        self.by_end = sorted(intervals, key=lambda item: item[1], reverse=True)  # 終了日の降順
+        self.left = None
+        self.right = None
+
+class DateIndex:
+    """インターンシップの期間（開始日〜締切日）の索引
+    
+    開始日・締切日の片方しかない場合はその日だけの期間として扱い、どちらもないものは索引に含めない。
+    """
+    
+    def __init__(self, start_dates, end_dates):
+        """start_dates / end_dates は行位置ごとの開始日・締切日（YYYY-MM-DD）の列"""
+        intervals = []
+        deadlines = []
+        for position, (start_date, end_date) in enumerate(zip(start_dates, end_dates)):
+            start = parse_iso_date(start_date)
+            end = parse_iso_date(end_date)
+            if start is None and end is None:
+                continue
+            if end is not None:
+                deadlines.append((end, position))
+            start = start if start is not None else end
+            end = end if end is not None else start
+            intervals.append((min(start, end), max(start, end), position))
+        
+        # 締切日順の配列（締切日の範囲検索用）
+        deadlines.sort()
+        self._deadline_keys = [end for end, _ in deadlines]
+        self._deadline_positions = [position for _, position in deadlines]
+        
+        self._root = self._build(intervals)
+        self.size = len(intervals)
+    
+    def __len__(self):
+        return self.size
+    
+    @classmethod
+    def _build(cls, intervals):
+        if not intervals:
+            return None
+        
+        # 端点の中央値を中心に、中心をまたぐ区間をこのノードに、残りを左右の子に振り分ける
+        endpoints = sorted(point for start, end, _ in intervals for point in (start, end))
+        center = endpoints[len(endpoints) // 2]
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        
+        node = _IntervalNode(center, here)
+        node.left = cls._build(left)
+        node.right = cls._build(right)
+        return node
+    
+    def ending_between(self, date_from=None, date_to=None):
+        """締切日が date_from〜date_to（YYYY-MM-DD、両端を含む）の行位置を締切日順に返す"""
+        lo = bisect_left(self._deadline_keys, parse_iso_date(date_from)) if date_from else 0
+        hi = bisect_right(self._deadline_keys, parse_iso_date(date_to)) if date_to else len(self._deadline_keys)
+        return self._deadline_positions[lo:hi]
+    
+    def overlapping(self, date_from=None, date_to=None):
+        """期間が date_from〜date_to（YYYY-MM-DD、両端を含む）と重なる行位置を返す（順不同）"""
+        lo = parse_iso_date(date_from) if date_from else float("-inf")
+        hi = parse_iso_date(date_to) if date_to else float("inf")
+        
+        result = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if hi < node.center:
+                # このノードの区間はすべて中心をまたぐため、開始日が hi 以前なら重なる
+                for start, _, position in node.by_start:
+                    if start > hi:
+                        break
+                    result.append(position)
+                stack.append(node.left)
+            elif lo > node.center:
+                for _, end, position in node.by_end:
+                    if end < lo:
+                        break
+                    result.append(position)
+                stack.append(node.right)
+            else:
+                result.extend(position for _, _, position in node.by_start)
+                stack.append(node.left)
+                stack.append(node.right)
+        return result
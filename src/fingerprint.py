@@ -0,0 +1,145 @@
+"""
+インターン情報自動取得システム - ページフィンガープリント管理モジュール
+"""
+
+import hashlib
+import re
+
+from config import FINGERPRINTS_FILE, FINGERPRINT_SIMHASH_THRESHOLD
+from utils import save_json, load_json, logger
+
+# インターンシップ情報が含まれる要素（広告や更新日時などの変化を無視するため、この部分のみ比較する）
+RELEVANT_SELECTORS = ', '.join([
+    '.internship-box',     # マイナビ
+    '.internshipBox',      # リクナビ
+    '.internship-item',    # キャリタス就活
+    '.internship', '.intern', '#internship', '#intern', 'table',  # 企業採用サイト
+])
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+def content_hash(text):
+    """ページ本文のハッシュ値を返す"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+# 本文全体を使う場合に除く要素
+EXCLUDED_TAGS = ['script', 'style', 'noscript']
+
+def normalize_text(text):
+    """空白の違いを無視するため、連続する空白を1つにまとめる"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+def section_text(soup):
+    """インターンシップ情報が含まれる要素の正規化したテキスト（該当要素がない場合はNone）"""
+    elements = soup.select(RELEVANT_SELECTORS)
+    if not elements:
+        return None
+    return normalize_text(' '.join(element.get_text(' ') for element in elements))
+
+def relevant_text(soup):
+    """比較対象となる部分木のテキストを抽出する"""
+    text = section_text(soup)
+    if text is not None:
+        return text
+    
+    # 該当要素がない場合はスクリプト等を除いた本文全体を使用
+    # （soup は呼び出し元で抽出にも使うため、要素を削除せずに読み飛ばす）
+    root = soup.body or soup
+    return normalize_text(' '.join(string for string in root.strings if string.find_parent(EXCLUDED_TAGS) is None))
+
+def section_hash(soup):
+    """インターンシップ情報が含まれる要素のテキストのハッシュ値（該当要素がない場合はNone）"""
+    text = section_text(soup)
+    return content_hash(text) if text is not None else None
+
+def simhash(text):
+    """文字n-gramから64bitのsimhashを計算する（日本語でも分かち書き不要）"""
+    weights = {}
+    for i in range(max(len(text) - SHINGLE_SIZE + 1, 1)):
+        shingle = text[i:i + SHINGLE_SIZE]
+        weights[shingle] = weights.get(shingle, 0) + 1
+    
+    vector = [0] * SIMHASH_BITS
+    for shingle, weight in weights.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            if h >> bit & 1:
+                vector[bit] += weight
+            else:
+                vector[bit] -= weight
+    
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        if vector[bit] > 0:
+            value |= 1 << bit
+    return value
+
+def hamming_distance(a, b):
+    """2つのハッシュ値のハミング距離を返す"""
+    return bin(a ^ b).count('1')
+
+class FingerprintStore:
+    """URLごとのページフィンガープリントと、企業ごとの取得URLを保持するクラス"""
+    
+    def __init__(self, filepath=FINGERPRINTS_FILE, threshold=FINGERPRINT_SIMHASH_THRESHOLD, storage=None):
+        self.filepath = filepath
+        self.threshold = threshold
+        self.storage = storage  # 指定された場合はストレージの crawl_state に保存する
+        
+        if storage is not None:
+            self.pages, self.companies = storage.load_crawl_state()
+        else:
+            data = load_json(filepath) or {}
+            self.pages = data.get("pages", {})          # URL -> {"sha256", "section", "simhash"}
+            self.companies = data.get("companies", {})  # 企業ID -> 前回取得したURLのリスト
+    
+    def company_urls(self, company_id):
+        """前回の実行で企業の情報取得に使用したURLを返す"""
+        return self.companies.get(company_id, [])
+    
+    def set_company_urls(self, company_id, urls):
+        self.companies[company_id] = list(urls)
+    
+    def is_unchanged(self, url, text, parse):
+        """前回取得時からページ内容が実質的に変化していないかを判定する
+        
+        本文のハッシュ値が一致すればパースせずに未変更と判定する。一致しない場合のみ
+        parse() でBeautifulSoupを生成し、インターンシップ情報の要素があればそのテキストのハッシュ値が
+        完全に一致する場合だけ未変更とする（日付などの1文字の変更でも取り直す）。該当要素がなく本文全体を
+        比較するページは、広告などの差分を無視するため simhash のハミング距離で判定する。
+        """
+        previous = self.pages.get(url)
+        if not previous:
+            return False
+        
+        sha256 = content_hash(text)
+        if previous["sha256"] == sha256:
+            return True
+        
+        soup = parse()
+        section = section_hash(soup)
+        if section is not None or previous.get("section") is not None:
+            unchanged = section == previous.get("section")
+        else:
+            unchanged = hamming_distance(previous["simhash"], simhash(relevant_text(soup))) <= self.threshold
+        
+        if unchanged:
+            # 対象外の部分の差分のみ：次回はハッシュ値で判定できるよう更新する
+            previous["sha256"] = sha256
+        return unchanged
+    
+    def update(self, url, text, soup):
+        """ページのフィンガープリントを記録する"""
+        self.pages[url] = {
+            "sha256": content_hash(text),
+            "section": section_hash(soup),
+            "simhash": simhash(relevant_text(soup)),
+        }
+    
+    def save(self):
+        if self.storage is not None:
+            self.storage.save_crawl_state(self.pages, self.companies)
+        else:
+            save_json({"pages": self.pages, "companies": self.companies}, self.filepath)
+        logger.info(f"Saved fingerprints for {len(self.pages)} pages")
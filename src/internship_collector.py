@@ -4,23 +4,105 @@
 
 import os
 import re
-import time
-import logging
+import json
 from datetime import datetime
 from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 
-from config import INTERNSHIPS_FILE, DATA_DIR
-from utils import get_soup, save_json, load_json, parse_date, verify_internship_data, logger
+from config import COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE, CHANGES_FILE, SNAPSHOT_FILE, MAX_PAGE_BYTES
+from fingerprint import FingerprintStore
+from snapshot import write_snapshot, update_snapshot
+from storage import get_storage, BatchWriter
+from change_set import ChangeSet
+from profiling import profile_stage
+from records import InternshipRecord, today
+from utils import fetch_page, job_site_for_url, pause, JsonlWriter, iter_jsonl, iter_records, save_jsonl, save_json, load_json, parse_date, verify_internship_data, logger
+
+def page_fetch_options(url):
+    """URLのページを取得する際の fetch_page のオプション（就活サイトは一覧を読み終えた時点で打ち切る）"""
+    site = job_site_for_url(url)
+    if site is None:
+        return {"max_bytes": MAX_PAGE_BYTES}
+    return {"max_bytes": site.get("max_page_bytes", MAX_PAGE_BYTES), "stop_after": site.get("stop_after")}
 
 class InternshipCollector:
     """企業の公式採用ページからインターンシップ情報を収集するクラス"""
     
-    def __init__(self, companies):
-        self.companies = companies
-        self.internships = []
-        self.internship_ids = set()  # 重複チェック用
+    def __init__(self, companies, total_companies=None, use_fingerprints=True, storage=None, fingerprints=None):
+        self.companies = companies  # 企業情報のリストまたはイテレータ
+        self.total_companies = total_companies if total_companies is not None else (
+            len(companies) if hasattr(companies, "__len__") else "?")
+        self.internship_ids = set()  # 重複チェック用（今回の実行で取得したID）
+        self.internship_count = 0
+        self.changes = ChangeSet()   # 結合データの差分更新に使う変更セット
+        
+        # SQLiteなどのストレージ（設定されている場合はJSONLと合わせて書き込む）
+        self.storage = storage if storage is not None else get_storage()
+        
+        # ページ変更検知（未変更の企業は前回の取得結果を再利用する。常駐モードでは読み込み済みのものを渡す）
+        if fingerprints is not None:
+            self.fingerprints = fingerprints
+        else:
+            self.fingerprints = FingerprintStore(storage=self.storage) if use_fingerprints else None
+        self.unchanged_count = 0
+        self._page_cache = {}     # 変更検知のために取得したページ（URL -> (HTML, soup)）
+        self._fetched_urls = []   # 処理中の企業で取得したURL
+        
+        # リクエスト前に呼び出す関数（分散収集ではワーカー間で共有するホストごとの間隔制御を設定する）
+        self.before_request = None
+        
+        self._collected_company_ids = set()
+        self._collected_titles = set()  # (企業ID, タイトル) 既存データの更新判定用
+    
+    def fetch(self, url):
+        if self.before_request is not None:
+            self.before_request(url)
+        return fetch_page(url, **page_fetch_options(url))
+    
+    def get_page_soup(self, url):
+        """ページを取得してBeautifulSoupを返す（変更検知で取得済みのページは再利用する）"""
+        html, soup = self._page_cache.pop(url, (None, None))
+        if html is None:
+            page = self.fetch(url)
+            if not page:
+                return None
+            html = page.text
+        if soup is None:
+            soup = BeautifulSoup(html, 'html.parser')
+        
+        if self.fingerprints is not None:
+            self.fingerprints.update(url, html, soup)
+        self._fetched_urls.append(url)
+        
+        return soup
+    
+    def is_company_unchanged(self, company):
+        """前回取得時から企業のページがいずれも実質的に変化していないかを判定する"""
+        urls = self.fingerprints.company_urls(company["id"])
+        if not urls:
+            return False
+        
+        for url in urls:
+            page = self.fetch(url)
+            if not page:
+                # 取得できなかったページは変化したものとして扱い、抽出時に取得し直す
+                logger.warning(f"Failed to fetch {url} for change detection of {company['name']}",
+                               extra={"event": "change_check_failed"})
+                return False
+            html = page.text
+            parsed = {}
+            
+            def parse():
+                parsed["soup"] = BeautifulSoup(html, 'html.parser')
+                return parsed["soup"]
+            
+            unchanged = self.fingerprints.is_unchanged(url, html, parse)
+            self._page_cache[url] = (html, parsed.get("soup"))
+            if not unchanged:
+                return False
+        
+        return True
     
     def extract_internship_info_from_job_site(self, company):
         """就活サイトの企業インターンシップページから情報を抽出する"""
@@ -30,7 +112,7 @@ class InternshipCollector:
             return internships
         
         try:
-            soup = get_soup(company["internship_url"])
+            soup = self.get_page_soup(company["internship_url"])
             if not soup:
                 logger.error(f"Failed to fetch internship page for {company['name']}")
                 return internships
@@ -69,19 +151,19 @@ class InternshipCollector:
                     
                     internship_id = f"{company['id']}_{len(internships)}"
                     
-                    internships.append({
-                        "id": internship_id,
-                        "company_id": company["id"],
-                        "company_name": company["name"],
-                        "title": title,
-                        "period": period,
-                        "start_date": start_date,
-                        "end_date": end_date,
-                        "target": target,
-                        "application_url": urljoin(company["internship_url"], link) if link else company["internship_url"],
-                        "source": "マイナビ",
-                        "last_updated": datetime.now().strftime("%Y-%m-%d")
-                    })
+                    internships.append(InternshipRecord(
+                        id=internship_id,
+                        company_id=company["id"],
+                        company_name=company["name"],
+                        title=title,
+                        period=period,
+                        start_date=start_date,
+                        end_date=end_date,
+                        target=target,
+                        application_url=urljoin(company["internship_url"], link) if link else company["internship_url"],
+                        source="マイナビ",
+                        last_updated=today()
+                    ))
             
             # リクナビの場合
             elif "rikunabi" in company["id"]:
@@ -114,19 +196,19 @@ class InternshipCollector:
                     
                     internship_id = f"{company['id']}_{len(internships)}"
                     
-                    internships.append({
-                        "id": internship_id,
-                        "company_id": company["id"],
-                        "company_name": company["name"],
-                        "title": title,
-                        "period": period,
-                        "start_date": start_date,
-                        "end_date": end_date,
-                        "target": target,
-                        "application_url": urljoin(company["internship_url"], link) if link else company["internship_url"],
-                        "source": "リクナビ",
-                        "last_updated": datetime.now().strftime("%Y-%m-%d")
-                    })
+                    internships.append(InternshipRecord(
+                        id=internship_id,
+                        company_id=company["id"],
+                        company_name=company["name"],
+                        title=title,
+                        period=period,
+                        start_date=start_date,
+                        end_date=end_date,
+                        target=target,
+                        application_url=urljoin(company["internship_url"], link) if link else company["internship_url"],
+                        source="リクナビ",
+                        last_updated=today()
+                    ))
             
             # キャリタス就活の場合
             elif "career_tasu" in company["id"]:
@@ -159,19 +241,19 @@ class InternshipCollector:
                     
                     internship_id = f"{company['id']}_{len(internships)}"
                     
-                    internships.append({
-                        "id": internship_id,
-                        "company_id": company["id"],
-                        "company_name": company["name"],
-                        "title": title,
-                        "period": period,
-                        "start_date": start_date,
-                        "end_date": end_date,
-                        "target": target,
-                        "application_url": urljoin(company["internship_url"], link) if link else company["internship_url"],
-                        "source": "キャリタス就活",
-                        "last_updated": datetime.now().strftime("%Y-%m-%d")
-                    })
+                    internships.append(InternshipRecord(
+                        id=internship_id,
+                        company_id=company["id"],
+                        company_name=company["name"],
+                        title=title,
+                        period=period,
+                        start_date=start_date,
+                        end_date=end_date,
+                        target=target,
+                        application_url=urljoin(company["internship_url"], link) if link else company["internship_url"],
+                        source="キャリタス就活",
+                        last_updated=today()
+                    ))
         
         except Exception as e:
             logger.error(f"Error extracting internship info from job site for {company['name']}: {e}")
@@ -186,7 +268,7 @@ class InternshipCollector:
             return internships
         
         try:
-            soup = get_soup(company["career_site"])
+            soup = self.get_page_soup(company["career_site"])
             if not soup:
                 logger.error(f"Failed to fetch career site for {company['name']}")
                 return internships
@@ -211,7 +293,7 @@ class InternshipCollector:
             for link in internship_links[:3]:  # 最大3ページまで
                 try:
                     full_url = urljoin(company["career_site"], link)
-                    intern_soup = get_soup(full_url)
+                    intern_soup = self.get_page_soup(full_url)
                     
                     if not intern_soup:
                         continue
@@ -247,19 +329,19 @@ class InternshipCollector:
                         if internship_data and "title" in internship_data:
                             internship_id = f"{company['id']}_career_{len(internships)}"
                             
-                            internships.append({
-                                "id": internship_id,
-                                "company_id": company["id"],
-                                "company_name": company["name"],
-                                "title": internship_data.get("title", "企業サイトのインターンシップ"),
-                                "period": internship_data.get("period"),
-                                "start_date": internship_data.get("start_date"),
-                                "end_date": internship_data.get("end_date"),
-                                "target": internship_data.get("target"),
-                                "application_url": full_url,
-                                "source": "企業採用サイト",
-                                "last_updated": datetime.now().strftime("%Y-%m-%d")
-                            })
+                            internships.append(InternshipRecord(
+                                id=internship_id,
+                                company_id=company["id"],
+                                company_name=company["name"],
+                                title=internship_data.get("title", "企業サイトのインターンシップ"),
+                                period=internship_data.get("period"),
+                                start_date=internship_data.get("start_date"),
+                                end_date=internship_data.get("end_date"),
+                                target=internship_data.get("target"),
+                                application_url=full_url,
+                                source="企業採用サイト",
+                                last_updated=today()
+                            ))
                     
                     # 2. 特定のクラスやIDを持つ要素を探す
                     internship_sections = intern_soup.select('.internship, .intern, #internship, #intern')
@@ -281,25 +363,25 @@ class InternshipCollector:
                             
                             internship_id = f"{company['id']}_career_{len(internships)}"
                             
-                            internships.append({
-                                "id": internship_id,
-                                "company_id": company["id"],
-                                "company_name": company["name"],
-                                "title": title,
-                                "period": None,
-                                "start_date": start_date,
-                                "end_date": end_date,
-                                "target": None,
-                                "application_url": full_url,
-                                "source": "企業採用サイト",
-                                "last_updated": datetime.now().strftime("%Y-%m-%d")
-                            })
+                            internships.append(InternshipRecord(
+                                id=internship_id,
+                                company_id=company["id"],
+                                company_name=company["name"],
+                                title=title,
+                                period=None,
+                                start_date=start_date,
+                                end_date=end_date,
+                                target=None,
+                                application_url=full_url,
+                                source="企業採用サイト",
+                                last_updated=today()
+                            ))
                 
                 except Exception as e:
                     logger.error(f"Error processing internship page {link} for {company['name']}: {e}")
                 
                 # ページ間の待機時間
-                time.sleep(2)
+                pause(2)
         
         except Exception as e:
             logger.error(f"Error extracting internship info from career site for {company['name']}: {e}")
@@ -317,28 +399,29 @@ class InternshipCollector:
             
             for career_internship in career_site_internships:
                 # タイトルの類似性でマッチング
-                if job_internship["title"] in career_internship["title"] or career_internship["title"] in job_internship["title"]:
+                if job_internship.title in career_internship.title or career_internship.title in job_internship.title:
                     matching_internships.append(career_internship)
             
             # 検証結果
             if matching_internships:
-                verification_result = verify_internship_data(job_internship, matching_internships)
+                verification_result = verify_internship_data(job_internship.to_dict(),
+                                                             [match.to_dict() for match in matching_internships])
                 
                 # 信頼度が高い場合、情報をマージ
                 if verification_result["overall_score"] > 0.5:
                     # 最もマッチする企業サイトの情報
                     best_match = matching_internships[0]
                     
-                    # 情報をマージ（就活サイトの情報を優先）
-                    merged_internship = job_internship.copy()
+                    # 情報をマージ（就活サイトの情報を優先。就活サイトのレコードは他で使わないためそのまま更新する）
+                    merged_internship = job_internship
                     
                     # 企業サイトにしか情報がない場合は補完
                     for key in ["period", "start_date", "end_date", "target"]:
-                        if not merged_internship.get(key) and best_match.get(key):
-                            merged_internship[key] = best_match[key]
+                        if not getattr(merged_internship, key) and getattr(best_match, key):
+                            setattr(merged_internship, key, getattr(best_match, key))
                     
                     # 検証結果を追加
-                    merged_internship["verification"] = {
+                    merged_internship.verification = {
                         "score": verification_result["overall_score"],
                         "sources": ["就活サイト", "企業採用サイト"],
                         "verified": True
@@ -347,7 +430,7 @@ class InternshipCollector:
                     verified_internships.append(merged_internship)
                 else:
                     # 信頼度が低い場合、就活サイトの情報のみを使用
-                    job_internship["verification"] = {
+                    job_internship.verification = {
                         "score": verification_result["overall_score"],
                         "sources": ["就活サイト"],
                         "verified": False
@@ -355,7 +438,7 @@ class InternshipCollector:
                     verified_internships.append(job_internship)
             else:
                 # マッチする企業サイトの情報がない場合
-                job_internship["verification"] = {
+                job_internship.verification = {
                     "score": 0.0,
                     "sources": ["就活サイト"],
                     "verified": False
@@ -367,12 +450,12 @@ class InternshipCollector:
             is_new = True
             
             for verified in verified_internships:
-                if career_internship["title"] in verified["title"] or verified["title"] in career_internship["title"]:
+                if career_internship.title in verified.title or verified.title in career_internship.title:
                     is_new = False
                     break
             
             if is_new:
-                career_internship["verification"] = {
+                career_internship.verification = {
                     "score": 0.0,
                     "sources": ["企業採用サイト"],
                     "verified": False
@@ -381,111 +464,378 @@ class InternshipCollector:
         
         return verified_internships
     
+    def collect_company(self, company):
+        """1企業のインターンシップ情報を収集する（ページが前回から変化していない場合はNone）"""
+        self._page_cache.clear()
+        self._fetched_urls = []
+        
+        # ページが変化していなければ前回の取得結果をそのまま使用する
+        if self.fingerprints is not None and self.is_company_unchanged(company):
+            logger.info(f"No changes detected for {company['name']}, reusing previous internships",
+                        extra={"event": "company_unchanged"})
+            self.unchanged_count += 1
+            return None
+        
+        # 就活サイトからインターンシップ情報を取得
+        job_site_internships = self.extract_internship_info_from_job_site(company)
+        logger.info(f"Found {len(job_site_internships)} internships from job site for {company['name']}",
+                    extra={"event": "internships_found"})
+        
+        # 企業の採用サイトからインターンシップ情報を取得
+        career_site_internships = self.extract_internship_info_from_career_site(company)
+        logger.info(f"Found {len(career_site_internships)} internships from career site for {company['name']}",
+                    extra={"event": "internships_found"})
+        
+        # 情報を検証・マージ
+        verified_internships = self.verify_and_merge_internship_data(job_site_internships, career_site_internships)
+        
+        if self.fingerprints is not None:
+            self.fingerprints.set_company_urls(company["id"], self._fetched_urls)
+        return verified_internships
+    
+    def add_company_internships(self, writer, batch, company_id, internships):
+        """企業の取得結果（InternshipRecord のリスト）を途中結果のファイル（とストレージ）に書き出す"""
+        new_internships = [
+            internship for internship in internships
+            if internship.id not in self.internship_ids
+        ]
+        for internship in new_internships:
+            self.internship_ids.add(internship.id)
+            self._collected_titles.add((company_id, internship.title))
+        self._collected_company_ids.add(company_id)
+        rows = [internship.to_dict() for internship in new_internships]
+        writer.write_many(rows)
+        if batch is not None:
+            batch.add_company_internships(company_id, rows)
+    
     def collect_internships(self):
-        """全企業のインターンシップ情報を収集する"""
-        # 既存のデータがあれば読み込む
-        existing_data = load_json(INTERNSHIPS_FILE)
-        if existing_data:
-            self.internships = existing_data
-            self.internship_ids = {internship["id"] for internship in self.internships}
-            logger.info(f"Loaded {len(self.internships)} internships from existing data")
+        """全企業のインターンシップ情報を収集する
+        
+        取得した情報は企業ごとに INTERNSHIPS_FILE.partial へ追記し、最後に既存データとマージして保存する
+        """
+        partial_file = f"{INTERNSHIPS_FILE}.partial"
         
         # 各企業のインターンシップ情報を収集
-        for i, company in enumerate(self.companies):
-            if i % 10 == 0:
-                logger.info(f"Collecting internships for company {i+1}/{len(self.companies)}: {company['name']}")
-            
-            try:
-                # 就活サイトからインターンシップ情報を取得
-                job_site_internships = self.extract_internship_info_from_job_site(company)
-                logger.info(f"Found {len(job_site_internships)} internships from job site for {company['name']}")
-                
-                # 企業の採用サイトからインターンシップ情報を取得
-                career_site_internships = self.extract_internship_info_from_career_site(company)
-                logger.info(f"Found {len(career_site_internships)} internships from career site for {company['name']}")
+        batch = BatchWriter(self.storage) if self.storage is not None else None
+        with profile_stage("internship"), JsonlWriter(partial_file, mode='w') as writer:
+            for i, company in enumerate(self.companies):
+                if i % 10 == 0:
+                    logger.info(f"Collecting internships for company {i+1}/{self.total_companies}: {company['name']}")
                 
-                # 情報を検証・マージ
-                verified_internships = self.verify_and_merge_internship_data(job_site_internships, career_site_internships)
+                try:
+                    internships = self.collect_company(company)
+                    if internships is None:
+                        continue
+                    self.add_company_internships(writer, batch, company["id"], internships)
                 
-                # 新しいインターンシップ情報を追加
-                for internship in verified_internships:
-                    if internship["id"] not in self.internship_ids:
-                        self.internships.append(internship)
-                        self.internship_ids.add(internship["id"])
+                except Exception as e:
+                    logger.error(f"Error collecting internships for {company['name']}: {e}")
                 
-                # 既存のインターンシップ情報を更新
-                for i, existing in enumerate(self.internships):
-                    if existing["company_id"] == company["id"]:
-                        for new_internship in verified_internships:
-                            if existing["title"] == new_internship["title"]:
-                                self.internships[i] = new_internship
-                                break
-            
-            except Exception as e:
-                logger.error(f"Error collecting internships for {company['name']}: {e}")
-            
-            # 企業間の待機時間
-            time.sleep(2)
+                # 企業間の待機時間
+                pause(2)
         
-        # 結果を保存
-        save_json(self.internships, INTERNSHIPS_FILE)
-        logger.info(f"Collected and saved {len(self.internships)} internships in total")
+        with profile_stage("merge"):
+            return self.save_collected(partial_file, batch)
+    
+    def save_collected(self, partial_file, batch=None):
+        """途中結果のファイルを既存データとマージして保存し、変更セットとフィンガープリントを記録する"""
+        if batch is not None:
+            batch.flush()
+        
+        # 既存データのうち今回取得した情報で更新されるものを除き、新しい情報と合わせて保存する
+        def merged_internships():
+            updated_ids = set()
+            for existing in iter_records(INTERNSHIPS_FILE):
+                if existing["company_id"] in self._collected_company_ids and (
+                        existing["id"] in self.internship_ids
+                        or (existing["company_id"], existing["title"]) in self._collected_titles):
+                    if existing["id"] in self.internship_ids:
+                        updated_ids.add(existing["id"])
+                        self.changes.add_internship("updated", existing["id"], existing["company_id"])
+                    else:
+                        self.changes.add_internship("removed", existing["id"], existing["company_id"])
+                    continue
+                yield existing
+            for internship in iter_jsonl(partial_file):
+                if internship["id"] not in updated_ids:
+                    self.changes.add_internship("added", internship["id"], internship["company_id"])
+                yield internship
+        
+        self.internship_count = save_jsonl(merged_internships(), INTERNSHIPS_FILE)
+        os.remove(partial_file)
         
-        return self.internships
+        if self.fingerprints is not None:
+            self.fingerprints.save()
+            logger.info(f"Reused previous internships for {self.unchanged_count} unchanged companies")
+        self.changes.save_merged(CHANGES_FILE)
+        logger.info(f"Collected and saved {self.internship_count} internships in total")
+        
+        return iter_jsonl(INTERNSHIPS_FILE)
     
     def run(self):
         """インターンシップ情報収集の実行"""
         return self.collect_internships()
 
-def combine_data(companies_file, internships_file, output_file):
-    """企業情報とインターンシップ情報を結合する"""
-    companies = load_json(companies_file)
-    internships = load_json(internships_file)
+def index_internships_by_company(internships_file):
+    """インターンシップJSONLを走査し、企業IDごとのレコード位置（バイトオフセット）を返す"""
+    offsets_by_company = {}
     
-    if not companies or not internships:
-        logger.error("Failed to load company or internship data")
-        return False
+    with open(internships_file, 'rb') as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                try:
+                    company_id = json.loads(line)["company_id"]
+                except (ValueError, KeyError):
+                    logger.warning(f"Skipping malformed record at offset {offset} in {internships_file}",
+                                   extra={"event": "malformed_line"})
+                else:
+                    offsets_by_company.setdefault(company_id, []).append(offset)
+            offset += len(line)
+    
+    return offsets_by_company
+
+def read_records_at(f, offsets):
+    """バイナリモードで開いたJSONLファイルから指定位置のレコードを読み込む"""
+    records = []
+    for offset in offsets:
+        f.seek(offset)
+        records.append(json.loads(f.readline()))
+    return records
+
+# JSONLの行からIDを取り出す（行全体をパースせずに対象レコードを絞り込むため）
+RECORD_ID_PATTERN = re.compile(rb'"id": "((?:[^"\\]|\\.)*)"')
+RECORD_COMPANY_ID_PATTERN = re.compile(rb'"company_id": "((?:[^"\\]|\\.)*)"')
+
+def _match_id(pattern, line):
+    match = pattern.search(line)
+    return json.loads(b'"' + match.group(1) + b'"') if match else None
+
+def combined_index_file(output_file):
+    """結合データの索引ファイル（企業IDの並び・インターンシップ件数・メタ情報）のパス"""
+    return f"{os.path.splitext(output_file)[0]}.index.json"
+
+class CombinedDataWriter:
+    """結合データを1行1企業の形式で書き出し、索引ファイルと合わせて置き換えるクラス"""
+    
+    def __init__(self, output_file):
+        directory = os.path.dirname(output_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        self.output_file = output_file
+        self.tmp_file = f"{output_file}.tmp"
+        self.company_ids = []
+        self.internship_counts = []
+        self._file = open(self.tmp_file, 'wb')
+        self._file.write(b'{\n  "companies": [\n')
+    
+    def write_raw(self, company_id, line, internship_count):
+        """JSONエンコード済みの企業データ（1行分）を書き出す"""
+        if self.company_ids:
+            self._file.write(b",\n")
+        self._file.write(b"    " + line)
+        self.company_ids.append(company_id)
+        self.internship_counts.append(internship_count)
+    
+    def write_company(self, company):
+        self.write_raw(company["id"], json.dumps(company, ensure_ascii=False).encode('utf-8'),
+                       len(company.get("internships", [])))
     
-    # 企業IDごとにインターンシップをグループ化
-    internships_by_company = {}
-    for internship in internships:
-        company_id = internship["company_id"]
-        if company_id not in internships_by_company:
-            internships_by_company[company_id] = []
-        internships_by_company[company_id].append(internship)
-    
-    # 結合データを作成
-    combined_data = {
-        "companies": [],
-        "meta": {
+    def commit(self, total_internships):
+        """結合データと索引を一時ファイルから置き換える"""
+        meta = {
             "last_updated": datetime.now().strftime("%Y-%m-%d"),
-            "total_companies": len(companies),
-            "total_internships": len(internships)
+            "total_companies": len(self.company_ids),
+            "total_internships": total_internships
         }
-    }
+        self._file.write(b'\n  ],\n  "meta": ' + json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n}\n')
+        self._file.close()
+        
+        os.replace(self.tmp_file, self.output_file)
+        save_json({
+            "size": os.path.getsize(self.output_file),
+            "meta": meta,
+            "company_ids": self.company_ids,
+            "internship_counts": self.internship_counts
+        }, combined_index_file(self.output_file))
+        return meta
+    
+    def abort(self):
+        self._file.close()
+        os.remove(self.tmp_file)
+
+def iter_combined_companies(output_file):
+    """結合データの企業情報を1件ずつ読み込んで返す（1行1企業の形式を前提とする）"""
+    with open(output_file, 'rb') as f:
+        f.readline()  # {
+        f.readline()  # "companies": [
+        for line in f:
+            line = line.strip().rstrip(b",")
+            if not line.startswith(b"{"):
+                break
+            yield json.loads(line)
+
+def load_affected_records(companies_file, internships_file, company_ids, storage=None):
+    """指定した企業の企業情報（インターンシップ情報付き）を読み込む"""
+    if storage is not None:
+        companies = {}
+        for company_id in company_ids:
+            company = storage.get_company(company_id)
+            if company is not None:
+                companies[company_id] = company
+        return companies
+    
+    # 行ごとにIDだけを取り出し、対象の企業のレコードのみをパースする
+    companies = {}
+    for company in _iter_matching_lines(companies_file, RECORD_ID_PATTERN, company_ids):
+        company["internships"] = []
+        companies[company["id"]] = company
+    for internship in _iter_matching_lines(internships_file, RECORD_COMPANY_ID_PATTERN, company_ids):
+        if internship["company_id"] in companies:
+            companies[internship["company_id"]]["internships"].append(internship)
+    return companies
+
+def _iter_matching_lines(filepath, pattern, ids):
+    if not os.path.exists(filepath):
+        return
+    with open(filepath, 'rb') as f:
+        for line in f:
+            if line.strip() and _match_id(pattern, line) in ids:
+                yield json.loads(line)
+
+def combine_data_incremental(companies_file, internships_file, output_file, changes, storage=None,
+                             snapshot_file=None):
+    """変更された企業のみを再構築して結合データを更新する
+    
+    変更のない企業の行はパースせずにそのままコピーする。前回の結合データや索引がない
+    （または整合しない）場合はNoneを返し、呼び出し元で全件の結合に切り替える。
+    """
+    index = load_json(combined_index_file(output_file)) if os.path.exists(combined_index_file(output_file)) else None
+    if not index or not os.path.exists(output_file) or os.path.getsize(output_file) != index.get("size"):
+        logger.info("Combined data index is missing or outdated")
+        return None
+    
+    affected = changes.affected_company_ids
+    companies = load_affected_records(companies_file, internships_file, affected, storage)
+    
+    writer = CombinedDataWriter(output_file)
+    total_internships = index["meta"]["total_internships"]
+    snapshot_companies = []  # スナップショットの更新用（変更のない企業はID、変更のあった企業は企業情報）
+    try:
+        with open(output_file, 'rb') as src:
+            src.readline()  # {
+            src.readline()  # "companies": [
+            for company_id, internship_count in zip(index["company_ids"], index["internship_counts"]):
+                line = src.readline().rstrip(b"\n").rstrip(b",").lstrip()
+                if company_id not in affected:
+                    writer.write_raw(company_id, line, internship_count)
+                    snapshot_companies.append(company_id)
+                    continue
+                
+                # 変更のあった企業を再構築する（削除された企業は書き出さない）
+                total_internships -= internship_count
+                company = companies.pop(company_id, None)
+                if company is not None:
+                    writer.write_company(company)
+                    snapshot_companies.append(company)
+                    total_internships += len(company["internships"])
+        
+        # 新たに追加された企業を末尾に加える
+        for company in companies.values():
+            writer.write_company(company)
+            snapshot_companies.append(company)
+            total_internships += len(company["internships"])
+    except Exception:
+        writer.abort()
+        raise
     
-    for company in companies:
-        company_data = company.copy()
-        company_data["internships"] = internships_by_company.get(company["id"], [])
-        combined_data["companies"].append(company_data)
+    meta = writer.commit(total_internships)
+    logger.info(f"Incrementally updated {len(affected)} companies in {output_file}")
     
-    # 結果を保存
-    save_json(combined_data, output_file)
+    # スナップショットも変更のあった企業だけをエンコードし直す（旧版と整合しない場合は全件を書き出す）
+    if snapshot_file and not update_snapshot(snapshot_companies, meta, snapshot_file, index["company_ids"]):
+        write_snapshot(iter_combined_companies(output_file), meta, snapshot_file)
+    return True
+
+def combine_data(companies_file, internships_file, output_file, changes=None, storage=None, snapshot_file=None):
+    """企業情報とインターンシップ情報を結合する
+    
+    企業情報は1件ずつ読み込み、インターンシップ情報は企業ごとに必要な分だけ読み込んで
+    結合データを逐次書き出すため、データ量が増えてもメモリ使用量はほぼ一定となる。
+    変更セット（ChangeSet）が指定された場合は、変更のあった企業のみを更新する。
+    snapshot_file が指定された場合は、高速に読み込めるスナップショット形式でも保存する。
+    """
+    if changes is not None:
+        if changes.is_empty() and os.path.exists(output_file):
+            logger.info("No changes to combine")
+            return True
+        result = combine_data_incremental(companies_file, internships_file, output_file, changes, storage,
+                                          snapshot_file)
+        if result is not None:
+            return result
+        logger.info("Falling back to full data combination")
+    
+    if not os.path.exists(companies_file) or not os.path.exists(internships_file):
+        logger.error("Failed to load company or internship data")
+        return False
+    
+    # 企業IDごとにインターンシップの位置をまとめる
+    offsets_by_company = index_internships_by_company(internships_file)
+    total_internships = sum(len(offsets) for offsets in offsets_by_company.values())
+    if not total_internships:
+        logger.error("Failed to load company or internship data")
+        return False
+    
+    # 結合データを一時ファイルに書き出す
+    writer = CombinedDataWriter(output_file)
+    try:
+        with open(internships_file, 'rb') as internships_f:
+            for company in iter_records(companies_file):
+                company["internships"] = read_records_at(internships_f, offsets_by_company.get(company["id"], []))
+                writer.write_company(company)
+    except Exception:
+        writer.abort()
+        raise
+    
+    if not writer.company_ids:
+        writer.abort()
+        logger.error("Failed to load company or internship data")
+        return False
+    
+    # 結果を置き換える
+    meta = writer.commit(total_internships)
     logger.info(f"Combined data saved to {output_file}")
     
+    if snapshot_file:
+        write_snapshot(iter_combined_companies(output_file), meta, snapshot_file)
+    
+    return True
+
+def combine_pending_changes(storage=None, full=False):
+    """収集処理で記録された変更セットを結合データに反映し、成功したら変更セットを削除する
+
+    full が True の場合や変更セットがない場合は全件を結合する。
+    """
+    changes = None if full else ChangeSet.load(CHANGES_FILE)
+    if not combine_data(COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE,
+                        changes=changes, storage=storage, snapshot_file=SNAPSHOT_FILE):
+        return False
+    
+    if os.path.exists(CHANGES_FILE):
+        os.remove(CHANGES_FILE)
     return True
 
 if __name__ == "__main__":
     from company_collector import CompanyCollector
-    from config import COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE
     
     # 企業情報を収集
     company_collector = CompanyCollector()
     companies = company_collector.run()
     
     # インターンシップ情報を収集
-    internship_collector = InternshipCollector(companies)
-    internships = internship_collector.run()
+    internship_collector = InternshipCollector(companies, company_collector.company_count)
+    internship_collector.run()
     
     # データを結合
     combine_data(COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE)
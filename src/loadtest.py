@@ -0,0 +1,243 @@
+"""
+インターン情報自動取得システム - Web API の負荷試験
+
+合成データ（synthetic_data.py）を件数を変えて生成し、APIサーバーを起動して主要なエンドポイントに
+並列でリクエストを送り、スループット・レイテンシの分布・サーバーのメモリ使用量を計測する。
+既に起動しているサーバー（gunicorn などの本番構成）を計測する場合は --url と --pid を指定する。
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from synthetic_data import write_dataset, generate_companies, INDUSTRIES, MARKETS, SOURCES
+
+# 検索語の候補（合成データの企業名・タイトルに含まれる語）
+SEARCH_TERMS = ["サマー", "エンジニア", "データ", "東京電機", "ホールディングス", "1Day", "営業職", "研究"]
+
+SORTS = ["", "start_date", "-start_date", "end_date", "company_name"]
+
+# サーバーの起動を待つ最大時間（秒）
+STARTUP_TIMEOUT = 120
+
+class Scenario:
+    """エンドポイントごとに、合成データに合わせたランダムなリクエストURLを作る"""
+    
+    def __init__(self, companies, seed=0):
+        self.rng = random.Random(seed)
+        self.company_ids = [company["id"] for company in companies]
+        self.internship_ids = [internship["id"] for company in companies for internship in company["internships"]]
+        self.total_internships = len(self.internship_ids)
+        self._lock = threading.Lock()
+    
+    def _filters(self, rng):
+        params = {}
+        choice = rng.random()
+        if choice < 0.2:
+            params["industry"] = rng.choice(INDUSTRIES)
+        elif choice < 0.35:
+            params["market"] = rng.choice(MARKETS)[0]
+        elif choice < 0.5:
+            params["source"] = rng.choice(SOURCES)
+        elif choice < 0.6:
+            month = rng.choice([7, 8, 9, 12, 1, 2])
+            params["deadline_month"] = f"{2025 if month >= 6 else 2026}-{month:02d}"
+        return params
+    
+    def url(self, endpoint):
+        with self._lock:
+            rng = random.Random(self.rng.random())
+        
+        if endpoint == "companies":
+            return "/api/companies"
+        if endpoint == "internships":
+            params = self._filters(rng)
+            params["offset"] = rng.randrange(0, max(1, min(self.total_internships, 5000)), 20)
+            params["limit"] = 20
+            sort = rng.choice(SORTS)
+            if sort:
+                params["sort"] = sort
+            return "/api/internships?" + "&".join(f"{key}={value}" for key, value in params.items())
+        if endpoint == "facets":
+            params = self._filters(rng)
+            return "/api/facets?" + "&".join(f"{key}={value}" for key, value in params.items())
+        if endpoint == "search":
+            return f"/api/search?q={rng.choice(SEARCH_TERMS)}&offset={rng.randrange(0, 100, 20)}"
+        if endpoint == "company":
+            return f"/api/company/{rng.choice(self.company_ids)}"
+        if endpoint == "internship":
+            return f"/api/internship/{rng.choice(self.internship_ids)}"
+        if endpoint == "upcoming":
+            return f"/api/internships/upcoming?days={rng.choice([7, 30, 90, 365])}"
+        if endpoint == "export":
+            return f"/api/internships/export.ndjson?industry={rng.choice(INDUSTRIES)}"
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+# エンドポイントと、--requests に対するリクエスト数の比率（エクスポートは重いため少なくする）
+ENDPOINTS = {
+    "companies": 0.2,
+    "internships": 1.0,
+    "facets": 0.5,
+    "search": 0.5,
+    "company": 0.5,
+    "internship": 0.5,
+    "upcoming": 0.3,
+    "export": 0.05
+}
+
+def percentile(values, ratio):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+def memory_usage(pid):
+    """プロセスの常駐メモリ（VmRSS）とそのピーク（VmHWM）をMBで返す（取得できない場合はNone）"""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    usage[key] = int(value.split()[0]) / 1024
+    except (OSError, ValueError):
+        return None, None
+    return usage.get("VmRSS"), usage.get("VmHWM")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(data_dir, port):
+    """開発用サーバーをスレッドありで起動し、応答を返すようになるまで待つ"""
+    env = dict(os.environ, INTERN_SCRAPER_DATA_DIR=data_dir)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port),
+         "--no-reload", "--no-debugger", "--with-threads"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            # 最初のリクエストでデータセットが読み込まれる
+            if requests.get(f"{base_url}/api/internships?limit=1", timeout=STARTUP_TIMEOUT).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not become ready in time")
+
+def run_endpoint(base_url, scenario, endpoint, num_requests, concurrency, duration=None):
+    """1つのエンドポイントに並列でリクエストを送り、レイテンシ（秒）とエラー数を返す"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(num_requests))
+    deadline = time.perf_counter() + duration if duration else None
+    
+    def worker():
+        # セッション（コネクション）はスレッドごとに持つ
+        session = requests.Session()
+        session.headers["Accept-Encoding"] = "gzip, br"
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            else:
+                with lock:
+                    if next(counter, None) is None:
+                        return
+            url = base_url + scenario.url(endpoint)
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=60)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return latencies, errors[0], time.perf_counter() - start
+
+def report(endpoint, latencies, errors, elapsed):
+    throughput = len(latencies) / elapsed if elapsed else 0
+    print(f"{endpoint:14}{len(latencies):>10}{errors:>8}{throughput:>10.1f}"
+          f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.95) * 1000:>10.1f}"
+          f"{percentile(latencies, 0.99) * 1000:>10.1f}")
+
+def format_memory(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+def load_test(base_url, scenario, args, pid=None):
+    rss_before, _ = memory_usage(pid) if pid else (None, None)
+    print(f"{'endpoint':14}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint in args.endpoints:
+        num_requests = max(1, int(args.requests * ENDPOINTS[endpoint]))
+        duration = args.duration * ENDPOINTS[endpoint] if args.duration else None
+        report(endpoint, *run_endpoint(base_url, scenario, endpoint, num_requests, args.concurrency, duration))
+    rss_after, rss_peak = memory_usage(pid) if pid else (None, None)
+    print(f"server RSS (MB): after startup {format_memory(rss_before)}, after load {format_memory(rss_after)}, "
+          f"peak {format_memory(rss_peak)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the intern information web API")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma separated numbers of internships to generate (companies are 1/10 of each)")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint (scaled per endpoint)")
+    parser.add_argument("--duration", type=float, help="Seconds per endpoint instead of a fixed request count")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        help="Comma separated endpoints to test")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--url", help="Test an already running server instead of starting one "
+                                      "(its data must be generated with the same --sizes and --seed)")
+    parser.add_argument("--pid", type=int, help="Process ID of the server given by --url (for memory usage)")
+    parser.add_argument("--static-api", action="store_true",
+                        help="Write the static API responses so that the server returns them without running views")
+    args = parser.parse_args()
+    args.endpoints = [endpoint for endpoint in args.endpoints.split(",") if endpoint]
+    for endpoint in args.endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"unknown endpoint: {endpoint}")
+    
+    for num_internships in (int(size) for size in args.sizes.split(",")):
+        num_companies = max(1, num_internships // 10)
+        print(f"=== {num_companies} companies / {num_internships} internships ===")
+        scenario = Scenario(generate_companies(num_companies, num_internships, args.seed), args.seed)
+        
+        if args.url:
+            load_test(args.url.rstrip("/"), scenario, args, args.pid)
+            continue
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_dataset(data_dir, num_companies, num_internships, args.seed, static_api=args.static_api)
+            process, base_url = start_server(data_dir, free_port())
+            try:
+                load_test(base_url, scenario, args, process.pid)
+            finally:
+                process.terminate()
+                process.wait()
+
+if __name__ == "__main__":
+    main()
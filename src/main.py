@@ -3,23 +3,33 @@
 """
 
 import os
+import json
 import logging
 import argparse
 from datetime import datetime
 
-from config import COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE, DATA_DIR
+from config import COMPANIES_FILE, INTERNSHIPS_FILE, DATA_DIR, SNAPSHOT_FILE, STATIC_API_DIR, PROFILE_SAMPLE_RATE, COMPANY_DISCOVERY
 from company_collector import CompanyCollector
-from internship_collector import InternshipCollector, combine_data
-from utils import setup_logger
+from internship_collector import InternshipCollector, combine_pending_changes
+from storage import get_storage
+from profiling import PROFILE_STAGES, enable_profiling, should_sample, profile_stage
+from work_queue import WorkQueue
+from crawl_worker import enqueue_companies, run_worker, merge_results
+from daemon import CrawlDaemon, load_status
+from static_api import build_static_api
+from utils import setup_logger, iter_jsonl, log_run_summary, migrate_legacy_json
 
 # ロガーの設定
 logger = setup_logger()
 
 def ensure_data_dir():
-    """データディレクトリが存在することを確認"""
+    """データディレクトリが存在することを確認し、従来のJSONファイルがあればJSONLに変換する"""
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
         logger.info(f"Created data directory: {DATA_DIR}")
+    
+    for filepath in (COMPANIES_FILE, INTERNSHIPS_FILE):
+        migrate_legacy_json(filepath)
 
 def run_collection(args):
     """データ収集処理を実行"""
@@ -32,41 +42,34 @@ def run_collection(args):
     # 企業情報の収集
     if not args.skip_companies:
         logger.info("Collecting company information...")
-        company_collector = CompanyCollector()
+        company_collector = CompanyCollector(discovery=args.discovery)
         companies = company_collector.run()
-        logger.info(f"Collected {len(companies)} companies")
+        total_companies = company_collector.company_count
+        logger.info(f"Collected {total_companies} companies")
     else:
         logger.info("Skipping company collection")
-        companies = []
+        companies = None
+        total_companies = None
     
     # インターンシップ情報の収集
     if not args.skip_internships:
         logger.info("Collecting internship information...")
-        # 企業情報を読み込む
-        if not companies and os.path.exists(COMPANIES_FILE):
-            from utils import load_json
-            companies = load_json(COMPANIES_FILE)
-            if not companies:
+        # 企業情報を読み込む（保存済みのJSONLを1件ずつ読み出す）
+        if companies is None:
+            if not os.path.exists(COMPANIES_FILE):
                 logger.error("No company data available. Cannot collect internships.")
                 return False
+            companies = iter_jsonl(COMPANIES_FILE)
         
-        internship_collector = InternshipCollector(companies)
-        internships = internship_collector.run()
-        logger.info(f"Collected {len(internships)} internships")
+        internship_collector = InternshipCollector(companies, total_companies,
+                                                   use_fingerprints=not args.full_refresh)
+        internship_collector.run()
+        logger.info(f"Collected {internship_collector.internship_count} internships")
     else:
         logger.info("Skipping internship collection")
     
-    # データの結合
-    if not args.skip_combine:
-        logger.info("Combining company and internship data...")
-        success = combine_data(COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE)
-        if success:
-            logger.info("Data combination completed successfully")
-        else:
-            logger.error("Failed to combine data")
-            return False
-    else:
-        logger.info("Skipping data combination")
+    if not run_combine(args):
+        return False
     
     end_time = datetime.now()
     duration = end_time - start_time
@@ -75,14 +78,131 @@ def run_collection(args):
     
     return True
 
+def run_combine(args):
+    """企業情報とインターンシップ情報を結合する"""
+    if args.skip_combine:
+        logger.info("Skipping data combination")
+        return True
+    
+    logger.info("Combining company and internship data...")
+    # 収集処理で記録された変更セットがあれば、変更のあった企業のみを更新する
+    with profile_stage("combine"):
+        success = combine_pending_changes(storage=get_storage(), full=args.full_combine)
+    if not success:
+        logger.error("Failed to combine data")
+        return False
+    
+    logger.info("Data combination completed successfully")
+    build_static_responses()
+    return True
+
+def run_enqueue(args):
+    """企業情報を収集（--skip-companies の場合は保存済みのものを使用）し、企業ごとの収集タスクを登録する"""
+    ensure_data_dir()
+    new_ids = None
+    if not args.skip_companies:
+        collector = CompanyCollector(discovery=args.discovery)
+        collector.run()
+        if args.new_only:
+            new_ids = collector.company_ids - collector.existing_ids
+    if not os.path.exists(COMPANIES_FILE):
+        logger.error("No company data available. Cannot enqueue internship tasks.")
+        return False
+    
+    enqueue_companies(WorkQueue(), company_ids=new_ids)
+    return True
+
+def run_queue_worker(args):
+    """ワークキューのタスクを処理する（複数のプロセス・マシンで同時に実行できる）"""
+    run_worker(WorkQueue(), worker_id=args.worker_id, use_fingerprints=not args.full_refresh, wait=args.wait)
+    return True
+
+def run_merge(args):
+    """ワーカーの収集結果を反映し、データを結合する"""
+    ensure_data_dir()
+    merge_results(WorkQueue())
+    return run_combine(args)
+
+def run_daemon(args):
+    """常駐して差分収集のサイクルを繰り返す"""
+    ensure_data_dir()
+    options = {key: value for key, value in [("interval", args.interval), ("batch_size", args.batch_size)]
+               if value is not None}
+    CrawlDaemon(use_fingerprints=not args.full_refresh, **options).run()
+    return True
+
+def show_status(args):
+    """常駐プロセスの状態を表示する"""
+    status = load_status()
+    if not status:
+        logger.error("No daemon status available")
+        return False
+    print(json.dumps(status, ensure_ascii=False, indent=2))
+    return True
+
+def build_static_responses():
+    """結合後に静的APIスナップショットを書き出す
+    
+    Webアプリは同じバージョンのデータセットの間だけ静的APIを使うため、結合のたびに書き出し直す。
+    失敗してもWebアプリはビュー関数でレスポンスを作るため、結合は成功として扱う。
+    """
+    try:
+        build_static_api(SNAPSHOT_FILE, STATIC_API_DIR)
+    except Exception as e:
+        logger.error(f"Failed to write static API responses: {e}")
+
+def run_static_api(args):
+    """結合データのスナップショットから静的APIスナップショットを書き出す（Webアプリのビュー関数を使う）"""
+    if not os.path.exists(SNAPSHOT_FILE):
+        logger.error("No snapshot available. Run the combination first.")
+        return False
+    build_static_api(SNAPSHOT_FILE, STATIC_API_DIR)
+    return True
+
+COMMANDS = {
+    "collect": run_collection,
+    "enqueue": run_enqueue,
+    "worker": run_queue_worker,
+    "merge": run_merge,
+    "daemon": run_daemon,
+    "status": show_status,
+    "static-api": run_static_api,
+}
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Intern information collection system")
+    parser.add_argument("command", nargs="?", default="collect", choices=list(COMMANDS),
+                        help="collect: run all stages in this process (default) / enqueue: enqueue internship tasks "
+                             "for workers / worker: process queued tasks / merge: merge worker results and combine / "
+                             "daemon: keep running incremental crawl cycles / status: show the daemon status / "
+                             "static-api: write the static API responses from the combined data")
     parser.add_argument("--skip-companies", action="store_true", help="Skip company collection")
     parser.add_argument("--skip-internships", action="store_true", help="Skip internship collection")
     parser.add_argument("--skip-combine", action="store_true", help="Skip data combination")
+    parser.add_argument("--full-combine", action="store_true", help="Rebuild combined data from all companies")
+    parser.add_argument("--discovery", choices=["search", "sitemap"], default=COMPANY_DISCOVERY,
+                        help="How to find companies on the job sites (search result pages or sitemaps)")
+    parser.add_argument("--new-only", action="store_true",
+                        help="Enqueue only companies found for the first time in this run (enqueue)")
+    parser.add_argument("--full-refresh", action="store_true", help="Re-extract internships even if pages are unchanged")
+    parser.add_argument("--worker-id", help="Worker ID used for task leases (default: hostname-pid)")
+    parser.add_argument("--wait", action="store_true", help="Keep the worker waiting for new tasks when the queue is empty")
+    parser.add_argument("--interval", type=float, help="Seconds between daemon cycles")
+    parser.add_argument("--batch-size", type=int, help="Companies checked per daemon cycle")
+    parser.add_argument("--profile", action="store_true", help="Profile all stages (reports are written next to the logs)")
+    parser.add_argument("--profile-stage", action="append", choices=PROFILE_STAGES,
+                        help="Profile only this stage (can be given more than once)")
+    parser.add_argument("--profile-sample-rate", type=float, default=PROFILE_SAMPLE_RATE,
+                        help="Fraction of runs to profile when no profile option is given")
     args = parser.parse_args()
     
-    success = run_collection(args)
+    if args.profile_stage:
+        enable_profiling(args.profile_stage)
+    elif args.profile or should_sample(args.profile_sample_rate):
+        enable_profiling()
+    
+    success = COMMANDS[args.command](args)
+    log_run_summary()
     
     if success:
         logger.info("Script executed successfully")
@@ -0,0 +1,133 @@
+"""
+インターン情報自動取得システム - 処理段階ごとのプロファイリング
+
+main.py の --profile / --profile-stage で有効にすると、企業情報の収集・補完、インターンシップ情報の
+収集・マージ、データ結合の各段階について、CPUプロファイル（cProfile）とメモリ割り当て（tracemalloc）を
+記録し、ログディレクトリに段階ごとのレポートを書き出す。有効にしていない場合、profile_stage は何もしない。
+"""
+
+import io
+import os
+import time
+import pstats
+import random
+import cProfile
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+
+from config import LOG_FILE, PROFILE_TOP_FUNCTIONS, PROFILE_TRACEMALLOC_FRAMES
+from utils import logger
+
+# プロファイリングの対象にできる処理段階
+PROFILE_STAGES = ("company", "enrichment", "internship", "merge", "combine")
+
+# レポートの出力先（ログファイルと同じディレクトリの profiles/<実行日時>/）
+PROFILE_DIR = os.path.join(os.path.dirname(LOG_FILE), "profiles")
+
+class StageProfiler:
+    """指定された処理段階の実行中だけ cProfile と tracemalloc を有効にし、段階ごとにレポートを書き出す"""
+    
+    def __init__(self, stages=PROFILE_STAGES, output_dir=None, top=PROFILE_TOP_FUNCTIONS,
+                 frames=PROFILE_TRACEMALLOC_FRAMES):
+        self.stages = set(stages)
+        self.output_dir = output_dir or os.path.join(PROFILE_DIR, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self.top = top
+        self.frames = frames
+        self.reports = {}  # 処理段階 -> レポートのパス
+        self._active = None
+    
+    @contextmanager
+    def stage(self, name):
+        # 対象外の段階と、プロファイル中の段階の内側で呼ばれた段階はそのまま実行する
+        if name not in self.stages or self._active is not None:
+            yield
+            return
+        
+        self._active = name
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        
+        profiler = cProfile.Profile()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._active = None
+            self._write_report(name, profiler, wall, cpu, peak, after.compare_to(before, "lineno"))
+    
+    def _write_report(self, name, profiler, wall, cpu, peak, allocations):
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        
+        # 生のプロファイルは snakeviz などで詳しく見られるよう pstats 形式でも保存する
+        profiler.dump_stats(os.path.join(self.output_dir, f"{name}.prof"))
+        
+        out = io.StringIO()
+        out.write(f"stage: {name}\n")
+        out.write(f"wall time: {wall:.3f} s\n")
+        out.write(f"cpu time: {cpu:.3f} s\n")
+        out.write(f"peak traced memory: {peak / 1024 / 1024:.1f} MB\n\n")
+        
+        stats = pstats.Stats(profiler, stream=out)
+        stats.strip_dirs()
+        out.write(f"=== top {self.top} functions by own time ===\n")
+        stats.sort_stats("tottime").print_stats(self.top)
+        out.write(f"=== top {self.top} functions by cumulative time ===\n")
+        stats.sort_stats("cumulative").print_stats(self.top)
+        
+        out.write(f"=== top {self.top} allocation sites (net change during the stage) ===\n")
+        for diff in allocations[:self.top]:
+            out.write(f"{diff}\n")
+        
+        report_file = os.path.join(self.output_dir, f"{name}.txt")
+        with open(report_file, "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        self.reports[name] = report_file
+        logger.info(f"Profile of stage '{name}' ({wall:.1f}s wall, {cpu:.1f}s cpu, "
+                    f"peak {peak / 1024 / 1024:.1f}MB) written to {report_file}")
+
+# 実行中のプロファイラ（無効の場合はNone）
+_profiler = None
+
+def enable_profiling(stages=PROFILE_STAGES, output_dir=None):
+    """指定した処理段階のプロファイリングを有効にする"""
+    global _profiler
+    _profiler = StageProfiler(stages, output_dir)
+    logger.info(f"Profiling stages {', '.join(sorted(_profiler.stages))} into {_profiler.output_dir}")
+    return _profiler
+
+def disable_profiling():
+    global _profiler
+    _profiler = None
+
+def should_sample(rate):
+    """この実行をプロファイリングの対象にするか（rate の確率で対象にする）"""
+    return rate > 0 and random.random() < rate
+
+def profile_stage(name):
+    """処理段階の範囲を示すコンテキストマネージャ（プロファイリングが有効な場合のみ計測する）"""
+    if _profiler is None:
+        return _NULL_STAGE
+    return _profiler.stage(name)
+
+class _NullStage:
+    def __enter__(self):
+        return None
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
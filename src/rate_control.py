@@ -0,0 +1,163 @@
+"""
+インターン情報自動取得システム - ホストごとの適応的なリクエスト制御（AIMD）
+
+応答が正常な間はホストへのリクエスト頻度と同時リクエスト数を少しずつ（加算的に）上げ、
+429/503 の応答や接続エラー、応答時間の急増があれば大きく（乗算的に）下げる。
+これを繰り返すことで、各サイトが許容する速度に手動の調整なしで収束させる。
+上限は就活サイトは JOB_SITES の max_rate / max_concurrency、その他のホストは ADAPTIVE_MAX_RATE /
+ADAPTIVE_MAX_CONCURRENCY。
+"""
+
+import time
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+
+from config import JOB_SITES, ADAPTIVE_INITIAL_RATE, ADAPTIVE_MIN_RATE, ADAPTIVE_MAX_RATE, ADAPTIVE_MAX_CONCURRENCY, \
+    ADAPTIVE_RATE_STEP, ADAPTIVE_DECREASE_FACTOR, ADAPTIVE_LATENCY_SPIKE, ADAPTIVE_LATENCY_FLOOR
+
+# 頻度を下げる応答のステータスコード
+THROTTLE_STATUSES = (429, 503)
+
+# Retry-After で待つ最大の秒数
+MAX_RETRY_AFTER = 300
+
+# 応答時間の指数移動平均の重み
+LATENCY_SMOOTHING = 0.2
+
+class HostController:
+    """1つのホストへのリクエスト頻度（回/秒）と同時リクエスト数を AIMD で調整する"""
+    
+    def __init__(self, host, max_rate=ADAPTIVE_MAX_RATE, max_concurrency=ADAPTIVE_MAX_CONCURRENCY,
+                 initial_rate=ADAPTIVE_INITIAL_RATE, min_rate=ADAPTIVE_MIN_RATE, rate_step=ADAPTIVE_RATE_STEP,
+                 decrease_factor=ADAPTIVE_DECREASE_FACTOR):
+        self.host = host
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.min_rate = min(min_rate, max_rate)
+        self.rate_step = rate_step
+        self.decrease_factor = decrease_factor
+        self.rate = min(initial_rate, max_rate)
+        self.concurrency = 1.0
+        self.in_flight = 0
+        self.latency = None  # 応答時間（ヘッダーを受信するまで）の指数移動平均
+        self.counts = Counter()  # requests / throttled / errors / latency_spikes / increases / decreases
+        self.peak_rate = self.rate
+        self._next_slot = 0.0
+        self._cooldown_until = 0.0
+        self._cond = threading.Condition()
+    
+    def acquire(self):
+        """同時リクエスト数と頻度の範囲内でリクエストを送れるようになるまで待ち、開始時刻を返す"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self.in_flight >= int(self.concurrency):
+                    self._cond.wait()
+                elif now < self._next_slot:
+                    self._cond.wait(self._next_slot - now)
+                else:
+                    break
+            self.in_flight += 1
+            self._next_slot = now + 1 / self.rate
+            return now
+    
+    def release(self, started, status=None, error=False, retry_after=None):
+        """リクエストの結果を記録して頻度を調整し、下げた場合はその理由を返す
+        
+        status は失敗したリクエストのステータスコード、error は接続エラー・タイムアウトなどで応答がなかったか。
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._cond:
+            self.in_flight -= 1
+            self.counts["requests"] += 1
+            
+            reason = None
+            if status in THROTTLE_STATUSES:
+                reason = "throttled"
+            elif error or (status is not None and status >= 500):
+                reason = "errors"
+            elif status is None:
+                if self.latency is not None and latency > max(self.latency * ADAPTIVE_LATENCY_SPIKE,
+                                                              ADAPTIVE_LATENCY_FLOOR):
+                    reason = "latency_spikes"
+                # 応答時間が継続して長くなった場合はそれを新しい基準にする
+                self.latency = latency if self.latency is None else \
+                    self.latency + LATENCY_SMOOTHING * (latency - self.latency)
+            
+            if reason is not None:
+                self.counts[reason] += 1
+                decreased = self._decrease(now, retry_after)
+            elif status is None:
+                self._increase()
+                decreased = False
+            else:
+                decreased = False  # 404 などホストの負荷と関係のない失敗は頻度を変えない
+            self._cond.notify_all()
+            return reason if decreased else None
+    
+    def _increase(self):
+        # 正常な応答1件ごとに step / rate 増やす（頻度いっぱいで送っていれば1秒あたり step 増える）
+        self.rate = min(self.max_rate, self.rate + self.rate_step / self.rate)
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        self.peak_rate = max(self.peak_rate, self.rate)
+        self.counts["increases"] += 1
+    
+    def _decrease(self, now, retry_after):
+        if retry_after:
+            self._next_slot = max(self._next_slot, now + min(retry_after, MAX_RETRY_AFTER))
+        # 下げる前に送ったリクエストの結果で続けて下げないよう、しばらくは下げない
+        if now < self._cooldown_until:
+            return False
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.concurrency = max(1.0, self.concurrency * self.decrease_factor)
+        self._cooldown_until = now + max(1 / self.rate, self.latency or 0)
+        self._next_slot = max(self._next_slot, now + 1 / self.rate)
+        self.counts["decreases"] += 1
+        return True
+    
+    def metrics(self):
+        """現在の頻度・同時リクエスト数と、これまでの判断の件数"""
+        with self._cond:
+            return {
+                "rate": round(self.rate, 3),
+                "concurrency": int(self.concurrency),
+                "max_rate": self.max_rate,
+                "max_concurrency": self.max_concurrency,
+                "peak_rate": round(self.peak_rate, 3),
+                "latency": round(self.latency, 3) if self.latency is not None else None,
+                **{key: self.counts[key] for key in ("requests", "throttled", "errors", "latency_spikes",
+                                                     "increases", "decreases")}
+            }
+
+# ホスト -> 制御
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def _site_limits(host):
+    for site in JOB_SITES.values():
+        if urlparse(site["url"]).netloc.lower() == host:
+            return site.get("max_rate", ADAPTIVE_MAX_RATE), site.get("max_concurrency", ADAPTIVE_MAX_CONCURRENCY)
+    return ADAPTIVE_MAX_RATE, ADAPTIVE_MAX_CONCURRENCY
+
+def host_controller(url):
+    """URLのホストの制御を返す（初めてのホストの場合は作成する）"""
+    host = urlparse(url).netloc.lower()
+    with _controllers_lock:
+        controller = _controllers.get(host)
+        if controller is None:
+            max_rate, max_concurrency = _site_limits(host)
+            controller = _controllers[host] = HostController(host, max_rate, max_concurrency)
+        return controller
+
+def host_metrics():
+    """ホストごとの制御の状態（リクエスト数の多い順）"""
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    metrics = {controller.host: controller.metrics() for controller in controllers}
+    return dict(sorted(metrics.items(), key=lambda item: -item[1]["requests"]))
+
+def reset_controllers():
+    with _controllers_lock:
+        _controllers.clear()
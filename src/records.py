@@ -0,0 +1,126 @@
+"""
+インターン情報自動取得システム - 企業・インターンシップのレコード型
+
+収集・マージ・Webアプリで扱う企業・インターンシップを __slots__ のクラスで表す。辞書と比べて1件あたりの
+メモリが少なく、取得元・期間などの繰り返し現れる文字列は intern して全レコードで共有する。
+ファイル・ストレージ・APIとの受け渡しでは to_dict / from_dict で辞書（JSON）に変換する。
+"""
+
+import sys
+from datetime import date
+
+_MISSING = object()
+
+def intern_value(value):
+    """文字列を intern する（文字列以外はそのまま返す）"""
+    return sys.intern(value) if type(value) is str else value
+
+_today = (None, None)
+
+def today():
+    """今日の日付の文字列（日付が変わるまで同じ文字列を使い回す）"""
+    global _today
+    current = date.today()
+    if _today[0] != current:
+        _today = (current, sys.intern(current.strftime("%Y-%m-%d")))
+    return _today[1]
+
+class Record:
+    """レコード型の基底クラス
+    
+    サブクラスは FIELDS（項目。to_dict の出力順）と INTERNED（intern する項目）を定義する。
+    設定されていない項目は to_dict に含めず、FIELDS にないキーは extra に保持するため、
+    from_dict / to_dict で元の辞書と同じ内容に戻る。
+    """
+    
+    __slots__ = ()
+    FIELDS = ()
+    INTERNED = frozenset()
+    
+    def __init__(self, **values):
+        interned = self.INTERNED
+        for field, value in values.items():
+            setattr(self, field, intern_value(value) if field in interned else value)
+    
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        fields = cls._field_set
+        interned = cls.INTERNED
+        extra = None
+        for key, value in data.items():
+            if key in fields:
+                setattr(record, key, intern_value(value) if key in interned else value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        if extra:
+            record.extra = extra
+        return record
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+    
+    def to_dict(self):
+        data = {}
+        for field in self.FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                data[field] = value
+        extra = getattr(self, "extra", None)
+        if extra:
+            data.update(extra)
+        return data
+    
+    def get(self, field, default=None):
+        if field in self._field_set:
+            return getattr(self, field, default)
+        return (getattr(self, "extra", None) or {}).get(field, default)
+    
+    def __getitem__(self, field):
+        value = self.get(field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+    
+    def __contains__(self, field):
+        return self.get(field, _MISSING) is not _MISSING
+    
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class CompanyRecord(Record):
+    """企業
+    
+    id, name, source（取得元）は str、stock_code / market / industry は上場企業一覧、job_site_url /
+    internship_url は就活サイト、official_site / career_site は補完で設定する str または None。
+    取得元によって項目が異なるため、設定されていない項目はファイルにも出力しない。
+    """
+    
+    FIELDS = ("id", "name", "stock_code", "market", "industry", "source", "job_site_url", "internship_url",
+              "official_site", "career_site")
+    INTERNED = frozenset(("market", "industry", "source"))
+    __slots__ = FIELDS + ("extra",)
+
+class InternshipRecord(Record):
+    """インターンシップ
+    
+    id, company_id, company_name, title, application_url, source, last_updated は str、period / target は
+    str（取得できない場合は None）、start_date / end_date は YYYY-MM-DD の str（不明な場合は None）、
+    verification は検証結果の dict（マージ後のみ）。
+    """
+    
+    FIELDS = ("id", "company_id", "company_name", "title", "period", "start_date", "end_date", "target",
+              "application_url", "source", "last_updated", "verification")
+    INTERNED = frozenset(("company_id", "company_name", "period", "start_date", "end_date", "target", "source",
+                          "last_updated"))
+    __slots__ = FIELDS + ("extra",)
@@ -0,0 +1,83 @@
+"""
+インターン情報自動取得システム - APIレスポンスのキャッシュと圧縮
+
+レスポンスはデータセットのバージョンとリクエストURLごとに保持し、圧縮済みの本体も合わせて
+キャッシュする。データセットが差し替わると古いバージョンのエントリはすべて破棄する。
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# これより小さいレスポンスは圧縮しない（バイト）
+MIN_COMPRESS_SIZE = 1024
+
+# 保持するレスポンスの最大件数
+MAX_CACHE_ENTRIES = 512
+
+def supported_encodings():
+    """対応している圧縮形式（優先順）"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+def make_etag(version, path):
+    """データセットのバージョンとリクエストURLから強いETagの値を作る"""
+    return f"{version}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]}"
+
+class CachedResponse:
+    """1つのURLに対するレスポンス本体と、圧縮形式ごとの圧縮済み本体"""
+    
+    def __init__(self, etag, body, mimetype):
+        self.etag = etag
+        self.body = body
+        self.mimetype = mimetype
+        self._encoded = {}
+        self._lock = threading.Lock()
+    
+    def encoded(self, encoding):
+        """圧縮済みの本体を返す（初回のみ圧縮する。圧縮しない場合はNone）"""
+        if encoding is None or len(self.body) < MIN_COMPRESS_SIZE:
+            return None
+        with self._lock:
+            body = self._encoded.get(encoding)
+            if body is None:
+                body = self._encoded[encoding] = compress(self.body, encoding)
+            return body
+
+class ResponseCache:
+    """データセットのバージョンごとにレスポンスを保持するLRUキャッシュ"""
+    
+    def __init__(self, max_entries=MAX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, version, path):
+        with self._lock:
+            if version != self.version:
+                return None
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+            return entry
+    
+    def put(self, version, path, entry):
+        with self._lock:
+            if version != self.version:
+                # 新しいデータセットに切り替わったら以前のレスポンスは使わない
+                self._entries.clear()
+                self.version = version
+            self._entries[path] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
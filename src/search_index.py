@@ -0,0 +1,255 @@
+"""
+インターン情報自動取得システム - 全文検索インデックス（文字bigram）
+
+形態素解析を使わず、正規化した文字列の2文字ずつの組（bigram）で転置インデックスを作る。
+検索語のbigramをすべて含む文書を転置リストの積で絞り込み、最後に部分一致で確認する。
+"""
+
+import re
+import json
+import math
+import heapq
+import hashlib
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from html import escape
+
+# 検索対象のフィールドと重み
+COMPANY_FIELDS = {"name": 3.0}
+INTERNSHIP_FIELDS = {"title": 3.0, "company_name": 2.0, "target": 1.0, "period": 0.5}
+
+# 削除済み文書の割合がこれを超えたら全体を作り直す
+COMPACTION_RATIO = 0.25
+
+_SEPARATORS = re.compile(r'[\s　、。・,.\-/()（）「」『』【】]+')
+
+def normalize(text):
+    """全角・半角や大文字・小文字の違いを吸収する"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+def tokenize(text):
+    """正規化済みの文字列を区切り文字で分け、bigramの集合に分解する"""
+    tokens = set()
+    for segment in _SEPARATORS.split(text):
+        for i in range(len(segment) - 1):
+            tokens.add(segment[i:i + 2])
+    return tokens
+
+def query_terms(query):
+    """検索クエリを正規化し、空白で区切られた検索語のリストにする"""
+    return [term for term in _SEPARATORS.split(normalize(query)) if term]
+
+def highlight(text, terms):
+    """検索語に一致する部分を <mark> で囲んだHTMLを返す（一致がなければNone）"""
+    if not text:
+        return None
+    normalized = normalize(text)
+    # NFKC正規化で文字数が変わる場合は正規化後の文字列を表示に使う
+    source = text if len(normalized) == len(text) else normalized
+    
+    spans = []
+    for term in terms:
+        start = normalized.find(term)
+        while start != -1:
+            spans.append((start, start + len(term)))
+            start = normalized.find(term, start + 1)
+    if not spans:
+        return None
+    
+    # 重なる範囲をまとめてから囲む
+    spans.sort()
+    merged = [list(spans[0])]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    
+    parts = []
+    position = 0
+    for start, end in merged:
+        parts.append(escape(source[position:start]))
+        parts.append(f"<mark>{escape(source[start:end])}</mark>")
+        position = end
+    parts.append(escape(source[position:]))
+    return "".join(parts)
+
+def company_signature(company):
+    """企業単位の差分更新に使う、企業情報（インターンシップ情報を含む）のハッシュ値"""
+    return hashlib.blake2b(
+        json.dumps(company, ensure_ascii=False, sort_keys=True).encode('utf-8'), digest_size=16).digest()
+
+class SearchIndex:
+    """企業名・インターンシップ名・対象・期間の転置インデックス
+    
+    文書IDは追加順の連番で、転置リストは文書IDの昇順の配列として持つ。企業単位で
+    文書を削除（無効化）・追加できるため、データセットの再読み込み時は変更のあった
+    企業だけを索引し直す。
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+    
+    def _clear(self):
+        self.postings = {}       # bigram -> array('i') 文書IDの昇順
+        self.documents = []      # 文書ID -> (種別, ID, 企業ID, {フィールド: 正規化済み文字列}) / 削除済みはNone
+        self.company_docs = {}   # 企業ID -> 文書IDのリスト
+        self.signatures = {}     # 企業ID -> company_signature
+        self.live_count = 0
+    
+    def __len__(self):
+        return self.live_count
+    
+    # 索引の構築・更新
+    def update(self, companies):
+        """データセットの企業情報（リストまたはイテレータ）に合わせて索引を更新し、索引し直した企業数を返す"""
+        # 変更のあった企業だけを保持しながら1回の走査で差分を求める
+        signatures = {}
+        changed = []
+        for company in companies:
+            company_id = company.get("id", "")
+            signatures[company_id] = company_signature(company)
+            if self.signatures.get(company_id) != signatures[company_id]:
+                changed.append(company)
+        
+        with self._lock:
+            removed = [company_id for company_id in self.company_docs if company_id not in signatures]
+            for company_id in removed:
+                self._remove_company(company_id)
+            for company in changed:
+                self._remove_company(company.get("id", ""))
+                self._add_company(company)
+            self.signatures = signatures
+            needs_compaction = len(self.documents) - self.live_count > COMPACTION_RATIO * len(self.documents)
+        
+        if needs_compaction:
+            self._compact()
+        return len(changed) + len(removed)
+    
+    def _compact(self):
+        """無効化した文書を除いて作り直す（検索を止めないよう、ロックの外で作ってから差し替える）"""
+        with self._lock:
+            documents = [document for document in self.documents if document is not None]
+            signatures = self.signatures
+        
+        rebuilt = SearchIndex()
+        for kind, ref_id, company_id, fields in documents:
+            doc_id = rebuilt._append_document(kind, ref_id, company_id, fields)
+            rebuilt.company_docs.setdefault(company_id, []).append(doc_id)
+        
+        with self._lock:
+            self.postings = rebuilt.postings
+            self.documents = rebuilt.documents
+            self.company_docs = rebuilt.company_docs
+            self.signatures = signatures
+            self.live_count = rebuilt.live_count
+    
+    def _remove_company(self, company_id):
+        for doc_id in self.company_docs.pop(company_id, []):
+            if self.documents[doc_id] is not None:
+                self.documents[doc_id] = None
+                self.live_count -= 1
+        self.signatures.pop(company_id, None)
+    
+    def _add_company(self, company):
+        company_id = company.get("id", "")
+        doc_ids = [self._add_document("company", company_id, company_id, company, COMPANY_FIELDS)]
+        for internship in company.get("internships", []):
+            fields = dict(internship, company_name=internship.get("company_name") or company.get("name"))
+            doc_ids.append(self._add_document("internship", internship.get("id", ""), company_id,
+                                              fields, INTERNSHIP_FIELDS))
+        self.company_docs[company_id] = doc_ids
+    
+    def _add_document(self, kind, ref_id, company_id, record, field_weights):
+        fields = {field: normalize(record.get(field)) for field in field_weights if record.get(field)}
+        return self._append_document(kind, ref_id, company_id, fields)
+    
+    def _append_document(self, kind, ref_id, company_id, fields):
+        doc_id = len(self.documents)
+        self.documents.append((kind, ref_id, company_id, fields))
+        self.live_count += 1
+        
+        tokens = set()
+        for text in fields.values():
+            tokens |= tokenize(text)
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = array('i')
+            posting.append(doc_id)
+        return doc_id
+    
+    # 検索
+    def _candidates(self, term):
+        """検索語のbigramをすべて含む文書IDを返す（bigramを作れない1文字の語は全文書を走査する）"""
+        if len(term) == 1:
+            return [doc_id for doc_id, document in enumerate(self.documents)
+                    if document is not None and any(term in text for text in document[3].values())]
+        
+        postings = []
+        for token in tokenize(term):
+            posting = self.postings.get(token)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        
+        result = []
+        for doc_id in postings[0]:
+            for posting in postings[1:]:
+                i = bisect_left(posting, doc_id)
+                if i == len(posting) or posting[i] != doc_id:
+                    break
+            else:
+                result.append(doc_id)
+        return result
+    
+    def search(self, query, kind=None, limit=20, offset=0):
+        """検索してスコアの高い順に (一致件数, [(スコア, 種別, ID, 企業ID)]) を返す
+        
+        空白で区切った検索語はすべてを含むもの（AND）に一致する。
+        """
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        
+        with self._lock:
+            total_docs = max(self.live_count, 1)
+            candidates = None
+            term_weights = []
+            for term in sorted(terms, key=len, reverse=True):
+                docs = self._candidates(term)
+                term_weights.append((term, math.log(1 + total_docs / (len(docs) + 1))))
+                candidates = set(docs) if candidates is None else candidates & set(docs)
+                if not candidates:
+                    return 0, []
+            
+            scored = []
+            for doc_id in candidates:
+                document = self.documents[doc_id]
+                if document is None:
+                    continue
+                doc_kind, ref_id, company_id, fields = document
+                if kind and doc_kind != kind:
+                    continue
+                
+                weights = COMPANY_FIELDS if doc_kind == "company" else INTERNSHIP_FIELDS
+                score = 0.0
+                for term, idf in term_weights:
+                    term_score = sum(weights[field] for field, text in fields.items() if term in text)
+                    if not term_score:
+                        # bigramは揃っているが連続していない場合は一致としない
+                        break
+                    score += idf * term_score
+                else:
+                    scored.append((score, -doc_id, doc_id))
+            
+            top = heapq.nlargest(offset + limit, scored)[offset:]
+            results = []
+            for score, _, doc_id in top:
+                doc_kind, ref_id, company_id, _ = self.documents[doc_id]
+                results.append((round(score, 4), doc_kind, ref_id, company_id))
+            return len(scored), results
@@ -0,0 +1,133 @@
+"""
+インターン情報自動取得システム - サイトマップからの企業の発見
+
+就活サイトのサイトマップ（インデックス・XML、gzip圧縮を含む）を受信しながら逐次解析し、企業ページの
+URLから企業IDを取り出す。検索結果のHTMLを1ページずつ取得する代わりに、数個の圧縮XMLのダウンロードで
+サイト上の企業を列挙できる。
+"""
+
+import io
+import re
+import gzip
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlparse
+
+from config import JOB_SITES
+from utils import make_request, iter_response_bytes, logger
+
+# たどるサイトマップインデックスの深さの上限
+MAX_SITEMAP_DEPTH = 3
+
+class _ChunkStream(io.RawIOBase):
+    """バイト列のイテレータを読み込み可能なファイルとして扱う"""
+    
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def parse_sitemap(fileobj):
+    """サイトマップを逐次解析し、("sitemap" または "url", URL) を順に返す
+    
+    "sitemap" はサイトマップインデックスに含まれる子のサイトマップ。gzip圧縮されたファイルはそのまま渡してよい。
+    """
+    stream = io.BufferedReader(fileobj) if not hasattr(fileobj, "peek") else fileobj
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream)
+    
+    root = None
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+        name = _local_name(element.tag)
+        if name in ("sitemap", "url"):
+            loc = next((child.text for child in element if _local_name(child.tag) == "loc"), None)
+            if loc:
+                yield name, loc.strip()
+            # 処理済みの要素を破棄し、大きなサイトマップでもメモリ使用量を一定に保つ
+            root.clear()
+
+def sitemap_urls(site):
+    """サイトのサイトマップのURL（設定がなければ robots.txt の Sitemap: の行）"""
+    if site.get("sitemap_url"):
+        return [site["sitemap_url"]]
+    robots_url = urljoin(site["url"], "/robots.txt")
+    try:
+        response = make_request(robots_url)
+    except Exception as e:
+        logger.warning(f"Failed to fetch {robots_url}: {e}")
+        return []
+    return [line.split(":", 1)[1].strip() for line in response.text.splitlines()
+            if line.lower().startswith("sitemap:")]
+
+def iter_sitemap_urls(url, depth=0):
+    """サイトマップ（インデックスの場合は子のサイトマップも）に含まれるページのURLを返す"""
+    response = make_request(url, stream=True)
+    children = []
+    try:
+        for kind, loc in parse_sitemap(_ChunkStream(iter_response_bytes(response))):
+            if kind == "url":
+                yield loc
+            else:
+                children.append(loc)
+    finally:
+        response.close()
+    
+    # 子のサイトマップは、インデックスの受信を終えてから順に取得する
+    for child in children:
+        if depth + 1 >= MAX_SITEMAP_DEPTH:
+            logger.warning(f"Skipping nested sitemap {child}: too deep")
+            continue
+        try:
+            yield from iter_sitemap_urls(child, depth + 1)
+        except Exception as e:
+            logger.warning(f"Failed to read sitemap {child}: {e}")
+
+def extract_company_ids(site_key, urls):
+    """URLのうちサイトの企業ページのものから (企業ID, URL) を返す（同じ企業は最初のURLのみ）"""
+    site = JOB_SITES[site_key]
+    pattern = re.compile(site["company_id_pattern"])
+    host = urlparse(site["url"]).netloc.lower()
+    seen = set()
+    for url in urls:
+        if urlparse(url).netloc.lower() != host:
+            continue
+        match = pattern.search(urlparse(url).path)
+        if match and match.group(1) not in seen:
+            seen.add(match.group(1))
+            yield match.group(1), url
+
+def discover_companies(site_key, known_ids):
+    """サイトマップから、known_ids（"<サイト>_<ID>" 形式）に含まれない企業の (企業ID, URL) を返す
+    
+    サイトマップが見つからない場合は None を返す。
+    """
+    urls = sitemap_urls(JOB_SITES[site_key])
+    if not urls:
+        logger.warning(f"No sitemap found for {JOB_SITES[site_key]['name']}")
+        return None
+    
+    def all_urls():
+        for url in urls:
+            yield from iter_sitemap_urls(url)
+    
+    return [(site_id, url) for site_id, url in extract_company_ids(site_key, all_urls())
+            if f"{site_key}_{site_id}" not in known_ids]
@@ -0,0 +1,282 @@
+"""
+インターン情報自動取得システム - 結合データのスナップショット形式
+
+ファイル構成:
+    MAGIC (8バイト) | ヘッダー長 (8バイト, リトルエンディアン) | ヘッダー (JSON) | 本体
+
+ヘッダーには文字列テーブル、キーテーブル、企業ごとの本体内オフセットと、本体の内容から求めた
+バージョンを持つ。本体は企業ごとに独立してエンコードされており、必要な企業だけを読み出して
+デコードできる。
+
+文字列テーブルで共有するフィールドの値は、文字列なら文字列テーブルの番号（整数）、それ以外（整数・
+None など）なら値を1要素の配列に入れて書き出し、文字列テーブルの参照と区別する。
+
+読み込みはメモリマップで行うため、同じファイルを開いた複数のプロセス（WSGIサーバーの
+ワーカーなど）はOSのページキャッシュ上の同じ内容を共有する。更新時は一時ファイルに書き出して
+から os.replace で置き換えるため、読み込み側からは旧版か新版のどちらかが丸ごと見える。
+開いたままの旧版は置き換え後も閉じるまで読み込める。
+"""
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+
+from utils import logger
+
+MAGIC = b"ISNAP\x00\x00\x01"
+HEADER_LENGTH = struct.Struct("<Q")
+
+# 値が繰り返し現れるため文字列テーブルで共有するフィールド
+INTERNED_FIELDS = frozenset(["source", "company_name", "market", "industry"])
+
+_compact = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+class _RecordEncoder:
+    """辞書をキーテーブルの順序に沿った配列にエンコードする"""
+    
+    def __init__(self, strings, string_ids, keys=()):
+        # 既存のキーテーブルを引き継ぐ場合は、同じキーに同じ番号を使う
+        self.keys = list(keys)
+        self.key_ids = {key: i for i, key in enumerate(self.keys)}
+        self.strings = strings
+        self.string_ids = string_ids
+    
+    def encode(self, record):
+        # 先頭要素は存在するキーのビットマスク
+        mask = 0
+        values = []
+        for key in sorted(record, key=self._key_id):
+            value = record[key]
+            if key in INTERNED_FIELDS:
+                # 文字列は文字列テーブルの番号、それ以外の値は1要素の配列にして参照と区別する
+                value = self._string_id(value) if isinstance(value, str) else [value]
+            mask |= 1 << self.key_ids[key]
+            values.append(value)
+        return [mask] + values
+    
+    def _key_id(self, key):
+        if key not in self.key_ids:
+            self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        return self.key_ids[key]
+    
+    def _string_id(self, value):
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+def _encode_company(company, company_encoder, internship_encoder):
+    """企業情報を (企業ID, インターンシップ数, 本体) にエンコードする"""
+    internships = company.get("internships", [])
+    fields = {key: value for key, value in company.items() if key != "internships"}
+    blob = _compact([
+        company_encoder.encode(fields),
+        [internship_encoder.encode(internship) for internship in internships]
+    ]).encode('utf-8')
+    return company["id"], len(internships), blob
+
+def _write(filepath, meta, blobs, strings, company_encoder, internship_encoder):
+    """(企業ID, インターンシップ数, 本体) の並びからスナップショットを書き出す"""
+    company_ids = []
+    offsets = []
+    internship_counts = []
+    
+    # 本体を先に一時ファイルへ書き出し、文字列テーブルが確定してからヘッダーを付ける
+    body_file = f"{filepath}.body.tmp"
+    offset = 0
+    digest = hashlib.sha1()
+    with open(body_file, 'wb') as body:
+        for company_id, internship_count, blob in blobs:
+            body.write(blob)
+            digest.update(blob)
+            
+            company_ids.append(company_id)
+            offsets.append(offset)
+            internship_counts.append(internship_count)
+            offset += len(blob)
+    offsets.append(offset)
+    
+    header = _compact({
+        "version": digest.hexdigest()[:16],
+        "meta": meta,
+        "strings": strings,
+        "company_keys": company_encoder.keys,
+        "internship_keys": internship_encoder.keys,
+        "company_ids": company_ids,
+        "offsets": offsets,
+        "internship_counts": internship_counts,
+    }).encode('utf-8')
+    
+    tmp_file = f"{filepath}.tmp"
+    with open(tmp_file, 'wb') as out, open(body_file, 'rb') as body:
+        out.write(MAGIC)
+        out.write(HEADER_LENGTH.pack(len(header)))
+        out.write(header)
+        while True:
+            chunk = body.read(1 << 20)
+            if not chunk:
+                break
+            out.write(chunk)
+    os.remove(body_file)
+    os.replace(tmp_file, filepath)
+    return len(company_ids)
+
+def write_snapshot(companies, meta, filepath):
+    """企業情報（インターンシップ情報付き）のイテレータからスナップショットを書き出す"""
+    strings = []
+    string_ids = {}
+    company_encoder = _RecordEncoder(strings, string_ids)
+    internship_encoder = _RecordEncoder(strings, string_ids)
+    
+    blobs = (_encode_company(company, company_encoder, internship_encoder) for company in companies)
+    count = _write(filepath, meta, blobs, strings, company_encoder, internship_encoder)
+    logger.info(f"Snapshot of {count} companies saved to {filepath}")
+
+def update_snapshot(companies, meta, filepath, base_company_ids):
+    """既存のスナップショットのうち変更のあった企業だけをエンコードし直して更新する
+    
+    companies は更新後の企業の並びで、変更のない企業は企業ID、変更のあった企業は企業情報（インターンシップ
+    情報付き）の辞書を指定する。変更のない企業は旧版の本体をデコードせずにそのままコピーする。文字列・
+    キーのテーブルは旧版の本体の参照が変わらないよう旧版に追記する（使われなくなった文字列は全件の
+    書き出し時に取り除かれる）。旧版がない、または旧版の企業の並びが base_company_ids と異なる場合は
+    何もせずに False を返す。
+    """
+    try:
+        reader = SnapshotReader(filepath)
+    except (OSError, ValueError) as e:
+        logger.info(f"Cannot update snapshot {filepath}: {e}")
+        return False
+    
+    with reader:
+        if reader.company_ids != list(base_company_ids):
+            logger.info(f"Snapshot {filepath} does not match the combined data")
+            return False
+        
+        strings = list(reader._strings)
+        string_ids = {value: i for i, value in enumerate(strings)}
+        company_encoder = _RecordEncoder(strings, string_ids, reader._company_keys)
+        internship_encoder = _RecordEncoder(strings, string_ids, reader._internship_keys)
+        
+        def blobs():
+            updated = 0
+            for company in companies:
+                if isinstance(company, str):
+                    position = reader._positions[company]
+                    yield company, reader.internship_counts[position], reader.blob_at(position)
+                else:
+                    updated += 1
+                    yield _encode_company(company, company_encoder, internship_encoder)
+            logger.info(f"Re-encoded {updated} companies in snapshot {filepath}")
+        
+        # 旧版はメモリマップで開いたままのため、置き換えた後も読み込み中の本体は有効
+        _write(filepath, meta, blobs(), strings, company_encoder, internship_encoder)
+    return True
+
+class SnapshotReader:
+    """スナップショットをメモリマップで開き、企業単位で遅延デコードするクラス"""
+    
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._map = None
+        with open(filepath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < len(MAGIC) + HEADER_LENGTH.size:
+                raise ValueError(f"Not a snapshot file: {filepath}")
+            # ファイルを閉じてもマップは有効
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not a snapshot file: {filepath}")
+            header_start = len(MAGIC) + HEADER_LENGTH.size
+            (header_length,) = HEADER_LENGTH.unpack(self._map[len(MAGIC):header_start])
+            header = json.loads(self._map[header_start:header_start + header_length])
+        except Exception:
+            self.close()
+            raise
+        
+        self.version = header.get("version")
+        self.meta = header["meta"]
+        self.company_ids = header["company_ids"]
+        self.internship_counts = header["internship_counts"]
+        self._strings = header["strings"]
+        self._company_keys = header["company_keys"]
+        self._internship_keys = header["internship_keys"]
+        self._offsets = header["offsets"]
+        self._body_start = len(MAGIC) + HEADER_LENGTH.size + header_length
+        self._positions = {company_id: i for i, company_id in enumerate(self.company_ids)}
+        self._company_layouts = {}
+        self._internship_layouts = {}
+    
+    def __len__(self):
+        return len(self.company_ids)
+    
+    def __contains__(self, company_id):
+        return company_id in self._positions
+    
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+    
+    def __del__(self):
+        self.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _decode(self, encoded, keys, layouts):
+        # ビットマスクごとの (キー, 文字列テーブル参照か) の並びをキャッシュして使い回す
+        mask = encoded[0]
+        layout = layouts.get(mask)
+        if layout is None:
+            layout = layouts[mask] = [
+                (key, key in INTERNED_FIELDS) for i, key in enumerate(keys) if mask >> i & 1
+            ]
+        
+        strings = self._strings
+        record = {}
+        for (key, interned), value in zip(layout, encoded[1:]):
+            if interned:
+                if type(value) is int:
+                    value = strings[value]
+                elif type(value) is list:
+                    value = value[0]
+            record[key] = value
+        return record
+    
+    def blob_at(self, position):
+        """position番目の企業のエンコード済みの本体"""
+        return self._map[self._body_start + self._offsets[position]:self._body_start + self._offsets[position + 1]]
+    
+    def company_at(self, position):
+        """position番目の企業情報（インターンシップ情報付き）をデコードして返す"""
+        encoded_company, encoded_internships = json.loads(self.blob_at(position))
+        
+        company = self._decode(encoded_company, self._company_keys, self._company_layouts)
+        company["internships"] = [
+            self._decode(encoded, self._internship_keys, self._internship_layouts) for encoded in encoded_internships
+        ]
+        return company
+    
+    def get_company(self, company_id):
+        """企業情報を返す（存在しない場合はNone）"""
+        position = self._positions.get(company_id)
+        if position is None:
+            return None
+        return self.company_at(position)
+    
+    get = get_company  # 企業ID -> 企業情報の辞書と同じように使えるようにする
+    
+    def iter_companies(self):
+        for position in range(len(self.company_ids)):
+            yield self.company_at(position)
+    
+    def to_dict(self):
+        """結合データ（combined_data.json）と同じ構造の辞書を返す"""
+        return {"companies": list(self.iter_companies()), "meta": self.meta}
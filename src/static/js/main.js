@@ -1,42 +1,96 @@
 /* インターン情報自動取得システム - メインJavaScript */
 
 // グローバル変数
-let allInternships = [];
-let allCompanies = [];
 let currentPage = 1;
 const itemsPerPage = 10;
-let filteredInternships = [];
+let currentInternships = [];
+let totalInternships = 0;
+let searchTimer = null;
+let requestSequence = 0;
+let facetSequence = 0;
+
+// 集計項目と絞り込み用セレクトボックスの対応
+const facetFilters = {
+    industry: 'industryFilter',
+    market: 'marketFilter',
+    source: 'sourceFilter',
+    deadline_month: 'deadlineMonthFilter'
+};
 
 // ページ読み込み時の処理
 document.addEventListener('DOMContentLoaded', function() {
     // データの読み込み
     fetchData();
     
-    // 検索とフィルタリングのイベントリスナー
-    document.getElementById('searchInput').addEventListener('input', filterInternships);
-    document.getElementById('industryFilter').addEventListener('change', filterInternships);
-    document.getElementById('marketFilter').addEventListener('change', filterInternships);
+    // 検索とフィルタリングのイベントリスナー（検索語の入力は少し待ってから問い合わせる）
+    document.getElementById('searchInput').addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(filterInternships, 300);
+    });
+    Object.values(facetFilters).forEach(id => {
+        document.getElementById(id).addEventListener('change', filterInternships);
+    });
     document.getElementById('resetFilters').addEventListener('click', resetFilters);
 });
 
 // データの取得
 async function fetchData() {
-    showLoading();
+    // 最初のページを先に表示し、フィルターの選択肢は並行して取得する
+    fetchFacets();
+    await fetchInternships();
+}
+
+// 現在の絞り込み条件
+function currentFilterParams() {
+    const params = new URLSearchParams({
+        q: document.getElementById('searchInput').value
+    });
+    Object.entries(facetFilters).forEach(([field, id]) => {
+        params.set(field, document.getElementById(id).value);
+    });
+    return params;
+}
+
+// 絞り込み項目ごとの件数を取得してフィルターの選択肢を更新
+async function fetchFacets() {
+    const sequence = ++facetSequence;
     
     try {
-        // 企業データの取得
-        const companiesResponse = await fetch('/api/companies');
-        allCompanies = await companiesResponse.json();
+        const response = await fetch(`/api/facets?${currentFilterParams()}`);
+        const result = await response.json();
         
-        // インターンシップデータの取得
-        const internshipsResponse = await fetch('/api/internships');
-        allInternships = await internshipsResponse.json();
+        if (sequence !== facetSequence) {
+            return;
+        }
         
-        // 業種フィルターの選択肢を生成
-        populateIndustryFilter();
+        Object.entries(facetFilters).forEach(([field, id]) => {
+            populateFacetFilter(document.getElementById(id), field, result.facets[field] || []);
+        });
+    } catch (error) {
+        console.error('絞り込み項目の取得に失敗しました:', error);
+    }
+}
+
+// 現在の条件で表示するページのインターンシップを取得
+async function fetchInternships() {
+    const sequence = ++requestSequence;
+    showLoading();
+    
+    const params = currentFilterParams();
+    params.set('offset', (currentPage - 1) * itemsPerPage);
+    params.set('limit', itemsPerPage);
+    
+    try {
+        const response = await fetch(`/api/internships?${params}`);
+        const page = await response.json();
         
-        // 初期表示
-        filteredInternships = [...allInternships];
+        // 後から送ったリクエストの結果が先に届いている場合は破棄する
+        if (sequence !== requestSequence) {
+            return;
+        }
+        
+        currentInternships = page.items;
+        totalInternships = page.total;
         renderInternships();
         
     } catch (error) {
@@ -53,71 +107,47 @@ async function fetchData() {
     hideLoading();
 }
 
-// 業種フィルターの選択肢を生成
-function populateIndustryFilter() {
-    const industryFilter = document.getElementById('industryFilter');
-    const industries = new Set();
+// フィルターの選択肢を件数付きで生成（選択中の値は件数が0になっても残す）
+function populateFacetFilter(select, field, values) {
+    const selected = select.value;
+    select.innerHTML = '';
     
-    // 企業データから業種を抽出
-    allCompanies.forEach(company => {
-        if (company.industry) {
-            industries.add(company.industry);
-        }
-    });
+    const allOption = document.createElement('option');
+    allOption.value = '';
+    allOption.textContent = `${select.dataset.label}（全て）`;
+    select.appendChild(allOption);
+    
+    if (selected && !values.some(item => item.value === selected)) {
+        values = values.concat([{ value: selected, count: 0 }]);
+    }
     
-    // 選択肢を追加
-    industries.forEach(industry => {
+    values.forEach(item => {
         const option = document.createElement('option');
-        option.value = industry;
-        option.textContent = industry;
-        industryFilter.appendChild(option);
+        option.value = item.value;
+        option.textContent = `${field === 'deadline_month' ? formatMonth(item.value) : item.value} (${item.count})`;
+        select.appendChild(option);
     });
+    select.value = selected;
 }
 
-// インターンシップのフィルタリング
+// インターンシップのフィルタリング（条件はサーバー側で適用する）
 function filterInternships() {
-    const searchTerm = document.getElementById('searchInput').value.toLowerCase();
-    const selectedIndustry = document.getElementById('industryFilter').value;
-    const selectedMarket = document.getElementById('marketFilter').value;
-    
-    // フィルタリング条件に基づいてインターンシップをフィルタリング
-    filteredInternships = allInternships.filter(internship => {
-        // 検索条件
-        const matchesSearch = 
-            internship.company_name.toLowerCase().includes(searchTerm) || 
-            internship.title.toLowerCase().includes(searchTerm);
-        
-        // 業種条件
-        let matchesIndustry = true;
-        if (selectedIndustry) {
-            const company = allCompanies.find(c => c.id === internship.company_id);
-            matchesIndustry = company && company.industry === selectedIndustry;
-        }
-        
-        // 市場区分条件
-        let matchesMarket = true;
-        if (selectedMarket) {
-            const company = allCompanies.find(c => c.id === internship.company_id);
-            matchesMarket = company && company.market === selectedMarket;
-        }
-        
-        return matchesSearch && matchesIndustry && matchesMarket;
-    });
-    
     // 現在のページをリセットして再表示
     currentPage = 1;
-    renderInternships();
+    fetchInternships();
+    fetchFacets();
 }
 
 // フィルターのリセット
 function resetFilters() {
     document.getElementById('searchInput').value = '';
-    document.getElementById('industryFilter').value = '';
-    document.getElementById('marketFilter').value = '';
+    Object.values(facetFilters).forEach(id => {
+        document.getElementById(id).value = '';
+    });
     
-    filteredInternships = [...allInternships];
     currentPage = 1;
-    renderInternships();
+    fetchInternships();
+    fetchFacets();
 }
 
 // インターンシップの表示
@@ -125,11 +155,6 @@ function renderInternships() {
     const tableBody = document.getElementById('internshipsTableBody');
     tableBody.innerHTML = '';
     
-    // ページネーションの計算
-    const startIndex = (currentPage - 1) * itemsPerPage;
-    const endIndex = Math.min(startIndex + itemsPerPage, filteredInternships.length);
-    const currentInternships = filteredInternships.slice(startIndex, endIndex);
-    
     if (currentInternships.length === 0) {
         tableBody.innerHTML = `
             <tr>
@@ -173,7 +198,7 @@ function renderInternships() {
 // ページネーションの表示
 function renderPagination() {
     const paginationElement = document.getElementById('pagination');
-    const totalPages = Math.ceil(filteredInternships.length / itemsPerPage);
+    const totalPages = Math.ceil(totalInternships / itemsPerPage);
     
     if (totalPages <= 1) {
         paginationElement.innerHTML = '';
@@ -234,7 +259,7 @@ function renderPagination() {
             const page = parseInt(this.dataset.page);
             if (page && page !== currentPage && page > 0 && page <= totalPages) {
                 currentPage = page;
-                renderInternships();
+                fetchInternships();
                 // ページトップにスクロール
                 window.scrollTo({
                     top: document.getElementById('internshipsTable').offsetTop - 100,
@@ -255,6 +280,14 @@ function formatDate(dateString) {
     return `${date.getFullYear()}年${date.getMonth() + 1}月${date.getDate()}日`;
 }
 
+// 月のフォーマット（YYYY-MM）
+function formatMonth(monthString) {
+    const [year, month] = monthString.split('-');
+    if (!month) return monthString;
+    
+    return `${year}年${parseInt(month)}月`;
+}
+
 // ローディング表示
 function showLoading() {
     const tableBody = document.getElementById('internshipsTableBody');
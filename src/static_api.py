@@ -0,0 +1,202 @@
+"""
+インターン情報自動取得システム - 静的APIスナップショット
+
+一覧APIのレスポンスはデータが更新されるまで変わらないため、結合のたびに（main.py の結合・常駐モードの
+各サイクル、または main.py static-api で）主なURL（絞り込みなし・よく使う絞り込み条件ごとの先頭ページ、
+件数の集計、企業一覧）のレスポンスをWebアプリのビュー関数であらかじめ作成し、圧縮済みのファイルとして書き出す。ファイル名は本体の内容のハッシュで、
+内容が変わらないレスポンスは前回のファイルをそのまま使う。
+
+Webアプリは manifest.json に含まれるURLへのリクエストに対してビュー関数を呼ばずにファイルを返す。
+manifest.json にはスナップショットのバージョンを記録し、Webアプリが同じバージョンのデータセットを
+読み込んでいる間だけ使う。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlencode
+
+from config import SNAPSHOT_FILE, STATIC_API_DIR, STATIC_API_PAGE_SIZE, STATIC_API_PAGES, STATIC_API_FACET_VALUES
+from dataset import Dataset, FILTER_FIELDS
+from response_cache import compress, supported_encodings, MIN_COMPRESS_SIZE
+from utils import logger
+
+MANIFEST_NAME = "manifest.json"
+FILES_DIR_NAME = "files"
+
+# 空の値を指定しない場合と同じに扱うパラメータ（トップページは未選択の絞り込み条件も空の値で送る）
+OPTIONAL_PARAMS = frozenset(FILTER_FIELDS) | {"q"}
+
+ENCODING_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+def static_key(path, args):
+    """リクエストのパスとパラメータ（MultiDict または (名前, 値) のリスト）から静的APIのキーを作る"""
+    items = args.items(multi=True) if hasattr(args, "items") else args
+    params = sorted((name, value) for name, value in items if value or name not in OPTIONAL_PARAMS)
+    return f"{path}?{urlencode(params)}" if params else path
+
+def static_routes(dataset):
+    """書き出すURLの (パス, パラメータ) を返す"""
+    yield "/api/companies", {}
+    for source in dataset.summaries_by_source:
+        if source:
+            yield "/api/companies", {"source": source}
+    
+    # 絞り込みなしと、項目ごとに件数の多い値での絞り込み
+    filters = [{}]
+    for field, values in dataset.facets({})["facets"].items():
+        top = sorted(values, key=lambda item: -item["count"])[:STATIC_API_FACET_VALUES]
+        filters.extend({field: item["value"]} for item in top if item["value"])
+    
+    # ページ指定のない一覧（以前の形式の全件の配列）は絞り込みなしのものだけ書き出す
+    yield "/api/internships", {}
+    for params in filters:
+        yield "/api/facets", params
+        total = len(dataset.query_internships(params))
+        pages = max(1, min(STATIC_API_PAGES, -(-total // STATIC_API_PAGE_SIZE)))
+        for page in range(pages):
+            yield "/api/internships", dict(params, offset=page * STATIC_API_PAGE_SIZE, limit=STATIC_API_PAGE_SIZE)
+
+def render_routes(dataset, routes):
+    """Webアプリのビュー関数でレスポンスを作成し、(キー, 本体, MIMEタイプ) を返す（200以外は除く）"""
+    from flask import g, request
+    from app import app
+    
+    for path, params in routes:
+        params = [(name, str(value)) for name, value in params.items()]
+        with app.test_request_context(path, query_string=urlencode(params)):
+            g.dataset = dataset
+            view = app.view_functions[request.url_rule.endpoint]
+            # キャッシュのデコレーターを通さずにレスポンスの本体だけを作る
+            response = app.make_response(getattr(view, "__wrapped__", view)(**request.view_args))
+            if response.status_code == 200:
+                yield static_key(path, params), response.get_data(), response.mimetype
+
+def _write_atomic(filepath, body):
+    temp_file = f"{filepath}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(body)
+    os.replace(temp_file, filepath)
+
+def write_static_file(files_dir, body):
+    """本体と圧縮済みの本体をハッシュのファイル名で書き出し、(ハッシュ, 圧縮形式のリスト) を返す"""
+    digest = hashlib.sha256(body).hexdigest()[:20]
+    encodings = supported_encodings() if len(body) >= MIN_COMPRESS_SIZE else []
+    base = os.path.join(files_dir, digest)
+    if not os.path.exists(base):
+        for encoding in encodings:
+            _write_atomic(base + ENCODING_SUFFIXES[encoding], compress(body, encoding))
+        # 本体は最後に書き出す（本体があれば圧縮済みのファイルもそろっている）
+        _write_atomic(base, body)
+    return digest, encodings
+
+def manifest_version(output_dir):
+    """書き出し済みの静的APIスナップショットのバージョン（ない場合はNone）"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+def build_static_api(snapshot_file=SNAPSHOT_FILE, output_dir=STATIC_API_DIR):
+    """スナップショットから静的APIスナップショットを書き出し、書き出したURLの数を返す
+    
+    スナップショットのバージョンが前回の書き出し時と同じ場合は何もしない。
+    """
+    from snapshot import SnapshotReader
+    
+    start = time.perf_counter()
+    reader = SnapshotReader(snapshot_file)
+    if manifest_version(output_dir) == reader.version:
+        reader.close()
+        logger.info(f"Static API responses in {output_dir} are up to date")
+        return 0
+    try:
+        dataset = Dataset(None, reader.meta, reader.version, reader=reader)
+        files_dir = os.path.join(output_dir, FILES_DIR_NAME)
+        os.makedirs(files_dir, exist_ok=True)
+        
+        routes = {}
+        for key, body, mimetype in render_routes(dataset, static_routes(dataset)):
+            digest, encodings = write_static_file(files_dir, body)
+            routes[key] = {"hash": digest, "mimetype": mimetype, "encodings": encodings}
+        
+        # Webアプリが書き込み途中の内容を読まないよう、一時ファイル経由で置き換える
+        manifest = {"version": reader.version, "routes": routes}
+        _write_atomic(os.path.join(output_dir, MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+    finally:
+        reader.close()
+    
+    # 今回使わないファイルを削除する（配信中のファイルは開いたまま読み続けられる）
+    used = {entry["hash"] for entry in routes.values()}
+    for name in os.listdir(files_dir):
+        if name.split(".", 1)[0] not in used:
+            os.remove(os.path.join(files_dir, name))
+    
+    logger.info(f"Wrote {len(routes)} static API responses ({len(used)} files) to {output_dir} "
+                f"in {time.perf_counter() - start:.2f}s")
+    return len(routes)
+
+class StaticEntry:
+    """静的APIの1つのURLに対応するファイル"""
+    
+    def __init__(self, files_dir, digest, mimetype, encodings):
+        self.files_dir = files_dir
+        self.hash = digest
+        self.mimetype = mimetype
+        self.encodings = encodings
+    
+    def path(self, encoding=None):
+        return os.path.join(self.files_dir, self.hash + ENCODING_SUFFIXES.get(encoding, ""))
+
+class StaticApi:
+    """manifest.json を読み込み、リクエストに対応する静的APIのファイルを返すクラス
+    
+    manifest.json の更新は check_interval 秒に1回の stat で確認する。
+    """
+    
+    def __init__(self, output_dir, check_interval=2.0):
+        self.output_dir = output_dir
+        self.files_dir = os.path.join(output_dir, FILES_DIR_NAME)
+        self.check_interval = check_interval
+        self.version = None
+        self._routes = {}
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+    
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            manifest_file = os.path.join(self.output_dir, MANIFEST_NAME)
+            try:
+                mtime = os.stat(manifest_file).st_mtime_ns
+            except OSError:
+                self.version, self._routes, self._mtime = None, {}, None
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to load {manifest_file}: {e}")
+                return
+            self._routes = {key: StaticEntry(self.files_dir, entry["hash"], entry["mimetype"], entry["encodings"])
+                            for key, entry in manifest.get("routes", {}).items()}
+            self.version = manifest.get("version")
+            self._mtime = mtime
+    
+    def lookup(self, path, args, version):
+        """データセットのバージョンが version の場合に、リクエストに対応するファイル（なければNone）"""
+        self._refresh()
+        if version is None or version != self.version:
+            return None
+        return self._routes.get(static_key(path, args))
@@ -0,0 +1,226 @@
+"""
+インターン情報自動取得システム - ストレージモジュール（SQLite）
+
+STORAGE_BACKEND = "sqlite" の場合に、収集した企業・インターンシップ情報をJSONLファイルと同じ内容で
+SQLiteにも保存する任意のミラー。正本はJSONLファイル（と結合データ）のままで、Webアプリもそちらを読み込む。
+SQLiteは結合データの差分更新で変更のあった企業を主キーで読み出す場合と、ページのフィンガープリント
+（クロール状態）の保存に使う。
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import STORAGE_BACKEND, DATABASE_FILE, STORAGE_BATCH_SIZE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    source TEXT,
+    market TEXT,
+    industry TEXT,
+    data TEXT NOT NULL,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS internships (
+    id TEXT PRIMARY KEY,
+    company_id TEXT NOT NULL,
+    title TEXT,
+    source TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    data TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_internships_company ON internships(company_id);
+
+-- 以前のバージョンで作成していた未使用のテーブル・索引
+DROP TABLE IF EXISTS source_ids;
+DROP INDEX IF EXISTS idx_companies_source;
+DROP INDEX IF EXISTS idx_companies_market;
+DROP INDEX IF EXISTS idx_companies_industry;
+DROP INDEX IF EXISTS idx_internships_source;
+DROP INDEX IF EXISTS idx_internships_start_date;
+DROP INDEX IF EXISTS idx_internships_end_date;
+
+CREATE TABLE IF NOT EXISTS crawl_state (
+    url TEXT PRIMARY KEY,
+    company_id TEXT,
+    sha256 TEXT,
+    section TEXT,
+    simhash TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_crawl_state_company ON crawl_state(company_id);
+"""
+
+class SQLiteStorage:
+    """SQLiteによるストレージ（スレッドごとに接続を持つ）"""
+    
+    def __init__(self, filepath=DATABASE_FILE):
+        directory = os.path.dirname(filepath)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        self.filepath = filepath
+        self._local = threading.local()
+        self.conn.executescript(SCHEMA)
+        
+        # 以前のバージョンで作成したデータベースに列を追加する
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(crawl_state)")}
+        if "section" not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE crawl_state ADD COLUMN section TEXT")
+    
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.filepath, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    # 書き込み
+    def upsert_companies(self, companies):
+        """企業情報をまとめて登録・更新する（1トランザクション）"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        company_rows = [(
+            company["id"], company.get("name"), company.get("source"), company.get("market"),
+            company.get("industry"), json.dumps(company, ensure_ascii=False), now
+        ) for company in companies]
+        
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO companies (id, name, source, market, industry, data, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    name=excluded.name, source=excluded.source, market=excluded.market,
+                    industry=excluded.industry, data=excluded.data, updated_at=excluded.updated_at
+            """, company_rows)
+    
+    def replace_company_internships(self, company_id, internships):
+        """企業のインターンシップ情報を更新する（同じIDまたは同じタイトルの既存情報を置き換える）"""
+        self.replace_internships_batch([(company_id, internships)])
+    
+    def replace_internships_batch(self, batch):
+        """複数企業分のインターンシップ情報を1トランザクションで更新する"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        with self.conn:
+            for company_id, internships in batch:
+                for internship in internships:
+                    self.conn.execute(
+                        "DELETE FROM internships WHERE company_id = ? AND title = ? AND id != ?",
+                        (company_id, internship.get("title"), internship["id"]))
+                self.conn.executemany("""
+                    INSERT INTO internships (id, company_id, title, source, start_date, end_date, data, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        company_id=excluded.company_id, title=excluded.title, source=excluded.source,
+                        start_date=excluded.start_date, end_date=excluded.end_date,
+                        data=excluded.data, updated_at=excluded.updated_at
+                """, [(
+                    internship["id"], company_id, internship.get("title"), internship.get("source"),
+                    internship.get("start_date"), internship.get("end_date"),
+                    json.dumps(internship, ensure_ascii=False), now
+                ) for internship in internships])
+    
+    # 読み込み
+    def iter_companies(self):
+        for (data,) in self.conn.execute("SELECT data FROM companies ORDER BY rowid"):
+            yield json.loads(data)
+    
+    def iter_internships(self, company_id=None):
+        if company_id is None:
+            rows = self.conn.execute("SELECT data FROM internships ORDER BY rowid")
+        else:
+            rows = self.conn.execute(
+                "SELECT data FROM internships WHERE company_id = ? ORDER BY rowid", (company_id,))
+        for (data,) in rows:
+            yield json.loads(data)
+    
+    def get_company(self, company_id):
+        """企業情報をインターンシップ情報付きで返す（存在しない場合はNone）"""
+        row = self.conn.execute("SELECT data FROM companies WHERE id = ?", (company_id,)).fetchone()
+        if not row:
+            return None
+        
+        company = json.loads(row[0])
+        company["internships"] = list(self.iter_internships(company_id))
+        return company
+    
+    # クロール状態（ページフィンガープリント）
+    def load_crawl_state(self):
+        pages = {}
+        companies = {}
+        for url, company_id, sha256, section, simhash in self.conn.execute(
+                "SELECT url, company_id, sha256, section, simhash FROM crawl_state ORDER BY rowid"):
+            pages[url] = {"sha256": sha256, "section": section, "simhash": int(simhash, 16)}
+            if company_id:
+                companies.setdefault(company_id, []).append(url)
+        return pages, companies
+    
+    def save_crawl_state(self, pages, companies):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        company_by_url = {url: company_id for company_id, urls in companies.items() for url in urls}
+        
+        with self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO crawl_state (url, company_id, sha256, section, simhash, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(url, company_by_url.get(url), page["sha256"], page.get("section"), format(page["simhash"], 'x'), now)
+                  for url, page in pages.items()])
+
+class BatchWriter:
+    """収集中のレコードをまとめてストレージに書き込むバッファ"""
+    
+    def __init__(self, storage, batch_size=STORAGE_BATCH_SIZE):
+        self.storage = storage
+        self.batch_size = batch_size
+        self._companies = []
+        self._internships = []   # (企業ID, インターンシップ情報のリスト)
+        self._internship_count = 0
+    
+    def add_company(self, company):
+        self._companies.append(company)
+        if len(self._companies) >= self.batch_size:
+            self.flush()
+    
+    def add_company_internships(self, company_id, internships):
+        self._internships.append((company_id, internships))
+        self._internship_count += len(internships)
+        if self._internship_count >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        if self._companies:
+            self.storage.upsert_companies(self._companies)
+            self._companies = []
+        if self._internships:
+            self.storage.replace_internships_batch(self._internships)
+            self._internships = []
+            self._internship_count = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+def get_storage():
+    """設定に応じたストレージを返す（JSONLファイルのみを使う設定の場合はNone）"""
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage(DATABASE_FILE)
+    return None
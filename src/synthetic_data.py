@@ -0,0 +1,155 @@
+"""
+インターン情報自動取得システム - 負荷試験・ベンチマーク用の合成データ生成
+"""
+
+import os
+import random
+import argparse
+from datetime import date, timedelta
+
+from config import JOB_SITES
+from utils import save_jsonl, logger
+
+NAME_PREFIXES = ["日本", "東京", "大和", "富士", "中央", "第一", "明治", "太平洋", "北陸", "関西", "九州", "東亜",
+                 "新光", "三和", "昭和", "アジア", "グローバル", "サクラ", "ミライ", "ネクスト", "アーク", "オリオン"]
+NAME_CORES = ["電機", "製作所", "化学", "商事", "情報システム", "ソフトウェア", "建設", "物産", "銀行", "証券",
+              "食品", "製薬", "不動産", "運輸", "電力", "通信", "テクノロジーズ", "ホールディングス", "精機", "工業"]
+
+# 市場区分は実際の上場企業数に近い比率で割り当てる
+MARKETS = [("プライム", 45), ("スタンダード", 40), ("グロース", 15)]
+INDUSTRIES = ["情報・通信業", "電気機器", "サービス業", "小売業", "銀行業", "建設業", "化学", "機械",
+              "卸売業", "医薬品", "食料品", "不動産業", "陸運業", "証券、商品先物取引業", "電気・ガス業"]
+SOURCES = [site["name"] for site in JOB_SITES.values()] + ["企業採用サイト"]
+
+TITLE_SEASONS = ["サマー", "オータム", "ウィンター", "スプリング", "1Day", "短期", "長期"]
+TITLE_THEMES = ["エンジニア職", "営業職", "企画職", "データサイエンス", "コンサルティング", "総合職", "研究開発",
+                "デザイナー", "マーケティング", "金融専門職"]
+TARGETS = ["大学3年生、修士1年生", "大学2年生以上", "全学年", "2027年卒業予定の方", "理系学生", "博士課程の方"]
+
+# 合成データの更新日（開始日はこの年の6月〜翌年5月に分布させる）
+LAST_UPDATED = date(2025, 5, 17)
+
+# 期間の表記と日数
+PERIODS = [("1日", 1), ("2日間", 2), ("3日間", 3), ("5日間", 5), ("2週間", 14), ("1ヶ月", 30), ("3ヶ月", 90)]
+
+# 開始月の重み（夏と冬に集中する）
+START_MONTH_WEIGHTS = {6: 6, 7: 14, 8: 22, 9: 12, 10: 5, 11: 6, 12: 11, 1: 10, 2: 9, 3: 3, 4: 1, 5: 1}
+
+def company_name(rng, number):
+    core = f"{rng.choice(NAME_PREFIXES)}{rng.choice(NAME_CORES)}"
+    # 同名の企業ができないよう番号を付ける
+    return f"株式会社{core}{number}" if rng.random() < 0.5 else f"{core}{number}株式会社"
+
+def start_date(rng, base_year):
+    month = rng.choices(list(START_MONTH_WEIGHTS), weights=list(START_MONTH_WEIGHTS.values()))[0]
+    year = base_year if month >= 6 else base_year + 1
+    return date(year, month, 1) + timedelta(days=rng.randrange(28))
+
+def generate_companies(num_companies, num_internships, seed=0, base_year=LAST_UPDATED.year):
+    """企業情報（インターンシップ情報付き）を生成する
+    
+    インターンシップの件数は企業ごとに偏りを持たせ、合計が num_internships になるよう割り当てる。
+    """
+    rng = random.Random(seed)
+    markets, market_weights = zip(*MARKETS)
+    
+    # 企業ごとの件数（一部の大企業に多く集まるよう、パレート分布の重みで配分する）
+    weights = [rng.paretovariate(1.5) for _ in range(num_companies)]
+    scale = num_internships / sum(weights) if weights else 0
+    counts = [int(weight * scale) for weight in weights]
+    for i in rng.sample(range(num_companies), min(num_companies, num_internships - sum(counts))):
+        counts[i] += 1
+    
+    companies = []
+    for i, count in enumerate(counts):
+        company_id = f"synthetic_{i}"
+        name = company_name(rng, i)
+        internships = []
+        for j in range(count):
+            period, days = rng.choice(PERIODS)
+            start = start_date(rng, base_year)
+            internship = {
+                "id": f"{company_id}_intern_{j}",
+                "company_id": company_id,
+                "company_name": name,
+                "title": f"{rng.choice(TITLE_SEASONS)}インターンシップ（{rng.choice(TITLE_THEMES)}）",
+                "period": period,
+                "start_date": start.isoformat(),
+                "end_date": (start + timedelta(days=days - 1)).isoformat(),
+                "target": rng.choice(TARGETS),
+                "application_url": f"https://example.com/{company_id}/intern/{j}",
+                "source": rng.choice(SOURCES),
+                "last_updated": LAST_UPDATED.isoformat(),
+                "verification": {
+                    "score": round(rng.uniform(0.3, 1.0), 2),
+                    "sources": rng.sample(SOURCES, rng.randint(1, 2)),
+                    "verified": rng.random() < 0.7
+                }
+            }
+            # 日付が未定の募集も含める
+            if rng.random() < 0.05:
+                internship["start_date"] = ""
+            if rng.random() < 0.05:
+                internship["end_date"] = ""
+            internships.append(internship)
+        
+        companies.append({
+            "id": company_id,
+            "name": name,
+            "stock_code": str(1300 + i),
+            "market": rng.choices(markets, weights=market_weights)[0],
+            "industry": rng.choice(INDUSTRIES),
+            "source": rng.choice(SOURCES),
+            "official_site": f"https://example.com/{company_id}",
+            "career_site": f"https://example.com/{company_id}/recruit",
+            "internships": internships
+        })
+    return companies
+
+def generate_combined_data(num_companies, num_internships, seed=0):
+    """結合データ（combined_data.json）と同じ構造の辞書を生成する"""
+    companies = generate_companies(num_companies, num_internships, seed)
+    meta = {
+        "last_updated": LAST_UPDATED.isoformat(),
+        "total_companies": len(companies),
+        "total_internships": sum(len(company["internships"]) for company in companies)
+    }
+    return {"companies": companies, "meta": meta}
+
+def write_dataset(output_dir, num_companies, num_internships, seed=0, snapshot=True, static_api=False):
+    """合成データを通常の収集結果と同じファイル構成で書き出し、結合データを作成する
+    
+    static_api が True の場合は静的APIスナップショットも書き出す（スナップショットを書き出す場合のみ）。
+    """
+    from internship_collector import combine_data
+    
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    companies = generate_companies(num_companies, num_internships, seed)
+    companies_file = os.path.join(output_dir, "companies.jsonl")
+    internships_file = os.path.join(output_dir, "internships.jsonl")
+    save_jsonl(({key: value for key, value in company.items() if key != "internships"} for company in companies),
+               companies_file)
+    save_jsonl((internship for company in companies for internship in company["internships"]), internships_file)
+    
+    combine_data(companies_file, internships_file, os.path.join(output_dir, "combined_data.json"),
+                 snapshot_file=os.path.join(output_dir, "combined_data.snap") if snapshot else None)
+    if snapshot and static_api:
+        from static_api import build_static_api
+        build_static_api(os.path.join(output_dir, "combined_data.snap"), os.path.join(output_dir, "static_api"))
+    logger.info(f"Synthetic dataset with {num_companies} companies and {num_internships} internships "
+                f"written to {output_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset for load tests and benchmarks")
+    parser.add_argument("--companies", type=int, default=1000, help="Number of companies")
+    parser.add_argument("--internships", type=int, default=10000, help="Total number of internships")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", default="../data/synthetic", help="Output directory")
+    parser.add_argument("--no-snapshot", action="store_true", help="Do not write the snapshot file")
+    parser.add_argument("--static-api", action="store_true", help="Also write the static API responses")
+    args = parser.parse_args()
+    
+    write_dataset(args.output, args.companies, args.internships, args.seed, snapshot=not args.no_snapshot,
+                  static_api=args.static_api)
@@ -5,10 +5,17 @@
 import os
 import json
 import logging
+import tempfile
 from datetime import datetime
 
+# テストのデータ・ログは一時ディレクトリに書き出し、リポジトリの data・logs は変更しない
+# （config を読み込む前に設定する）
+_test_dir = tempfile.TemporaryDirectory()
+os.environ["INTERN_SCRAPER_DATA_DIR"] = os.path.join(_test_dir.name, "data")
+os.environ["INTERN_SCRAPER_LOG_FILE"] = os.path.join(_test_dir.name, "logs", "scraper.log")
+
 from config import COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE, DATA_DIR
-from utils import setup_logger, load_json, save_json
+from utils import setup_logger, load_json, save_json, save_jsonl, iter_records, log_run_summary
 
 # ロガーの設定
 logger = setup_logger()
@@ -129,8 +136,8 @@ def create_test_data():
     ]
     
     # データを保存
-    save_json(test_companies, COMPANIES_FILE)
-    save_json(test_internships, INTERNSHIPS_FILE)
+    save_jsonl(test_companies, COMPANIES_FILE)
+    save_jsonl(test_internships, INTERNSHIPS_FILE)
     
     logger.info(f"Created test data: {len(test_companies)} companies and {len(test_internships)} internships")
     
@@ -170,12 +177,1022 @@ def test_data_combination():
         logger.error("Data combination test failed")
         return False
 
+def test_incremental_combination():
+    """変更セットを使った結合データの差分更新をテストする"""
+    logger.info("Testing incremental data combination...")
+    
+    import shutil
+    import tempfile
+    from change_set import ChangeSet
+    from internship_collector import combine_data
+    from snapshot import SnapshotReader
+    
+    # 収集済みのデータを書き換えないよう、一時ディレクトリにコピーして結合する
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        companies_file = shutil.copy(COMPANIES_FILE, os.path.join(tmp_dir, "companies.jsonl"))
+        internships_file = shutil.copy(INTERNSHIPS_FILE, os.path.join(tmp_dir, "internships.jsonl"))
+        combined_file = os.path.join(tmp_dir, "combined_data.json")
+        snapshot_file = os.path.join(tmp_dir, "combined_data.snap")
+        
+        if not combine_data(companies_file, internships_file, combined_file, snapshot_file=snapshot_file):
+            logger.error("Initial data combination failed")
+            return False
+        with SnapshotReader(snapshot_file) as reader:
+            previous_blobs = {company_id: reader.blob_at(i) for i, company_id in enumerate(reader.company_ids)}
+        
+        # インターンシップを1件更新し、1件削除する
+        internships = list(iter_records(internships_file))
+        changes = ChangeSet()
+        internships[0]["title"] = internships[0]["title"] + "（更新）"
+        changes.add_internship("updated", internships[0]["id"], internships[0]["company_id"])
+        removed = internships.pop()
+        changes.add_internship("removed", removed["id"], removed["company_id"])
+        save_jsonl(internships, internships_file)
+        
+        if not combine_data(companies_file, internships_file, combined_file, changes=changes,
+                            snapshot_file=snapshot_file):
+            logger.error("Incremental data combination failed")
+            return False
+        incremental = load_json(combined_file)
+        
+        # スナップショットは変更のあった企業だけを書き直し、他の企業の本体はそのままコピーする
+        with SnapshotReader(snapshot_file) as reader:
+            snapshot = reader.to_dict()
+            copied = [company_id for i, company_id in enumerate(reader.company_ids)
+                      if reader.blob_at(i) == previous_blobs.get(company_id)]
+        if snapshot != incremental or set(copied) != set(previous_blobs) - changes.affected_company_ids:
+            logger.error("Snapshot was not updated incrementally")
+            return False
+        
+        # 全件の結合結果と一致することを確認する
+        combine_data(companies_file, internships_file, combined_file)
+        full = load_json(combined_file)
+    
+    if incremental != full:
+        logger.error("Incremental combination differs from full combination")
+        return False
+    
+    logger.info("Incremental data combination test passed")
+    return True
+
+def test_snapshot():
+    """スナップショット形式の書き込みと読み込みをテストする"""
+    logger.info("Testing snapshot format...")
+    
+    from internship_collector import combine_data
+    from snapshot import SnapshotReader
+    
+    snapshot_file = f"{DATA_DIR}/test_combined_data.snap"
+    try:
+        if not combine_data(COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE, snapshot_file=snapshot_file):
+            logger.error("Data combination with snapshot failed")
+            return False
+        
+        combined_data = load_json(COMBINED_DATA_FILE)
+        with SnapshotReader(snapshot_file) as reader:
+            if reader.to_dict() != combined_data:
+                logger.error("Snapshot content differs from combined data")
+                return False
+            
+            company = combined_data["companies"][-1]
+            if reader.get_company(company["id"]) != company or reader.get_company("unknown") is not None:
+                logger.error("Snapshot company lookup failed")
+                return False
+        
+        # スナップショットから読み込んだデータセットは、JSONから読み込んだものと同じ結果を返す
+        from dataset import Dataset
+        in_memory = Dataset(combined_data["companies"], combined_data["meta"])
+        mapped = Dataset(None, combined_data["meta"], reader=SnapshotReader(snapshot_file))
+        internship_id = combined_data["companies"][0]["internships"][0]["id"]
+        filters = {"market": combined_data["companies"][0]["market"], "date_from": "2025-01-01"}
+        if list(mapped.internship_rows) != list(in_memory.internship_rows) or \
+                mapped.query_internships(filters, "-start_date") != in_memory.query_internships(filters, "-start_date") or \
+                mapped.get_internship(internship_id) != in_memory.get_internship(internship_id) or \
+                mapped.companies_by_id.get(company["id"]) != company or \
+                mapped.facets(filters) != in_memory.facets(filters) or \
+                mapped.search("インターン") != in_memory.search("インターン"):
+            logger.error("Dataset backed by the snapshot differs from the in-memory dataset")
+            return False
+        mapped.reader.close()
+        
+        # 文字列テーブルで共有するフィールドの整数・None などの値は、文字列テーブルの参照と区別して元に戻る
+        from snapshot import write_snapshot
+        companies = [{"id": "c1", "name": "テスト株式会社", "market": "プライム", "industry": 3, "source": None,
+                      "internships": [{"id": "c1_0", "company_name": 0, "source": ["テスト"], "title": "1Day"}]},
+                     {"id": "c2", "name": "テスト2", "market": "プライム", "industry": True, "internships": []}]
+        write_snapshot(iter(companies), {}, snapshot_file)
+        with SnapshotReader(snapshot_file) as reader:
+            decoded = list(reader.iter_companies())
+        if decoded != companies or type(decoded[1]["industry"]) is not bool:
+            logger.error(f"Snapshot values did not round-trip: {decoded}")
+            return False
+        
+        logger.info("Snapshot test passed")
+        return True
+    finally:
+        if os.path.exists(snapshot_file):
+            os.remove(snapshot_file)
+
+def test_dataset_reload():
+    """Webアプリ用データセットの自動再読み込みをテストする"""
+    logger.info("Testing dataset reload...")
+    
+    import time
+    from dataset import DatasetManager
+    from internship_collector import combine_data
+    
+    combine_data(COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE)
+    manager = DatasetManager(COMBINED_DATA_FILE, check_interval=0)
+    dataset = manager.get()
+    internship_count = len(dataset.internship_rows)
+    
+    # インターンシップを1件減らして結合データを更新する
+    internships = list(iter_records(INTERNSHIPS_FILE))
+    save_jsonl(internships[1:], INTERNSHIPS_FILE)
+    combine_data(COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE)
+    save_jsonl(internships, INTERNSHIPS_FILE)
+    
+    # 再読み込み完了までは読み込み済みのデータセットが返される
+    for _ in range(50):
+        reloaded = manager.get()
+        if reloaded is not dataset:
+            break
+        time.sleep(0.1)
+    
+    if reloaded is dataset or len(reloaded.internship_rows) != internship_count - 1:
+        logger.error("Dataset was not reloaded after the data file changed")
+        return False
+    if len(dataset.internship_rows) != internship_count:
+        logger.error("Previous dataset was modified during reload")
+        return False
+    
+    # 更新の通知（refresh）を受けた場合は確認間隔を待たずに読み込む
+    notified = DatasetManager(COMBINED_DATA_FILE, check_interval=3600)
+    before = notified.get()
+    combine_data(COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE)
+    if notified.get() is not before or not notified.refresh():
+        logger.error("Dataset refresh was not started on notification")
+        return False
+    for _ in range(50):
+        if notified.get() is not before:
+            break
+        time.sleep(0.1)
+    if len(notified.get().internship_rows) != internship_count or notified.refresh():
+        logger.error("Dataset was not reloaded on notification")
+        return False
+    
+    logger.info("Dataset reload test passed")
+    return True
+
+def test_internship_query():
+    """インターンシップ一覧の絞り込み・並び替えをテストする"""
+    logger.info("Testing internship query...")
+    
+    from dataset import Dataset
+    
+    combined_data = load_json(COMBINED_DATA_FILE)
+    dataset = Dataset(combined_data["companies"], combined_data["meta"])
+    rows = dataset.internship_rows
+    
+    # 絞り込み結果が全件を走査した結果と一致することを確認する
+    expected = [p for p, row in enumerate(rows)
+                if combined_data["companies"][0]["market"] == dataset.columns["market"][p] and "インターン" in row["title"]]
+    actual = dataset.query_internships({"market": combined_data["companies"][0]["market"], "q": "インターン"})
+    if list(actual) != expected:
+        logger.error(f"Unexpected filter result: {list(actual)} != {expected}")
+        return False
+    
+    # 並び替え（値のない行は末尾）
+    ordered = [rows[p]["start_date"] for p in dataset.query_internships({}, sort="-start_date")]
+    present = [value for value in ordered if value]
+    if present != sorted(present, reverse=True) or ordered[:len(present)] != present:
+        logger.error(f"Unexpected sort result: {ordered}")
+        return False
+    
+    # IDによる参照
+    company = combined_data["companies"][0]
+    internship = company["internships"][0]
+    found = dataset.get_internship(internship["id"])
+    if found is None or found["title"] != internship["title"] or found["company_id"] != company["id"] or \
+            dataset.get_internship("unknown") is not None or \
+            [rows[p]["id"] for p in dataset.positions_by_company[company["id"]]] != [i["id"] for i in company["internships"]]:
+        logger.error("Unexpected lookup result by ID")
+        return False
+    
+    logger.info("Internship query test passed")
+    return True
+
+def test_date_index():
+    """開始日・締切日の索引を全件走査の結果と比較してテストする"""
+    logger.info("Testing date index...")
+    
+    import random
+    from datetime import date, timedelta
+    from date_index import DateIndex
+    
+    rng = random.Random(0)
+    base = date(2025, 6, 1)
+    rows = []
+    for _ in range(500):
+        start = base + timedelta(days=rng.randint(0, 180))
+        end = start + timedelta(days=rng.randint(0, 60))
+        row = {"start_date": start.isoformat(), "end_date": end.isoformat()}
+        # 開始日・締切日のない行や解釈できない日付も含める
+        if rng.random() < 0.1:
+            row["start_date"] = ""
+        if rng.random() < 0.1:
+            row["end_date"] = "未定"
+        rows.append(row)
+    index = DateIndex([row["start_date"] for row in rows], [row["end_date"] for row in rows])
+    
+    def valid(value):
+        return value if value and value[0].isdigit() else None
+    
+    for _ in range(50):
+        date_from = (base + timedelta(days=rng.randint(-10, 250))).isoformat()
+        date_to = (base + timedelta(days=rng.randint(-10, 250))).isoformat()
+        date_from, date_to = min(date_from, date_to), max(date_from, date_to)
+        
+        expected = []
+        expected_deadlines = []
+        for position, row in enumerate(rows):
+            start = valid(row["start_date"]) or valid(row["end_date"])
+            end = valid(row["end_date"]) or start
+            if start and start <= date_to and end >= date_from:
+                expected.append(position)
+            if valid(row["end_date"]) and date_from <= row["end_date"] <= date_to:
+                expected_deadlines.append(position)
+        
+        if sorted(index.overlapping(date_from, date_to)) != expected:
+            logger.error(f"Unexpected overlap result for {date_from}〜{date_to}")
+            return False
+        deadlines = index.ending_between(date_from, date_to)
+        if sorted(deadlines) != expected_deadlines or \
+                [rows[p]["end_date"] for p in deadlines] != sorted(rows[p]["end_date"] for p in deadlines):
+            logger.error(f"Unexpected deadline result for {date_from}〜{date_to}")
+            return False
+    
+    logger.info("Date index test passed")
+    return True
+
+def test_facets():
+    """絞り込み項目ごとの件数の集計をテストする"""
+    logger.info("Testing facets...")
+    
+    from dataset import Dataset, FACET_FIELDS
+    
+    combined_data = load_json(COMBINED_DATA_FILE)
+    dataset = Dataset(combined_data["companies"], combined_data["meta"])
+    
+    # 各項目の件数は、その項目以外の条件で絞り込んだ結果を数えたものと一致する
+    market = dataset.columns["market"][0]
+    filters = {"market": market}
+    result = dataset.facets(filters)
+    for field in FACET_FIELDS:
+        positions = dataset.query_internships({} if field == "market" else filters)
+        expected = {}
+        for position in positions:
+            value = dataset.columns[field][position]
+            if value:
+                expected[value] = expected.get(value, 0) + 1
+        actual = {item["value"]: item["count"] for item in result["facets"][field]}
+        if actual != expected:
+            logger.error(f"Unexpected facet counts for {field}: {actual} != {expected}")
+            return False
+    if result["total"] != len(dataset.query_internships(filters)) or dataset.facets(filters) is not result:
+        logger.error("Facet result was not cached")
+        return False
+    
+    logger.info("Facets test passed")
+    return True
+
+def test_response_cache():
+    """APIレスポンスのキャッシュと圧縮をテストする"""
+    logger.info("Testing response cache...")
+    
+    import gzip
+    from response_cache import ResponseCache, CachedResponse, make_etag, MIN_COMPRESS_SIZE
+    
+    body = json.dumps(load_json(COMBINED_DATA_FILE), ensure_ascii=False).encode('utf-8') * 2
+    cache = ResponseCache(max_entries=2)
+    entry = CachedResponse(make_etag("v1", "/api/internships?"), body, "application/json")
+    cache.put("v1", "/api/internships?", entry)
+    
+    # 圧縮は初回のみ行い、以降は同じ本体を返す
+    compressed = entry.encoded("gzip")
+    if len(body) >= MIN_COMPRESS_SIZE and (gzip.decompress(compressed) != body or entry.encoded("gzip") is not compressed):
+        logger.error("Compressed body was not cached")
+        return False
+    
+    # ETagはバージョンとURLごとに異なり、バージョンが変わると以前のレスポンスは返さない
+    if make_etag("v1", "/api/companies?") == entry.etag or make_etag("v2", "/api/internships?") == entry.etag:
+        logger.error("ETag does not depend on the dataset version and URL")
+        return False
+    if cache.get("v1", "/api/internships?") is not entry or cache.get("v2", "/api/internships?") is not None:
+        logger.error("Unexpected cache lookup result")
+        return False
+    cache.put("v2", "/api/companies?", CachedResponse("x", b"[]", "application/json"))
+    if cache.get("v1", "/api/internships?") is not None:
+        logger.error("Responses of the previous dataset version were not discarded")
+        return False
+    
+    logger.info("Response cache test passed")
+    return True
+
+def test_search_index():
+    """全文検索の索引と差分更新をテストする"""
+    logger.info("Testing search index...")
+    
+    from dataset import Dataset
+    from search_index import SearchIndex
+    
+    combined_data = load_json(COMBINED_DATA_FILE)
+    companies = combined_data["companies"]
+    index = SearchIndex()
+    index.update(companies)
+    dataset = Dataset(companies, combined_data["meta"], search_index=index)
+    
+    # 全角英数字・複数語のAND検索と、企業・インターンシップの両方への一致
+    total, results = dataset.search("ｄａｙ　インターン", kind="internship")
+    if total != 1 or results[0]["item"]["title"] != "1Dayインターンシップ":
+        logger.error(f"Unexpected search result: {results}")
+        return False
+    if results[0]["highlight"]["title"] != "1<mark>Dayインターン</mark>シップ":
+        logger.error(f"Unexpected highlight: {results[0]['highlight']}")
+        return False
+    total, results = dataset.search("テスト企業1")
+    if {result["type"] for result in results} != {"company", "internship"} or results[0]["type"] != "company":
+        logger.error(f"Unexpected ranking: {results}")
+        return False
+    
+    # bigramは揃っていても連続していない語には一致せず、一致件数は全件を走査した結果と同じになる
+    titles = [internship["title"] for company in companies for internship in company["internships"]]
+    for query in ["ップ2", "シプ", "インターン"]:
+        expected = sum(query in title for title in titles)
+        if dataset.search(query, kind="internship")[0] != expected:
+            logger.error(f"Unexpected match count for {query}")
+            return False
+    
+    # 変更のあった企業だけを索引し直す（無効化した文書が多いため作り直しも行われる）
+    changed = [dict(company) for company in companies]
+    old_title = changed[0]["internships"][0]["title"]
+    changed[0]["internships"] = [dict(changed[0]["internships"][0], title="秋季インターンシップ2025")]
+    if index.update(iter(changed)) != 1 or len(index.documents) != index.live_count or index.search("秋季")[0] != 1 or \
+            index.search(old_title, kind="internship")[0] != titles.count(old_title) - 1:
+        logger.error("Search index was not updated incrementally")
+        return False
+    
+    logger.info("Search index test passed")
+    return True
+
+def test_work_queue():
+    """分散収集用ワークキューのリース・再試行・ホストごとの間隔と、ワーカーの結果の反映をテストする"""
+    logger.info("Testing work queue...")
+    
+    import tempfile
+    from config import CHANGES_FILE
+    from change_set import ChangeSet
+    from work_queue import WorkQueue
+    from crawl_worker import TASK_KIND, merge_results
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queue = WorkQueue(os.path.join(tmp_dir, "work_queue.db"), lease_seconds=60, max_attempts=2, host_interval=10)
+        companies = list(iter_records(COMPANIES_FILE))
+        tasks = [(company["id"], company, f"host{i}.example.com") for i, company in enumerate(companies[:2])]
+        if queue.enqueue_many(TASK_KIND, tasks) != 2:
+            logger.error("Failed to enqueue tasks")
+            return False
+        
+        # 2つのワーカーが別々のタスクをリースし、それ以上は取り出せない
+        first = queue.claim("worker1")
+        second = queue.claim("worker2")
+        if {first.key, second.key} != {companies[0]["id"], companies[1]["id"]} or queue.claim("worker3"):
+            logger.error("Tasks were not leased exclusively")
+            return False
+        
+        # 処理中のタスクは再登録しても変わらない
+        if queue.enqueue_many(TASK_KIND, tasks) != 0:
+            logger.error("Leased tasks were re-enqueued")
+            return False
+        
+        # ハートビートはリースを持つワーカーのみが行える
+        if not queue.heartbeat(first, "worker1") or queue.heartbeat(first, "worker2"):
+            logger.error("Unexpected heartbeat result")
+            return False
+        
+        # リースが切れたタスクは他のワーカーが取り直し、元のワーカーの結果は保存されない
+        queue.conn.execute("UPDATE tasks SET lease_expires = 0 WHERE id = ?", (first.id,))
+        retaken = queue.claim("worker3")
+        if retaken is None or retaken.key != first.key or retaken.attempts != 2:
+            logger.error("Expired lease was not reclaimed")
+            return False
+        if queue.complete(first, "worker1", {}):
+            logger.error("Result of an expired lease was accepted")
+            return False
+        
+        # 失敗したタスクは試行回数の上限まで再試行される
+        queue.fail(second, "worker2", "error")
+        again = queue.claim("worker2")
+        if again is None or again.key != second.key:
+            logger.error("Failed task was not retried")
+            return False
+        queue.fail(again, "worker2", "error")
+        
+        # 試行回数の上限に達したタスクはリースが切れても取り直さずに失敗にする
+        queue.enqueue("expire_test", "expired", {})
+        for _ in range(2):
+            expired = queue.claim("worker4")
+            queue.conn.execute("UPDATE tasks SET lease_expires = 0 WHERE id = ?", (expired.id,))
+        if queue.claim("worker4") is not None or queue.counts("expire_test")["failed"] != 1:
+            logger.error("Expired task was retried beyond the attempt limit")
+            return False
+        
+        # 同一ホストへのリクエスト枠は間隔を空けて割り当てられる
+        if queue.reserve_host("example.com") != 0 or not 9 < queue.reserve_host("example.com") <= 10:
+            logger.error("Host requests were not spaced")
+            return False
+        
+        # 完了したタスクの結果をインターンシップ情報に反映する
+        internships = list(iter_records(INTERNSHIPS_FILE))
+        company = companies[0]
+        collected = {
+            "id": f"{company['id']}_queue_0",
+            "company_id": company["id"],
+            "company_name": company["name"],
+            "title": "ワーカーで取得したインターンシップ",
+            "source": "テスト"
+        }
+        queue.complete(retaken, "worker3", {"unchanged": False, "internships": [collected], "urls": [], "pages": {}})
+        had_changes = os.path.exists(CHANGES_FILE)
+        try:
+            merged = merge_results(queue)
+            merged_internships = list(iter_records(INTERNSHIPS_FILE))
+            changes = ChangeSet.load(CHANGES_FILE)
+        finally:
+            save_jsonl(internships, INTERNSHIPS_FILE)
+            if not had_changes and os.path.exists(CHANGES_FILE):
+                os.remove(CHANGES_FILE)
+        
+        counts = queue.counts(TASK_KIND)
+        queue.close()
+        
+        if merged != 1 or collected not in merged_internships or len(merged_internships) != len(internships) + 1:
+            logger.error("Worker results were not merged")
+            return False
+        if collected["id"] not in changes.internships["added"]:
+            logger.error("Merged internships were not recorded in the change set")
+            return False
+        if counts["merged"] != 1 or counts["failed"] != 1 or counts["pending"] + counts["leased"] != 0:
+            logger.error(f"Unexpected task counts: {counts}")
+            return False
+    
+    logger.info("Work queue test passed")
+    return True
+
+def test_profiling():
+    """処理段階ごとのプロファイリングをテストする"""
+    logger.info("Testing stage profiling...")
+    
+    import tempfile
+    from internship_collector import combine_data
+    from profiling import enable_profiling, disable_profiling, profile_stage
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        profiler = enable_profiling(["combine"], output_dir=tmp_dir)
+        try:
+            with profile_stage("combine"):
+                combine_data(COMPANIES_FILE, INTERNSHIPS_FILE, COMBINED_DATA_FILE)
+            # 対象外の段階はレポートを作らない
+            with profile_stage("merge"):
+                pass
+        finally:
+            disable_profiling()
+        
+        if set(profiler.reports) != {"combine"} or not os.path.exists(os.path.join(tmp_dir, "combine.prof")):
+            logger.error(f"Unexpected profile reports: {profiler.reports}")
+            return False
+        with open(profiler.reports["combine"], encoding="utf-8") as f:
+            report = f.read()
+        if "combine_data" not in report or "allocation sites" not in report:
+            logger.error("Profile report does not contain the hot functions")
+            return False
+    
+    # 無効の場合は何もしない
+    with profile_stage("combine"):
+        pass
+    
+    logger.info("Stage profiling test passed")
+    return True
+
+def test_log_sampling():
+    """ログの種類ごとの間引きとJSON形式の出力をテストする"""
+    logger.info("Testing log sampling...")
+    
+    from utils import EventSampler, JsonFormatter
+    
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+        
+        def emit(self, record):
+            self.records.append(record)
+    
+    handler = ListHandler()
+    sampler = EventSampler(first=2, every=3)
+    handler.addFilter(sampler)
+    test_logger = logging.getLogger("test_log_sampling")
+    test_logger.propagate = False
+    test_logger.addHandler(handler)
+    try:
+        for i in range(10):
+            test_logger.warning(f"Failed to parse date: {i}", extra={"event": "date_parse_failed"})
+        test_logger.warning("Not sampled")
+    finally:
+        test_logger.removeHandler(handler)
+    
+    # 最初の2件と、以降3件ごとに1件（5, 8件目）、種類のないログは常に出力される
+    messages = [record.getMessage() for record in handler.records]
+    expected = [f"Failed to parse date: {i}" for i in (0, 1, 4, 7)] + ["Not sampled"]
+    if messages != expected:
+        logger.error(f"Unexpected sampled messages: {messages}")
+        return False
+    if sampler.summary() != {"date_parse_failed": (10, 6)}:
+        logger.error(f"Unexpected sampling summary: {sampler.summary()}")
+        return False
+    
+    entry = json.loads(JsonFormatter().format(handler.records[2]))
+    if entry["message"] != "Failed to parse date: 4" or entry["level"] != "WARNING" \
+            or entry["event"] != "date_parse_failed" or entry["event_count"] != 5:
+        logger.error(f"Unexpected JSON log entry: {entry}")
+        return False
+    
+    logger.info("Log sampling test passed")
+    return True
+
+def test_daemon():
+    """常駐モードの巡回順序と状態の記録をテストする"""
+    logger.info("Testing daemon...")
+    
+    import tempfile
+    from daemon import CrawlDaemon, load_status
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        status_file = os.path.join(tmp_dir, "daemon_status.json")
+        daemon = CrawlDaemon(batch_size=2, status_file=status_file, status_port=None, notify_url=None,
+                             use_fingerprints=False)
+        daemon.load_companies()
+        company_ids = [company["id"] for company in iter_records(COMPANIES_FILE)]
+        
+        # 企業を batch_size 件ずつ順に巡回し、末尾まで来たら先頭に戻る
+        visited = []
+        for _ in range(len(company_ids)):
+            batch, cursor = daemon.next_batch()
+            visited.extend(company["id"] for company in batch)
+            daemon.update_status(cursor=cursor)
+        if visited != company_ids * 2:
+            logger.error(f"Unexpected crawl order: {visited}")
+            return False
+        
+        # 状態は再起動後も引き継がれ、失敗したサイクルは異常として報告される
+        if load_status(status_file).get("cursor") != daemon.status["cursor"]:
+            logger.error("Daemon status was not saved")
+            return False
+        restarted = CrawlDaemon(status_file=status_file, status_port=None, notify_url=None, use_fingerprints=False)
+        if restarted.status["cursor"] != daemon.status["cursor"] or not restarted.health()[0]:
+            logger.error("Daemon status was not restored")
+            return False
+        restarted.update_status(last_error="failed")
+        if restarted.health()[0]:
+            logger.error("Failed cycle was reported as healthy")
+            return False
+    
+    logger.info("Daemon test passed")
+    return True
+
+def test_streaming_fetch():
+    """ページの逐次取得（対象要素を読み終えた時点・上限のバイト数での打ち切り）をテストする"""
+    logger.info("Testing streaming fetch...")
+    
+    import gzip
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from utils import TargetTracker, fetch_page
+    
+    # 閉じタグのない要素や、タグの途中で区切られた入力でも一覧の終わりを判定できる
+    html = '<div id="main"><ul><li class="internship-box">A<br><li class="internship-box">B</ul><p>後続'
+    tracker = TargetTracker(".internship-box")
+    for i in range(0, len(html), 7):
+        tracker.feed(html[i:i + 7])
+        if tracker.complete:
+            break
+    if not tracker.complete or tracker.matched != 2 or i + 7 < html.index("</ul>") + len("</ul>"):
+        logger.error(f"Unexpected tracker state: complete={tracker.complete}, matched={tracker.matched}")
+        return False
+    
+    boxes = "".join(f'<div class="internship-box">インターン{i}</div>' for i in range(50))
+    filler = "".join(f"<p>{os.urandom(32).hex()}</p>" for _ in range(30000))
+    body = f'<html><head><meta charset="utf-8"></head><body><div class="list">{boxes}</div>{filler}</body></html>'
+    body = body.encode("utf-8")
+    compressed = gzip.compress(body)
+    
+    class PageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(compressed)))
+            self.end_headers()
+            try:
+                self.wfile.write(compressed)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 打ち切られた場合
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/internship"
+    try:
+        # 一覧を読み終えた時点で打ち切り、一覧はすべて含まれる
+        page = fetch_page(url, stop_after=".internship-box")
+        if not page.stopped_early or page.truncated or page.size >= len(body) // 4 \
+                or page.text.count('class="internship-box"') != 50 or "インターン49" not in page.text:
+            logger.error(f"Page was not stopped after the target elements: {page.size} of {len(body)} bytes")
+            return False
+        
+        # 上限のバイト数を超える部分は読み込まない
+        page = fetch_page(url, max_bytes=100000)
+        if not page.truncated or page.stopped_early or page.size != 100000 or "インターン49" not in page.text:
+            logger.error(f"Page was not truncated: {page.size} bytes")
+            return False
+        
+        page = fetch_page(url)
+        if page.truncated or page.text.encode("utf-8") != body:
+            logger.error("Page was not read completely")
+            return False
+        
+        # HTTP/2 に対応していないサーバー（または httpx がない環境）ではHTTP/1.1で取得する
+        page = fetch_page(url, http2=True)
+        if not page.http_version.startswith("HTTP/1") or page.text.encode("utf-8") != body:
+            logger.error(f"HTTP/2 fetch did not fall back to HTTP/1.1: {page.http_version}")
+            return False
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    logger.info("Streaming fetch test passed")
+    return True
+
+def test_rate_control():
+    """ホストごとの適応的なリクエスト制御（AIMD）をテストする"""
+    logger.info("Testing adaptive rate control...")
+    
+    import time
+    from rate_control import HostController, host_controller, reset_controllers
+    
+    controller = HostController("example.com", max_rate=1000, max_concurrency=4, initial_rate=100, rate_step=10)
+    
+    # 正常な応答が続く間は上限まで加算的に上げる
+    for _ in range(20):
+        controller.release(controller.acquire())
+    if not 100 < controller.rate <= 1000 or controller.concurrency != 4 or controller.counts["increases"] != 20:
+        logger.error(f"Rate was not increased: {controller.metrics()}")
+        return False
+    
+    # 429 では乗算的に下げ、直後に続けて受けた 429 ではそれ以上下げない
+    rate = controller.rate
+    if controller.release(controller.acquire(), status=429) != "throttled" \
+            or controller.rate != rate / 2 or controller.concurrency != 2:
+        logger.error(f"Rate was not decreased on 429: {controller.metrics()}")
+        return False
+    controller._next_slot = 0.0
+    if controller.release(controller.acquire(), status=503) is not None or controller.rate != rate / 2:
+        logger.error("Rate was decreased twice within the cooldown")
+        return False
+    
+    # 404 など負荷と関係のない失敗では変えず、応答時間の急増では下げる
+    controller._next_slot = controller._cooldown_until = 0.0
+    controller.release(controller.acquire(), status=404)
+    if controller.rate != rate / 2:
+        logger.error("Rate was changed by a 404 response")
+        return False
+    controller.acquire()
+    if controller.release(time.monotonic() - 5) != "latency_spikes" or controller.rate != rate / 4:
+        logger.error(f"Rate was not decreased on a latency spike: {controller.metrics()}")
+        return False
+    
+    # 上限はホストが就活サイトであれば JOB_SITES の設定を使う
+    from config import JOB_SITES, ADAPTIVE_MAX_RATE
+    reset_controllers()
+    site = JOB_SITES["mynavi"]
+    if host_controller(site["internship_url_pattern"].format(1)).max_rate != site["max_rate"] \
+            or host_controller("https://example.com/recruit").max_rate != ADAPTIVE_MAX_RATE:
+        logger.error("Site limits were not applied")
+        return False
+    reset_controllers()
+    
+    # 想定外の例外で中断したリクエストも同時リクエスト数の枠を返す
+    import utils
+    original_send_request = utils.send_request
+    def broken_send_request(*args):
+        raise ValueError("unexpected")
+    utils.send_request = broken_send_request
+    try:
+        utils.make_request("https://example.com/recruit", retries=1)
+    except ValueError:
+        pass
+    finally:
+        utils.send_request = original_send_request
+    in_flight = host_controller("https://example.com/recruit").in_flight
+    reset_controllers()
+    if utils.ADAPTIVE_RATE_CONTROL and in_flight != 0:
+        logger.error("Request slot was not released after an unexpected error")
+        return False
+    
+    logger.info("Adaptive rate control test passed")
+    return True
+
+def test_sitemap():
+    """サイトマップからの企業の発見をテストする"""
+    logger.info("Testing sitemap discovery...")
+    
+    import io
+    import gzip
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from config import JOB_SITES
+    from sitemap import parse_sitemap, extract_company_ids, discover_companies
+    
+    namespace = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    site_urls = ["https://job.rikunabi.com/2026/company/r100/", "https://job.rikunabi.com/2026/company/r100/seminar/",
+                 "https://job.rikunabi.com/2026/company/internship/r200/", "https://job.rikunabi.com/2026/search/",
+                 "https://job.rikunabi.com/2026/company/r300/", "https://example.com/2026/company/r400/"]
+    urlset = f'<?xml version="1.0" encoding="UTF-8"?><urlset {namespace}>' + "".join(
+        f"<url><loc>{url}</loc><lastmod>2025-05-17</lastmod></url>" for url in site_urls) + "</urlset>"
+    sitemaps = {"/sitemap_companies.xml.gz": gzip.compress(urlset.encode("utf-8"))}
+    
+    # gzip圧縮されたサイトマップもそのまま解析できる
+    parsed = list(parse_sitemap(io.BytesIO(sitemaps["/sitemap_companies.xml.gz"])))
+    if parsed != [("url", url) for url in site_urls]:
+        logger.error(f"Unexpected sitemap entries: {parsed}")
+        return False
+    
+    # 既存の正規表現で企業IDを取り出す（インターンシップのページ・他のホストは含めず、同じ企業は1件にまとめる）
+    if list(extract_company_ids("rikunabi", site_urls)) != [("r100", site_urls[0]), ("r300", site_urls[4])]:
+        logger.error(f"Unexpected company IDs: {list(extract_company_ids('rikunabi', site_urls))}")
+        return False
+    
+    class SitemapHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = sitemaps.get(self.path)
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SitemapHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    sitemaps["/sitemap.xml"] = (f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex {namespace}>'
+                                f'<sitemap><loc>{base_url}/sitemap_companies.xml.gz</loc></sitemap>'
+                                f'</sitemapindex>').encode("utf-8")
+    original = JOB_SITES["rikunabi"]["sitemap_url"]
+    JOB_SITES["rikunabi"]["sitemap_url"] = f"{base_url}/sitemap.xml"
+    try:
+        # サイトマップインデックスから子のサイトマップをたどり、収集済みの企業は除く
+        discovered = discover_companies("rikunabi", {"rikunabi_r100"})
+    finally:
+        JOB_SITES["rikunabi"]["sitemap_url"] = original
+        server.shutdown()
+        server.server_close()
+    if discovered != [("r300", site_urls[4])]:
+        logger.error(f"Unexpected discovered companies: {discovered}")
+        return False
+    
+    # サイトマップから追加する企業は MAX_COMPANIES 件までで、企業名を補完できなかった企業は保存しない
+    import company_collector
+    from types import SimpleNamespace
+    from company_collector import CompanyCollector
+    originals = (company_collector.discover_companies, company_collector.get_soup, company_collector.MAX_COMPANIES)
+    company_collector.discover_companies = lambda site_key, known_ids: [("r300", site_urls[4]), ("r500", site_urls[4])]
+    company_collector.get_soup = lambda url: None
+    company_collector.MAX_COMPANIES = 1
+    try:
+        collector = CompanyCollector()
+        written = []
+        collector._writer = SimpleNamespace(write=written.append)
+        collector.collect_from_sitemap("rikunabi")
+        enriched = list(collector.enrich_company_data(written))
+    finally:
+        company_collector.discover_companies, company_collector.get_soup, company_collector.MAX_COMPANIES = originals
+    if [company["id"] for company in written] != ["rikunabi_r300"] or enriched or collector.company_count != 0:
+        logger.error(f"Unexpected companies from the sitemap: {written}, {enriched}")
+        return False
+    
+    logger.info("Sitemap discovery test passed")
+    return True
+
+def test_records():
+    """企業・インターンシップのレコード型をテストする"""
+    logger.info("Testing record types...")
+    
+    import json
+    from records import CompanyRecord, InternshipRecord
+    from dataset import internship_row
+    from internship_collector import InternshipCollector
+    
+    # 取得元によって異なる項目や未知のキーも含め、辞書との変換で元に戻る
+    company = {"id": "mynavi_123", "name": "テスト株式会社", "source": "マイナビ", "job_site_url": "https://example.com/",
+               "official_site": None, "note": "未知のキー"}
+    record = CompanyRecord.from_dict(company)
+    if record.to_dict() != company or "stock_code" in record or record.get("note") != "未知のキー":
+        logger.error(f"Company record did not round-trip: {record!r}")
+        return False
+    if hasattr(record, "__dict__"):
+        logger.error("Company record has a per-instance __dict__")
+        return False
+    
+    # 取得元などの繰り返し現れる文字列は全レコードで同じオブジェクトを共有する
+    internships = [InternshipRecord.from_dict(json.loads(json.dumps({"id": f"i{i}", "source": "マイナビ", "title": "1Day"})))
+                   for i in range(2)]
+    if internships[0].source is not internships[1].source or internships[0]["title"] != "1Day":
+        logger.error("Categorical fields are not interned")
+        return False
+    
+    # Webアプリの行はJSONにする際に辞書に変換する（検証結果はマージ後のレコードのみ）
+    row = internship_row({"id": "c1", "name": "テスト株式会社"}, {"id": "c1_0", "title": "1Dayインターンシップ"})
+    if list(row.to_dict()) != list(InternshipRecord.FIELDS[:-1]) or row.company_name != "テスト株式会社":
+        logger.error(f"Unexpected internship row: {row!r}")
+        return False
+    
+    # マージは就活サイトのレコードに企業サイトの情報を補完する
+    def internship(title, source, **values):
+        return InternshipRecord(id=f"{source}_{title}", company_id="c1", company_name="テスト株式会社", title=title,
+                                period=values.get("period", ""), start_date="", end_date="", target="",
+                                application_url="", source=source, last_updated="2025-05-17")
+    job_site = [internship("1Dayインターンシップ", "マイナビ")]
+    career_site = [internship("1Dayインターンシップ", "企業サイト", period="1日"), internship("説明会", "企業サイト")]
+    collector = InternshipCollector([], use_fingerprints=False)
+    merged = collector.verify_and_merge_internship_data(job_site, career_site)
+    if [m.title for m in merged] != ["1Dayインターンシップ", "説明会"] or merged[0].period != "1日" or \
+            merged[0].source != "マイナビ" or not all("verification" in m.to_dict() for m in merged):
+        logger.error(f"Unexpected merged internships: {merged}")
+        return False
+    
+    logger.info("Record type test passed")
+    return True
+
+def test_page_fingerprint():
+    """ページの変更検知（インターンシップ情報の要素の変更は1文字でも検知する）をテストする"""
+    logger.info("Testing page fingerprints...")
+    
+    import tempfile
+    from bs4 import BeautifulSoup
+    from fingerprint import FingerprintStore
+    
+    def page(date, ad):
+        return (f'<html><body><div class="ad">{ad}</div><div class="internship-box"><h3>1Dayインターンシップ</h3>'
+                f'<p class="date">{date}</p><p class="target">2027年卒</p></div></body></html>')
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = FingerprintStore(os.path.join(tmp_dir, "fingerprints.json"))
+        url = "https://example.com/internship"
+        html = page("2025年8月1日〜2025年8月2日", "広告A")
+        store.update(url, html, BeautifulSoup(html, 'html.parser'))
+        
+        # 対象外の部分（広告）だけの変更は未変更とする
+        changed_ad = page("2025年8月1日〜2025年8月2日", "広告B")
+        if not store.is_unchanged(url, changed_ad, lambda: BeautifulSoup(changed_ad, 'html.parser')):
+            logger.error("Change outside the internship section was detected")
+            return False
+        
+        # 日付の1文字の変更は検知する
+        changed_date = page("2025年8月1日〜2025年8月3日", "広告B")
+        if store.is_unchanged(url, changed_date, lambda: BeautifulSoup(changed_date, 'html.parser')):
+            logger.error("Date change in the internship section was not detected")
+            return False
+    
+    logger.info("Page fingerprint test passed")
+    return True
+
+def test_legacy_migration():
+    """従来のJSON配列のファイルからJSONLへの変換をテストする"""
+    logger.info("Testing legacy JSON migration...")
+    
+    import tempfile
+    from utils import migrate_legacy_json
+    
+    companies = list(iter_records(COMPANIES_FILE))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        companies_file = os.path.join(tmp_dir, "companies.jsonl")
+        save_json(companies, os.path.join(tmp_dir, "companies.json"))
+        
+        # JSONLファイルがない場合は読み込み時に変換し、変換は1回だけ行う
+        if list(iter_records(companies_file)) != companies or not os.path.exists(companies_file):
+            logger.error("Legacy companies file was not migrated")
+            return False
+        if migrate_legacy_json(companies_file) is not None:
+            logger.error("Legacy companies file was migrated twice")
+            return False
+        
+        # 従来のファイルもない場合は何もしない
+        if migrate_legacy_json(os.path.join(tmp_dir, "internships.jsonl")) is not None:
+            logger.error("Missing legacy file was migrated")
+            return False
+    
+    logger.info("Legacy JSON migration test passed")
+    return True
+
+def test_static_api():
+    """静的APIスナップショットの書き出しと配信をテストする"""
+    logger.info("Testing static API snapshots...")
+    
+    import tempfile
+    import app as webapp
+    from dataset import DatasetManager
+    from synthetic_data import write_dataset
+    from static_api import StaticApi, build_static_api
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_dataset(tmp_dir, 30, 300)
+        snapshot_file = os.path.join(tmp_dir, "combined_data.snap")
+        output_dir = os.path.join(tmp_dir, "static_api")
+        
+        # スナップショットが変わらなければ書き出し直さない
+        if not build_static_api(snapshot_file, output_dir) or build_static_api(snapshot_file, output_dir):
+            logger.error("Static API responses were not written exactly once")
+            return False
+        
+        original = webapp.datasets, webapp.static_api
+        current_dataset = webapp.current_dataset
+        webapp.datasets = DatasetManager(os.path.join(tmp_dir, "combined_data.json"), snapshot_file=snapshot_file)
+        static_api = StaticApi(output_dir)
+        client = webapp.app.test_client()
+        try:
+            # トップページと同じ形式のURL（未選択の条件は空の値）と、絞り込み条件ごとの先頭ページ
+            urls = ["/api/internships?q=&industry=&market=&source=&deadline_month=&offset=0&limit=10",
+                    "/api/facets?q=&industry=&market=&source=&deadline_month=",
+                    "/api/internships?source=マイナビ&offset=10&limit=10", "/api/internships", "/api/companies"]
+            live = {}
+            webapp.static_api = StaticApi(os.path.join(tmp_dir, "missing"))
+            for url in urls:
+                live[url] = client.get(url, headers={"Accept-Encoding": "gzip"})
+            
+            # ページ指定がない場合は、以前と同じく全件を配列で返す
+            legacy = client.get("/api/internships").get_json()
+            if not isinstance(legacy, list) or len(legacy) != len(webapp.datasets.get().internship_rows):
+                logger.error("Internship list without paging parameters is not a plain list of all rows")
+                return False
+            filtered = client.get(f"/api/internships?company_id={legacy[0]['company_id']}").get_json()
+            if filtered != [row for row in legacy if row["company_id"] == legacy[0]["company_id"]]:
+                logger.error("Internship list filtered by company differs from the plain list")
+                return False
+            
+            # 静的APIスナップショットから返す間はビュー関数（データセットの参照）を呼ばない
+            def no_view():
+                raise AssertionError("view function called")
+            
+            webapp.static_api = static_api
+            webapp.current_dataset = no_view
+            try:
+                for url in urls:
+                    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+                    if response.status_code != 200 or response.get_data() != live[url].get_data():
+                        logger.error(f"Static response for {url} differs from the view function")
+                        return False
+                    # ETagはどちらから返した場合も同じ
+                    if response.headers.get("ETag") != live[url].headers.get("ETag"):
+                        logger.error(f"ETag of the static response for {url} differs from the view function")
+                        return False
+                    if client.get(url, headers={"Accept-Encoding": "gzip",
+                                                "If-None-Match": response.headers["ETag"]}).status_code != 304:
+                        logger.error(f"Conditional request for {url} did not return 304")
+                        return False
+            finally:
+                webapp.current_dataset = current_dataset
+            
+            # 書き出していないページはビュー関数で作成する
+            response = client.get("/api/internships?offset=100&limit=10")
+            if response.status_code != 200 or not response.headers["ETag"].startswith(f'"{webapp.datasets.version}-'):
+                logger.error("Unexpected response for a page that was not written")
+                return False
+        finally:
+            webapp.datasets, webapp.static_api = original
+    
+    logger.info("Static API snapshot test passed")
+    return True
+
 def validate_data_structure():
     """データ構造を検証する"""
     logger.info("Validating data structure...")
     
     # 企業データを検証
-    companies = load_json(COMPANIES_FILE)
+    companies = list(iter_records(COMPANIES_FILE))
     if not companies:
         logger.error("Failed to load company data")
         return False
@@ -188,7 +1205,7 @@ def validate_data_structure():
             logger.warning(f"Company {company.get('name', 'Unknown')} is missing required fields: {missing_fields}")
     
     # インターンシップデータを検証
-    internships = load_json(INTERNSHIPS_FILE)
+    internships = list(iter_records(INTERNSHIPS_FILE))
     if not internships:
         logger.error("Failed to load internship data")
         return False
@@ -214,6 +1231,50 @@ def validate_data_structure():
     logger.info("Data structure validation completed")
     return True
 
+def test_sqlite_storage():
+    """SQLiteストレージへの書き込みと読み出しをテストする"""
+    logger.info("Testing SQLite storage...")
+    
+    from storage import SQLiteStorage, BatchWriter
+    
+    db_file = f"{DATA_DIR}/test_storage.db"
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+    
+    storage = SQLiteStorage(db_file)
+    try:
+        companies = list(iter_records(COMPANIES_FILE))
+        internships = list(iter_records(INTERNSHIPS_FILE))
+        
+        # バッチで書き込む
+        with BatchWriter(storage, batch_size=2) as batch:
+            for company in companies:
+                batch.add_company(company)
+                batch.add_company_internships(
+                    company["id"], [i for i in internships if i["company_id"] == company["id"]])
+        
+        if list(storage.iter_companies()) != companies or len(list(storage.iter_internships())) != len(internships):
+            logger.error("Unexpected storage contents")
+            return False
+        
+        # 同じタイトルのインターンシップは新しいIDで置き換えられる
+        replaced = dict(internships[0], id=f"{internships[0]['id']}_new")
+        storage.replace_company_internships(replaced["company_id"], [replaced])
+        company = storage.get_company(replaced["company_id"])
+        ids = [internship["id"] for internship in company["internships"]]
+        if replaced["id"] not in ids or internships[0]["id"] in ids:
+            logger.error(f"Internship was not replaced: {ids}")
+            return False
+        
+        logger.info("SQLite storage test passed")
+        return True
+    finally:
+        storage.close()
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(db_file + suffix):
+                os.remove(db_file + suffix)
+
 def run_tests():
     """全テストを実行する"""
     logger.info("Starting tests...")
@@ -227,21 +1288,114 @@ def run_tests():
     # データ構造を検証
     structure_result = validate_data_structure()
     
+    # SQLiteストレージをテスト
+    storage_result = test_sqlite_storage()
+    
+    # 結合データの差分更新をテスト
+    incremental_result = test_incremental_combination()
+    
+    # スナップショット形式をテスト
+    snapshot_result = test_snapshot()
+    
+    # データセットの自動再読み込みをテスト
+    reload_result = test_dataset_reload()
+    
+    # インターンシップ一覧の絞り込みをテスト
+    query_result = test_internship_query()
+    
+    # 開始日・締切日の索引をテスト
+    date_index_result = test_date_index()
+    
+    # 絞り込み項目の集計をテスト
+    facets_result = test_facets()
+    
+    # APIレスポンスのキャッシュをテスト
+    cache_result = test_response_cache()
+    
+    # 全文検索をテスト
+    search_result = test_search_index()
+    
+    # 分散収集用のワークキューをテスト
+    queue_result = test_work_queue()
+    
+    # 処理段階ごとのプロファイリングをテスト
+    profiling_result = test_profiling()
+    
+    # ログの間引きとJSON出力をテスト
+    logging_result = test_log_sampling()
+    
+    # 常駐モードをテスト
+    daemon_result = test_daemon()
+    
+    # ページの逐次取得をテスト
+    streaming_result = test_streaming_fetch()
+    
+    # 適応的なリクエスト制御をテスト
+    rate_control_result = test_rate_control()
+    
+    # サイトマップからの企業の発見をテスト
+    sitemap_result = test_sitemap()
+    
+    # 企業・インターンシップのレコード型をテスト
+    records_result = test_records()
+    
+    # 静的APIスナップショットをテスト
+    static_api_result = test_static_api()
+    
+    # ページの変更検知をテスト
+    fingerprint_result = test_page_fingerprint()
+    
+    # 従来のJSONファイルからの変換をテスト
+    migration_result = test_legacy_migration()
+    
     # テスト結果をまとめる
     test_results = {
         "data_combination": combination_result,
         "data_structure": structure_result,
+        "sqlite_storage": storage_result,
+        "incremental_combination": incremental_result,
+        "snapshot": snapshot_result,
+        "dataset_reload": reload_result,
+        "internship_query": query_result,
+        "date_index": date_index_result,
+        "facets": facets_result,
+        "response_cache": cache_result,
+        "search_index": search_result,
+        "work_queue": queue_result,
+        "profiling": profiling_result,
+        "log_sampling": logging_result,
+        "daemon": daemon_result,
+        "streaming_fetch": streaming_result,
+        "rate_control": rate_control_result,
+        "sitemap": sitemap_result,
+        "records": records_result,
+        "static_api": static_api_result,
+        "page_fingerprint": fingerprint_result,
+        "legacy_migration": migration_result,
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
     
     # テスト結果を保存
     save_json(test_results, f"{DATA_DIR}/test_results.json")
     
+    failed = [name for name, result in test_results.items() if result is False]
+    if failed:
+        logger.error(f"Failed tests: {', '.join(failed)}")
     logger.info("Tests completed")
     return all(test_results.values())
 
+# pytest では True/False を返す個々の関数を収集せず、全テストの結果を確認する test_all だけを実行する
+for _name, _function in list(globals().items()):
+    if _name.startswith("test_"):
+        _function.__test__ = False
+
+def test_all():
+    """pytest から全テストを実行する"""
+    assert run_tests()
+
 if __name__ == "__main__":
     success = run_tests()
+    log_run_summary()
     
     if success:
         logger.info("All tests passed")
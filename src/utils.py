@@ -3,71 +3,454 @@
 """
 
 import os
+import re
 import json
+import queue
+import codecs
+import atexit
 import logging
+import threading
 import time
 import random
+from collections import Counter
 from datetime import datetime
-from pathlib import Path
+from html.parser import HTMLParser
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import urlparse
 
 import requests
 from bs4 import BeautifulSoup
 
-from config import REQUEST_HEADERS, REQUEST_TIMEOUT, REQUEST_RETRY, REQUEST_DELAY, DATE_FORMAT, LOG_FILE, LOG_LEVEL
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from config import JOB_SITES, REQUEST_HEADERS, REQUEST_TIMEOUT, REQUEST_RETRY, REQUEST_DELAY, DATE_FORMAT, LOG_FILE, LOG_LEVEL, \
+    LOG_FORMAT, LOG_SAMPLE_FIRST, LOG_SAMPLE_EVERY, MAX_PAGE_BYTES, STREAM_CHUNK_SIZE, ADAPTIVE_RATE_CONTROL
+from rate_control import host_controller, host_metrics
 
 # ロギング設定
+LOG_TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord の標準の属性（これ以外の属性は extra で渡された構造化データとしてJSONに含める）
+_STANDARD_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """ログを1行1件のJSONとして出力するフォーマッタ（extra で渡した値もフィールドとして出力する）"""
+    
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class EventSampler(logging.Filter):
+    """extra={"event": 種類} の付いたログを種類ごとに間引くフィルタ
+    
+    最初の first 件はそのまま出力し、以降は every 件ごとに1件だけ出力する。
+    種類ごとの件数は summary() で取得でき、終了時にまとめてログに出力する。
+    """
+    
+    def __init__(self, first=LOG_SAMPLE_FIRST, every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.first = first
+        self.every = every
+        self.counts = Counter()
+        self._lock = threading.Lock()
+    
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        if event is None:
+            return True
+        with self._lock:
+            self.counts[event] += 1
+            count = self.counts[event]
+        record.event_count = count
+        return self._emitted(count) > self._emitted(count - 1)
+    
+    def _emitted(self, count):
+        """count 件目までに出力した件数"""
+        sampled = (count - self.first) // self.every if self.every > 0 and count > self.first else 0
+        return min(count, self.first) + sampled
+    
+    def summary(self):
+        """種類ごとの (件数, 間引いた件数) を返す"""
+        with self._lock:
+            counts = dict(self.counts)
+        return {event: (count, count - self._emitted(count)) for event, count in counts.items()}
+
+# ログ出力用のスレッドとフィルタ（setup_logger で作成する）
+_listener = None
+_sampler = None
+
 def setup_logger():
-    """ロガーの設定を行う"""
-    log_dir = os.path.dirname(LOG_FILE)
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    logging.basicConfig(
-        level=getattr(logging, LOG_LEVEL),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
+    """ロガーの設定を行う
+    
+    ログはキューに積むだけで呼び出し元に戻り、ファイル・コンソールへの書き込みはバックグラウンドの
+    スレッド（QueueListener）が行う。複数のモジュールから呼び出されても設定は1回だけ行う。
+    """
+    global _listener, _sampler
+    if _listener is None:
+        log_dir = os.path.dirname(LOG_FILE)
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        
+        file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(LOG_TEXT_FORMAT))
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(LOG_TEXT_FORMAT))
+        
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        _sampler = EventSampler()
+        queue_handler.addFilter(_sampler)  # 間引いたログはキューにも積まない
+        
+        root = logging.getLogger()
+        root.setLevel(getattr(logging, LOG_LEVEL))
+        root.addHandler(queue_handler)
+        
+        _listener = QueueListener(log_queue, file_handler, stream_handler)
+        _listener.start()
+        atexit.register(shutdown_logging)
     return logging.getLogger(__name__)
 
+def log_event_summary():
+    """間引いたログの種類ごとの件数を出力する"""
+    if _sampler is None:
+        return
+    summary_logger = logging.getLogger(__name__)
+    for event, (count, suppressed) in sorted(_sampler.summary().items()):
+        if suppressed:
+            summary_logger.info(f"{event}: {count} occurrences ({suppressed} not logged individually)",
+                                extra={"event_summary": event, "total": count, "suppressed": suppressed})
+
+def log_host_metrics():
+    """ホストごとのリクエスト制御の状態（頻度・同時リクエスト数とそれを調整した回数）を出力する"""
+    metrics_logger = logging.getLogger(__name__)
+    for host, metrics in host_metrics().items():
+        metrics_logger.info(
+            f"{host}: {metrics['requests']} requests, rate {metrics['rate']}/s (peak {metrics['peak_rate']}/s, "
+            f"max {metrics['max_rate']}/s), concurrency {metrics['concurrency']}, {metrics['throttled']} throttled, "
+            f"{metrics['errors']} errors, {metrics['latency_spikes']} latency spikes, {metrics['decreases']} decreases",
+            extra={"host_metrics": host, **metrics})
+
+def log_run_summary():
+    """種類ごとの件数・ホストごとのリクエスト制御の状態を出力する（処理の最後に呼び出す）
+    
+    インタープリターの終了時には出力先のストリームが閉じられている場合があるため、終了処理では出力しない。
+    """
+    log_event_summary()
+    log_host_metrics()
+
+def shutdown_logging():
+    """キューに残ったログを書き出してからログ出力スレッドを停止する（終了時に呼ばれる）"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
 logger = setup_logger()
 
 # リクエスト関連の関数
-def make_request(url, headers=None, params=None, retries=REQUEST_RETRY):
-    """指定されたURLにリクエストを送信し、レスポンスを返す"""
+_session_local = threading.local()
+
+def get_session():
+    """スレッドごとに使い回すHTTPセッション（同じホストへの接続を再利用する）"""
+    session = getattr(_session_local, "session", None)
+    if session is None:
+        session = _session_local.session = requests.Session()
+    return session
+
+# 就活サイトのホスト -> サイトの設定
+_JOB_SITE_HOSTS = {urlparse(site["url"]).netloc.lower(): site for site in JOB_SITES.values()}
+
+def job_site_for_url(url):
+    """URLが就活サイトのものであればそのサイトの設定（JOB_SITES の値）を返す"""
+    return _JOB_SITE_HOSTS.get(urlparse(url).netloc.lower())
+
+# HTTP/2 のクライアント（全スレッドで共有し、同じホストへの並列リクエストを1つの接続に多重化する）
+_http2_client = None
+_http2_lock = threading.Lock()
+_http1_hosts = set()  # HTTP/2 での通信に失敗し、HTTP/1.1 に切り替えたホスト
+
+def get_http2_client():
+    """HTTP/2 で通信するクライアントを返す（httpx と h2 がインストールされていない場合はNone）"""
+    global _http2_client
+    if httpx is None:
+        return None
+    with _http2_lock:
+        if _http2_client is None:
+            try:
+                _http2_client = httpx.Client(http2=True, timeout=REQUEST_TIMEOUT, follow_redirects=True)
+            except ImportError as e:
+                logger.warning(f"HTTP/2 is not available, using HTTP/1.1: {e}")
+                _http2_client = False
+    return _http2_client or None
+
+def uses_http2(url, http2=None):
+    """URLへのリクエストにHTTP/2を使うか（http2 が None の場合は JOB_SITES の http2 の設定に従う）"""
+    if http2 is None:
+        site = job_site_for_url(url)
+        http2 = bool(site and site.get("http2"))
+    return http2 and urlparse(url).netloc.lower() not in _http1_hosts and get_http2_client() is not None
+
+def response_http_version(response):
+    """レスポンスのHTTPバージョン（"HTTP/1.1" / "HTTP/2" など）"""
+    if httpx is not None and isinstance(response, httpx.Response):
+        return response.http_version
+    version = getattr(response.raw, "version", 11)
+    return f"HTTP/{version // 10}.{version % 10}"
+
+def send_request(url, headers=None, params=None, stream=False, http2=None):
+    """リクエストを1回送信してレスポンスを返す（リトライやリクエスト間隔の待機は行わない）
+    
+    HTTP/2 を使う場合でも、サーバーが対応していなければHTTP/1.1で通信する。HTTP/2 での通信自体に
+    失敗したホストは、以降 requests（HTTP/1.1）で通信する。
+    """
     if headers is None:
         headers = REQUEST_HEADERS
     
-    for attempt in range(retries):
+    if not uses_http2(url, http2):
+        response = get_session().get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT, stream=stream)
         try:
-            logger.info(f"Requesting URL: {url}")
-            response = requests.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+    
+    client = get_http2_client()
+    try:
+        response = client.send(client.build_request("GET", url, headers=headers, params=params), stream=stream)
+    except httpx.TransportError as e:
+        if not isinstance(e, httpx.TimeoutException):
+            host = urlparse(url).netloc.lower()
+            _http1_hosts.add(host)
+            logger.warning(f"HTTP/2 request to {host} failed, falling back to HTTP/1.1: {e}")
+        raise
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError:
+        response.close()
+        raise
+    return response
+
+# リトライの対象にする例外
+_REQUEST_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx is not None else ())
+
+def make_request(url, headers=None, params=None, retries=REQUEST_RETRY, stream=False, http2=None):
+    """指定されたURLにリクエストを送信し、レスポンスを返す
+    
+    stream が True の場合は本文を読み込まずに返す（呼び出し元で読み込み、close する）。
+    """
+    # ホストへのリクエスト頻度・同時リクエスト数は応答に応じて調整する（無効の場合は固定の間隔を空ける）
+    controller = host_controller(url) if ADAPTIVE_RATE_CONTROL else None
+    
+    for attempt in range(retries):
+        started = controller.acquire() if controller is not None else None
+        released = controller is None
+        try:
+            logger.info(f"Requesting URL: {url}", extra={"event": "request"})
+            response = send_request(url, headers, params, stream, http2)
             
-            # リクエスト間隔を設定（サーバー負荷軽減のため）
-            time.sleep(REQUEST_DELAY + random.uniform(0, 1))
+            if controller is not None:
+                released = True
+                controller.release(started)
+            else:
+                # リクエスト間隔を設定（サーバー負荷軽減のため）
+                time.sleep(REQUEST_DELAY + random.uniform(0, 1))
             
             return response
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Request failed (attempt {attempt+1}/{retries}): {e}")
+        except _REQUEST_ERRORS as e:
+            if controller is not None:
+                released = True
+                _release_failed(controller, started, e)
+            logger.warning(f"Request failed (attempt {attempt+1}/{retries}): {e}", extra={"event": "request_retry"})
             if attempt < retries - 1:
                 # 指数バックオフでリトライ
                 wait_time = (2 ** attempt) + random.uniform(0, 1)
-                logger.info(f"Retrying in {wait_time:.2f} seconds...")
+                logger.info(f"Retrying in {wait_time:.2f} seconds...", extra={"event": "request_retry_wait"})
                 time.sleep(wait_time)
             else:
                 logger.error(f"Failed to fetch {url} after {retries} attempts")
                 raise
+        finally:
+            # 想定外の例外（中断など）でも同時リクエスト数の枠を必ず返す
+            if not released:
+                controller.release(started, error=True)
     
     return None
 
+def _release_failed(controller, started, error):
+    """失敗したリクエストの結果を制御に伝える（頻度を下げた場合はログに出力する）"""
+    response = getattr(error, "response", None)
+    status = response.status_code if response is not None else None
+    retry_after = None
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            pass
+    reason = controller.release(started, status=status, error=response is None, retry_after=retry_after)
+    if reason is not None:
+        logger.warning(f"Reduced request rate for {controller.host} to {controller.rate:.2f}/s "
+                       f"(concurrency {int(controller.concurrency)}) due to {reason}",
+                       extra={"event": "rate_decrease", "host": controller.host, "reason": reason})
+
+def pause(seconds):
+    """ページ・企業間の待機（適応的なリクエスト制御が有効な場合は make_request が間隔を調整するため待たない）"""
+    if not ADAPTIVE_RATE_CONTROL:
+        time.sleep(seconds)
+
+# 逐次取得で使うHTMLの要素（終了タグを持たない要素はタグのスタックに積まない）
+_VOID_ELEMENTS = frozenset([
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"
+])
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.IGNORECASE)
+_HEADER_CHARSET = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+def _parse_selector(selector):
+    """"tag" / ".class" / "#id" / "tag.class" 形式の単純なセレクタを (タグ, クラス, ID) に分解する"""
+    match = re.fullmatch(r'([\w-]*)(?:\.([\w-]+))?(?:#([\w-]+))?', selector.strip())
+    if not match or not any(match.groups()):
+        raise ValueError(f"Unsupported selector: {selector}")
+    tag, class_name, element_id = match.groups()
+    return tag.lower() or None, class_name, element_id
+
+class TargetTracker(HTMLParser):
+    """HTMLを受け取った分ずつ解析し、対象要素の一覧を読み終えたかを判定する
+    
+    最初に見つかった対象要素の親要素が閉じた時点で complete になる（同じ親の下に並ぶ対象要素はすべて読み終えている）。
+    """
+    
+    def __init__(self, selectors):
+        super().__init__()
+        if isinstance(selectors, str):
+            selectors = selectors.split(",")
+        self.selectors = [_parse_selector(selector) for selector in selectors]
+        self.complete = False
+        self.matched = 0
+        self._stack = []
+        self._container_depth = None  # 対象要素の親要素のスタック上の深さ
+    
+    def _matches(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        for selector_tag, class_name, element_id in self.selectors:
+            if selector_tag and selector_tag != tag:
+                continue
+            if class_name and class_name not in classes:
+                continue
+            if element_id and attrs.get("id") != element_id:
+                continue
+            return True
+        return False
+    
+    def handle_starttag(self, tag, attrs):
+        if self._matches(tag, attrs):
+            self.matched += 1
+            if self._container_depth is None:
+                self._container_depth = len(self._stack)
+        if tag not in _VOID_ELEMENTS:
+            self._stack.append(tag)
+    
+    def handle_endtag(self, tag):
+        # 閉じ忘れのある要素（<li>、<p> など）は対応する開始タグまでまとめて閉じる
+        if tag not in self._stack:
+            return
+        while self._stack.pop() != tag:
+            pass
+        if self._container_depth is not None and len(self._stack) < self._container_depth:
+            self.complete = True
+
+class FetchedPage:
+    """fetch_page で取得したページ"""
+    
+    def __init__(self, url, text, size, truncated, stopped_early, http_version=None):
+        self.url = url
+        self.text = text
+        self.size = size                    # 読み込んだ本文のバイト数（展開後）
+        self.truncated = truncated          # 上限のバイト数で打ち切ったか
+        self.stopped_early = stopped_early  # 対象要素を読み終えた時点で打ち切ったか
+        self.http_version = http_version
+
+def _response_encoding(response, head):
+    """Content-Type の charset、なければ先頭部分の <meta charset> から文字コードを決める"""
+    match = _HEADER_CHARSET.search(response.headers.get("Content-Type", ""))
+    if match:
+        encoding = match.group(1)
+    else:
+        match = _META_CHARSET.search(head)
+        encoding = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    return encoding
+
+def iter_response_bytes(response, chunk_size=STREAM_CHUNK_SIZE):
+    """stream=True で取得したレスポンスの本文を、Content-Encoding の圧縮を展開しながら少しずつ返す"""
+    if httpx is not None and isinstance(response, httpx.Response):
+        return response.iter_bytes(chunk_size)
+    return response.iter_content(chunk_size=chunk_size)
+
+def fetch_page(url, headers=None, params=None, max_bytes=MAX_PAGE_BYTES, stop_after=None, http2=None):
+    """ページを逐次ダウンロードしてHTMLを返す
+    
+    圧縮された本文は受信した分ずつ展開し、max_bytes を超えた時点、または stop_after で指定した
+    要素の一覧を読み終えた時点でダウンロードを打ち切る（残りの本文は受信しない）。
+    """
+    response = make_request(url, headers, params, stream=True, http2=http2)
+    if not response:
+        return None
+    chunks = iter_response_bytes(response)
+    
+    tracker = TargetTracker(stop_after) if stop_after else None
+    decoder = None
+    parts = []
+    size = 0
+    truncated = stopped_early = False
+    try:
+        for chunk in chunks:
+            if max_bytes and size + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - size]
+                truncated = True
+            size += len(chunk)
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(_response_encoding(response, chunk))(errors="replace")
+            text = decoder.decode(chunk)
+            parts.append(text)
+            
+            if tracker is not None:
+                tracker.feed(text)
+                if tracker.complete:
+                    stopped_early = True
+                    break
+            if truncated:
+                logger.warning(f"Page exceeded {max_bytes} bytes, truncated: {url}", extra={"event": "page_truncated"})
+                break
+    finally:
+        response.close()
+    
+    if decoder is not None:
+        parts.append(decoder.decode(b"", final=True))
+    return FetchedPage(url, "".join(parts), size, truncated, stopped_early, response_http_version(response))
+
 def get_soup(url, headers=None, params=None):
-    """指定されたURLのHTMLを取得し、BeautifulSoupオブジェクトを返す"""
-    response = make_request(url, headers, params)
-    if response:
-        return BeautifulSoup(response.text, 'html.parser')
+    """指定されたURLのHTMLを取得し、BeautifulSoupオブジェクトを返す（MAX_PAGE_BYTES を超える部分は読み込まない）"""
+    page = fetch_page(url, headers, params)
+    if page:
+        return BeautifulSoup(page.text, 'html.parser')
     return None
 
 # データ保存関連の関数
@@ -94,6 +477,101 @@ def load_json(filepath):
     logger.info(f"Data loaded from {filepath}")
     return data
 
+class JsonlWriter:
+    """レコードを1行1件のJSONLとして追記するライター（逐次flushし実行中も途中結果を参照できる）"""
+
+    def __init__(self, filepath, mode='a'):
+        directory = os.path.dirname(filepath)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.filepath = filepath
+        self.count = 0
+        self._file = open(filepath, mode, encoding='utf-8')
+
+    def write(self, record):
+        """1レコードを書き込む"""
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.count += 1
+
+    def write_many(self, records):
+        """複数レコードをまとめて書き込む"""
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.count += 1
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def iter_jsonl(filepath):
+    """JSONLファイルのレコードを1件ずつ返すイテレータ"""
+    if not os.path.exists(filepath):
+        return
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # 書き込み途中で中断された末尾行などはスキップする
+                logger.warning(f"Skipping malformed line {line_no} in {filepath}", extra={"event": "malformed_line"})
+
+def migrate_legacy_json(filepath):
+    """JSONLファイルがなく、従来のJSON配列のファイル（拡張子 .json）がある場合はJSONLに変換する
+    
+    変換後はJSONLファイルを使うため変換は1回だけ行われる（従来のファイルは削除しない）。
+    変換した件数を返す（変換しなかった場合はNone）。
+    """
+    if not filepath.endswith('.jsonl') or os.path.exists(filepath):
+        return None
+    legacy_file = filepath[:-1]
+    if not os.path.exists(legacy_file):
+        return None
+    
+    records = load_json(legacy_file)
+    if not isinstance(records, list):
+        logger.warning(f"Cannot migrate {legacy_file}: not a JSON array")
+        return None
+    count = save_jsonl(records, filepath)
+    logger.info(f"Migrated {count} records from {legacy_file} to {filepath}")
+    return count
+
+def iter_records(filepath):
+    """JSONL（または従来のJSON配列）ファイルのレコードを1件ずつ返す
+    
+    JSONLファイルがなく従来のJSONファイルがある場合は、JSONLに変換してから読み込む。
+    """
+    if filepath.endswith('.jsonl'):
+        migrate_legacy_json(filepath)
+        yield from iter_jsonl(filepath)
+        return
+
+    data = load_json(filepath)
+    if data:
+        yield from data
+
+def save_jsonl(records, filepath):
+    """レコード群をJSONLファイルとして保存する（一時ファイル経由で置き換える）"""
+    tmp_path = f"{filepath}.tmp"
+    with JsonlWriter(tmp_path, mode='w') as writer:
+        writer.write_many(records)
+    os.replace(tmp_path, filepath)
+
+    logger.info(f"Data saved to {filepath}")
+    return writer.count
+
 # 日付処理関連の関数
 def parse_date(date_str):
     """様々な形式の日付文字列を標準形式に変換する"""
@@ -112,7 +590,7 @@ def parse_date(date_str):
         except ValueError:
             continue
     
-    logger.warning(f"Failed to parse date: {date_str}")
+    logger.warning(f"Failed to parse date: {date_str}", extra={"event": "date_parse_failed"})
     return None
 
 def is_valid_date(date_str):
@@ -0,0 +1,283 @@
+"""
+インターン情報自動取得システム - 分散収集用のワークキュー（SQLite）
+
+外部サービスを使わずに複数のプロセス・マシンで収集処理を分担するための永続キュー。
+タスクはリース（期限付きの占有）で取り出し、処理中はハートビートで期限を延長する。
+ワーカーが停止して期限が切れたタスクは他のワーカーが取り直す。
+同一ホストへのリクエスト間隔もこのデータベースで管理し、全ワーカーで共有する。
+
+複数のマシンから共有ディスク（NFSなど）上のファイルを使えるよう、WALモードは使わない
+（WALは共有メモリを使うため、同一ホストのプロセス間でしか正しく動作しない）。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import urlparse
+
+from config import QUEUE_FILE, QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS, HOST_REQUEST_INTERVAL
+from utils import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    host TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated_at REAL,
+    UNIQUE (kind, key)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, lease_expires);
+
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    next_request_at REAL NOT NULL
+);
+"""
+
+# タスクの状態（pending: 未処理 / leased: 処理中 / done: 完了・未反映 / merged: 反映済み / failed: 失敗）
+TASK_STATUSES = ("pending", "leased", "done", "merged", "failed")
+
+def url_host(url):
+    """URLのホスト名（リクエスト間隔の管理単位）を返す"""
+    return urlparse(url).netloc.lower() if url else None
+
+class Task:
+    """キューから取り出したタスク"""
+    
+    def __init__(self, task_id, kind, key, payload, host, attempts):
+        self.id = task_id
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.host = host
+        self.attempts = attempts
+
+class WorkQueue:
+    """リースとハートビートで管理する永続ワークキュー（スレッドごとに接続を持つ）"""
+    
+    def __init__(self, filepath=QUEUE_FILE, lease_seconds=QUEUE_LEASE_SECONDS, max_attempts=QUEUE_MAX_ATTEMPTS,
+                 host_interval=HOST_REQUEST_INTERVAL):
+        directory = os.path.dirname(filepath)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        self.filepath = filepath
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.host_interval = host_interval
+        self._local = threading.local()
+        self.conn.executescript(SCHEMA)
+    
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # トランザクションは BEGIN IMMEDIATE で明示的に開始する
+            conn = sqlite3.connect(self.filepath, timeout=30, isolation_level=None)
+            # 以前のバージョンでWALモードにしたファイルも通常のジャーナルに戻す
+            conn.execute("PRAGMA journal_mode=DELETE")
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def _transaction(self):
+        """書き込みロックを取得してトランザクションを開始する（複数プロセスでの取り合いを防ぐ）"""
+        return _Transaction(self.conn)
+    
+    # タスクの登録
+    def enqueue(self, kind, key, payload, host=None):
+        """タスクを登録する（登録済みの場合は、反映済み・失敗したものだけを未処理に戻す）
+        
+        処理中・完了（未反映）のタスクはそのまま残し、戻り値で登録・再登録したかを返す。
+        """
+        return self.enqueue_many(kind, [(key, payload, host)]) == 1
+    
+    def enqueue_many(self, kind, tasks):
+        """(キー, ペイロード, ホスト) のリストをまとめて登録し、登録・再登録した件数を返す"""
+        now = time.time()
+        count = 0
+        with self._transaction() as conn:
+            for key, payload, host in tasks:
+                cursor = conn.execute("""
+                    INSERT INTO tasks (kind, key, payload, host, updated_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(kind, key) DO UPDATE SET
+                        payload=excluded.payload, host=excluded.host, status='pending', attempts=0,
+                        lease_owner=NULL, lease_expires=NULL, result=NULL, error=NULL,
+                        updated_at=excluded.updated_at
+                    WHERE tasks.status IN ('merged', 'failed')
+                """, (kind, key, json.dumps(payload, ensure_ascii=False), host, now))
+                count += cursor.rowcount
+        return count
+    
+    # ワーカー側の操作
+    def claim(self, worker_id):
+        """未処理（またはリース切れ）のタスクを1件リースして返す（ない場合はNone）
+        
+        次にリクエストできる時刻が早いホストのタスクを優先し、ワーカーが同じホストに集中しないようにする。
+        リースが切れたタスクのうち試行回数が上限に達したものは取り直さずに失敗にする。
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE tasks SET status='failed', error='lease expired', lease_owner=NULL, lease_expires=NULL,
+                    updated_at=?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (now, now, self.max_attempts))
+            row = conn.execute("""
+                SELECT t.id, t.kind, t.key, t.payload, t.host, t.attempts
+                FROM tasks t LEFT JOIN hosts h ON h.host = t.host
+                WHERE t.status = 'pending' OR (t.status = 'leased' AND t.lease_expires < ?)
+                ORDER BY COALESCE(h.next_request_at, 0), t.id
+                LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                return None
+            
+            task_id, kind, key, payload, host, attempts = row
+            conn.execute("""
+                UPDATE tasks SET status='leased', lease_owner=?, lease_expires=?, attempts=attempts + 1,
+                    updated_at=?
+                WHERE id = ?
+            """, (worker_id, now + self.lease_seconds, now, task_id))
+        return Task(task_id, kind, key, json.loads(payload), host, attempts + 1)
+    
+    def heartbeat(self, task, worker_id):
+        """リース期限を延長する（他のワーカーに取り直されていた場合はFalse）"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE tasks SET lease_expires=?, updated_at=?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (now + self.lease_seconds, now, task.id, worker_id))
+            return cursor.rowcount == 1
+    
+    def complete(self, task, worker_id, result):
+        """タスクの結果を保存して完了にする（リースを失っていた場合は保存せずFalse）"""
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE tasks SET status='done', result=?, error=NULL, lease_owner=NULL, lease_expires=NULL,
+                    updated_at=?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (json.dumps(result, ensure_ascii=False), time.time(), task.id, worker_id))
+            return cursor.rowcount == 1
+    
+    def fail(self, task, worker_id, error):
+        """タスクの失敗を記録する（試行回数が上限未満なら未処理に戻して再試行する）"""
+        status = "failed" if task.attempts >= self.max_attempts else "pending"
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE tasks SET status=?, error=?, lease_owner=NULL, lease_expires=NULL, updated_at=?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (status, str(error), time.time(), task.id, worker_id))
+            return cursor.rowcount == 1
+    
+    def reserve_host(self, host):
+        """ホストへの次のリクエスト枠を予約し、その時刻まで待つべき秒数を返す
+        
+        予約は全ワーカーで共有するため、ワーカーを増やしても同一ホストへの間隔は host_interval 以上に保たれる。
+        """
+        if not host:
+            return 0.0
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT next_request_at FROM hosts WHERE host = ?", (host,)).fetchone()
+            slot = max(now, row[0]) if row else now
+            conn.execute("INSERT OR REPLACE INTO hosts (host, next_request_at) VALUES (?, ?)",
+                         (host, slot + self.host_interval))
+        return slot - now
+    
+    def wait_for_host(self, url):
+        """URLのホストへのリクエスト枠が来るまで待つ"""
+        wait = self.reserve_host(url_host(url))
+        if wait > 0:
+            time.sleep(wait)
+    
+    # 結果の取り出し
+    def iter_results(self, kind):
+        """完了して未反映のタスクの (タスクID, キー, 結果) を登録順に返す"""
+        rows = self.conn.execute(
+            "SELECT id, key, result FROM tasks WHERE kind = ? AND status = 'done' ORDER BY id", (kind,))
+        for task_id, key, result in rows:
+            yield task_id, key, json.loads(result)
+    
+    def mark_merged(self, task_ids):
+        """結果を反映したタスクを反映済みにし、保存していた結果を破棄する"""
+        with self._transaction() as conn:
+            conn.executemany("UPDATE tasks SET status='merged', result=NULL, updated_at=? WHERE id = ?",
+                             [(time.time(), task_id) for task_id in task_ids])
+    
+    def counts(self, kind=None):
+        """状態ごとのタスク数を返す"""
+        counts = dict.fromkeys(TASK_STATUSES, 0)
+        if kind is None:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+        else:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM tasks WHERE kind = ? GROUP BY status", (kind,))
+        for status, count in rows:
+            counts[status] = count
+        return counts
+    
+    def has_unfinished(self, kind=None):
+        """未処理・処理中のタスクが残っているか"""
+        counts = self.counts(kind)
+        return counts["pending"] + counts["leased"] > 0
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+class Heartbeat:
+    """タスクの処理中、バックグラウンドで定期的にリース期限を延長する"""
+    
+    def __init__(self, queue, task, worker_id, interval=None):
+        self.queue = queue
+        self.task = task
+        self.worker_id = worker_id
+        self.interval = interval if interval is not None else queue.lease_seconds / 3
+        self.lost = False  # リースを失った（他のワーカーに取り直された）か
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    if not self.queue.heartbeat(self.task, self.worker_id):
+                        logger.warning(f"Lost lease on task {self.task.key}")
+                        self.lost = True
+                        return
+                except sqlite3.Error as e:
+                    logger.warning(f"Heartbeat failed for task {self.task.key}: {e}")
+        finally:
+            # ハートビート用スレッドの接続は使い終わったら閉じる
+            self.queue.close()
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()